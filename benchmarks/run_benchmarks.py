@@ -0,0 +1,233 @@
+'''
+Benchmarks of the hot paths of myscripts on synthetic data. Results are written as JSON
+    (one file per run) so runs of different versions can be compared:
+
+    python benchmarks/run_benchmarks.py --size small
+    python benchmarks/run_benchmarks.py --size large --only log_parse --only tdep_prep
+
+Nothing here needs LAMMPS, MPI or TDEP. The scheduler benchmark runs stub_lmp.py through
+    stub_mpirun.py.
+'''
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+import typer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import synthetic
+from myscripts.src import LocalProject
+from myscripts.src.FileIO.LogFile import LogFile
+from myscripts.src.FileIO.ParsingStrategies import FixPrintParser
+from myscripts.scripts.make_param_combos import make_param_combos
+from myscripts.scripts.tdep_from_lammps import parse_MD_data
+
+app = typer.Typer()
+
+#Problem sizes of every benchmark for each --size preset
+SIZES = {
+    "small" : {"log_rows" : 100_000, "fix_print_rows" : 100_000, "grid_points" : 10, "n_jobs" : 50,
+               "n_seeds" : 4, "n_frames" : 200, "n_atoms" : 256, "sched_seeds" : 40, "sched_ncores" : 8},
+    "medium" : {"log_rows" : 1_000_000, "fix_print_rows" : 1_000_000, "grid_points" : 14, "n_jobs" : 500,
+                "n_seeds" : 4, "n_frames" : 1000, "n_atoms" : 1000, "sched_seeds" : 200, "sched_ncores" : 16},
+    "large" : {"log_rows" : 5_000_000, "fix_print_rows" : 5_000_000, "grid_points" : 18, "n_jobs" : 2000,
+               "n_seeds" : 10, "n_frames" : 2000, "n_atoms" : 4000, "sched_seeds" : 1000, "sched_ncores" : 64},
+}
+
+
+def time_it(fn, repeats : int, setup = None) -> dict:
+    '''
+    Times `fn()` `repeats` times. `setup()` runs before every repeat and is not timed,
+        its return value is passed to `fn`. Output printed by `fn` is discarded.
+    '''
+    times = []
+    for _ in range(repeats):
+        arg = setup() if setup is not None else None
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn(arg) if setup is not None else fn()
+            times.append(time.perf_counter() - start)
+    return {"min" : min(times), "median" : statistics.median(times), "times" : times}
+
+
+def bench_log_parse(workdir, size, repeats) -> dict:
+    path = os.path.join(workdir, "log.lammps")
+    synthetic.write_log(path, size["log_rows"], n_segments = 2)
+    return {
+        "params" : {"rows_per_segment" : size["log_rows"], "segments" : 2},
+        "parse_thermo_table" : time_it(lambda: LogFile(path).parse_thermo_table(), repeats),
+        "parse_thermo_segments" : time_it(lambda: LogFile(path).parse_thermo_segments(), repeats),
+    }
+
+
+def bench_fix_print(workdir, size, repeats) -> dict:
+    path = os.path.join(workdir, "fix_print.txt")
+    synthetic.write_fix_print(path, size["fix_print_rows"], 4)
+    return {
+        "params" : {"rows" : size["fix_print_rows"], "cols" : 4},
+        "parse" : time_it(lambda: FixPrintParser().parse(path), repeats),
+    }
+
+
+def bench_param_combos(workdir, size, repeats) -> dict:
+    n = size["grid_points"]
+    params = {"a" : list(range(n)), "b" : list(range(n)), "c" : list(range(n)), "d" : list(range(n)),
+              "e" : list(np.linspace(0, 1, n))}
+    return {
+        "params" : {"combos" : n**4, "pegged" : 1},
+        "make_param_combos" : time_it(lambda: make_param_combos(params, [-1, -1, -1, -1, 0]), repeats),
+    }
+
+
+def bench_job_creation(workdir, size, repeats) -> dict:
+    in_path = os.path.join(workdir, "in.bench")
+    synthetic.write_in_file(in_path)
+
+    def fresh_project():
+        project_dir = tempfile.mkdtemp(dir = workdir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return LocalProject("project", in_path, project_dir)
+
+    def jobs():
+        return [{"name" : f"job{i}", "n_seeds" : size["n_seeds"], "seed_variables" : ["velocity_seed"],
+                 "changed_vars" : {"T" : 100 + i}} for i in range(size["n_jobs"])]
+
+    return {
+        "params" : {"jobs" : size["n_jobs"], "seeds" : size["n_seeds"]},
+        "eager" : time_it(lambda project: project.new_jobs(jobs()), repeats, fresh_project),
+        "lazy" : time_it(lambda project: project.new_jobs(jobs(), lazy = True), repeats, fresh_project),
+    }
+
+
+def bench_tdep_prep(workdir, size, repeats) -> dict:
+    folder = os.path.join(workdir, "simulation")
+    synthetic.write_simulation_folder(folder, size["n_frames"], size["n_atoms"])
+    stride = [0]
+
+    def fresh_cache():
+        #A cold run parses the dumps, remove everything generated by earlier repeats
+        for name in os.listdir(folder):
+            generated = name.startswith(("TDEP_data", ".trajectory_cache", "infile.")) and name != "infile.ucposcar"
+            if generated or name.endswith(".index.npz"):
+                path = os.path.join(folder, name)
+                shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+    def prepare(_ = None):
+        stride[0] += 1
+        parse_MD_data(folder, 4, 300, 1, True, stride[0], size["n_frames"])
+
+    return {
+        "params" : {"frames" : size["n_frames"], "atoms" : size["n_atoms"]},
+        "parse_MD_data_cold" : time_it(prepare, repeats, fresh_cache),
+        "parse_MD_data_cached" : time_it(prepare, repeats),
+    }
+
+
+def bench_scheduler(workdir, size, repeats) -> dict:
+    in_path = os.path.join(workdir, "in.sched")
+    sleep_time = 0.2
+    synthetic.write_in_file(in_path, sleep_time = sleep_time)
+    lmp = f"{sys.executable} {os.path.join(BENCH_DIR, 'stub_lmp.py')}"
+    mpirun = f"{sys.executable} {os.path.join(BENCH_DIR, 'stub_mpirun.py')}"
+    n_seeds, ncores = size["sched_seeds"], size["sched_ncores"]
+
+    results = {"params" : {"seeds" : n_seeds, "ncores" : ncores, "ranks" : 2, "seed_sleep_time" : sleep_time}}
+    for mode, seeds_per_launch in [("single", 1), ("partitions", 4)]:
+        stats = []
+        def run(_ = None):
+            project_dir = tempfile.mkdtemp(dir = workdir)
+            project = LocalProject("project", in_path, project_dir)
+            project.new_jobs([{"name" : f"job{i}", "n_seeds" : 1, "seed_variables" : ["velocity_seed"],
+                               "changed_vars" : {"T" : 100 + i}} for i in range(n_seeds)], lazy = True)
+            project.run_all_jobs_mpi(ncores, 2, lmp, seeds_per_launch = seeds_per_launch, mpi_launcher = mpirun)
+            stats.append(project.utilisation["batches"][-1])
+        timing = time_it(run, repeats)
+        #Wall time an ideal scheduler with no launch overhead would need
+        ideal = n_seeds * 2 * sleep_time / ncores
+        timing["ideal_wall_time"] = ideal
+        timing["overhead_per_seed"] = (timing["median"] - ideal) / n_seeds
+        timing["utilisation"] = statistics.median(s["utilisation"] for s in stats)
+        results[mode] = timing
+    return results
+
+
+BENCHMARKS = {
+    "log_parse" : bench_log_parse,
+    "fix_print" : bench_fix_print,
+    "param_combos" : bench_param_combos,
+    "job_creation" : bench_job_creation,
+    "tdep_prep" : bench_tdep_prep,
+    "scheduler" : bench_scheduler,
+}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd = BENCH_DIR,
+                              capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@app.command()
+def main(
+    size : str = typer.Option("small", help = "Problem size preset: small, medium or large"),
+    only : Optional[List[str]] = typer.Option(None, help = f"Benchmarks to run (default all): {', '.join(BENCHMARKS)}"),
+    repeats : int = typer.Option(3, help = "Repeats of every measurement, the median is reported"),
+    output : Optional[str] = typer.Option(None, help = "JSON file to write, defaults to benchmarks/results/<revision>_<time>.json"),
+):
+    if size not in SIZES:
+        raise typer.BadParameter(f"size must be one of {list(SIZES)}")
+    names = only or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            raise typer.BadParameter(f"Unknown benchmark {name}, expected one of {list(BENCHMARKS)}")
+
+    revision = git_revision()
+    report = {
+        "revision" : revision,
+        "timestamp" : datetime.now().isoformat(timespec = "seconds"),
+        "size" : size,
+        "repeats" : repeats,
+        "python" : platform.python_version(),
+        "numpy" : np.__version__,
+        "platform" : platform.platform(),
+        "cpu_count" : os.cpu_count(),
+        "benchmarks" : {},
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in names:
+            print(f"Running {name} ...", flush = True)
+            bench_dir = os.path.join(workdir, name)
+            os.makedirs(bench_dir)
+            report["benchmarks"][name] = BENCHMARKS[name](bench_dir, SIZES[size], repeats)
+            for key, value in report["benchmarks"][name].items():
+                if isinstance(value, dict) and "median" in value:
+                    print(f"    {key}: {value['median']:.4f} s")
+
+    if output is None:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(BENCH_DIR, "results", f"{revision or 'unknown'}_{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok = True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent = 4)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    app()
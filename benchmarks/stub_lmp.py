@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+'''
+Stand-in for the LAMMPS binary used by the scheduler benchmarks. Accepts the arguments
+    LocalProject passes to lmp ("-in <file>", "-partition NxR", ...), sleeps for the
+    in-file's sleep_time variable and writes a log.lammps with N_steps / 10 thermo rows
+    into the folder it was started in.
+
+With -partition the wrapper written by PartitionBundle is read and every partition is
+    handled in its own thread, writing to its seed folder.
+'''
+import os
+import shlex
+import sys
+import threading
+import time
+
+
+def read_variables(path) -> dict:
+    variables = {}
+    with open(path, "r") as f:
+        for line in f:
+            tokens = shlex.split(line.split("#", 1)[0])
+            if len(tokens) >= 4 and tokens[0] == "variable":
+                variables[tokens[1]] = tokens[3:]
+    return variables
+
+
+def run_in_file(folder, in_file) -> None:
+    variables = read_variables(os.path.join(folder, in_file))
+    sleep_time = float(variables.get("sleep_time", ["0.1"])[0])
+    n_steps = int(float(variables.get("N_steps", ["1000"])[0]))
+
+    start = time.time()
+    with open(os.path.join(folder, "log.lammps"), "w") as f:
+        f.write(f"LAMMPS (stub)\nrun {n_steps}\nPer MPI rank memory allocation (min/avg/max) = 1 | 1 | 1 Mbytes\n")
+        f.write("   Step   Temp   PotEng\n")
+        f.flush()
+        n_rows = n_steps // 10 + 1
+        for i in range(n_rows):
+            f.write(f"{i * 10} 300.0 -1000.0\n")
+        time.sleep(sleep_time)
+        f.write(f"Loop time of {time.time() - start:.3f} on 1 procs for {n_steps} steps with 1 atoms\n\n")
+        f.write("Total wall time: 0:00:00\n")
+
+
+def main(argv) -> int:
+    in_file = argv[argv.index("-in") + 1]
+    if "-partition" not in argv:
+        run_in_file(os.getcwd(), in_file)
+        return 0
+
+    variables = read_variables(in_file)
+    threads = [threading.Thread(target = run_in_file, args = (folder, name))
+               for folder, name in zip(variables["partition_seed_dir"], variables["partition_in_file"])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
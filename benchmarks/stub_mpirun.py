@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+'''
+Stand-in for mpirun used by the scheduler benchmarks: "stub_mpirun.py -np N [--flag value ...] cmd ..."
+    runs `cmd` once, no matter N, and exits with its exit code. The scheduler still
+    accounts for N cores, so utilisation numbers are those of a real MPI run.
+
+If $STUB_MPIRUN_LOG is set every call appends its arguments to that file, one line each.
+'''
+import os
+import sys
+
+
+def main(argv) -> None:
+    if "STUB_MPIRUN_LOG" in os.environ:
+        with open(os.environ["STUB_MPIRUN_LOG"], "a") as f:
+            f.write(" ".join(argv) + "\n")
+
+    i = 0
+    while i < len(argv) and argv[i].startswith("-"):
+        #Skip launcher options and their values (-np N, --host a:2,b:2, --cpu-set a,b, --bind-to core)
+        i += 2
+    os.execvp(argv[i], argv[i:])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
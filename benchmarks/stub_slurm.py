@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+'''
+Stand-in for sbatch, squeue and sacct that runs job arrays on the local machine, for
+    trying SlurmProject without a cluster:
+
+    SlurmProject(..., sbatch = "stub_slurm.py sbatch", squeue = "stub_slurm.py squeue",
+                 sacct = "stub_slurm.py sacct", launcher = "stub_mpirun.py")
+
+"sbatch" starts a detached process that runs the tasks of the array ("--array=0-9%2"
+    from the command line or the #SBATCH lines of the script) with at most %N at once.
+    Task states are kept as JSON in $STUB_SLURM_DIR (default: a folder in the temp dir),
+    where "squeue" and "sacct" read them. Only the options SlurmProject uses are understood.
+'''
+import os
+import re
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+
+
+STATE_DIR = os.environ.get("STUB_SLURM_DIR", os.path.join(tempfile.gettempdir(), f"stub_slurm_{os.getuid()}"))
+
+
+def state_path(job_id) -> str:
+    return os.path.join(STATE_DIR, f"{job_id}.json")
+
+
+def read_state(job_id) -> dict:
+    with open(state_path(job_id), "r") as f:
+        return json.load(f)
+
+
+def write_state(job_id, state) -> None:
+    with open(state_path(job_id) + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(state_path(job_id) + ".tmp", state_path(job_id))
+
+
+def options(argv, script) -> dict:
+    '''
+    sbatch options from the #SBATCH lines of `script`, overridden by those in `argv`.
+    '''
+    opts = {}
+    with open(script, "r") as f:
+        lines = [line[len("#SBATCH"):].strip() for line in f if line.startswith("#SBATCH")]
+    for arg in lines + argv:
+        if arg.startswith("--") and "=" in arg:
+            key, value = arg[2:].split("=", 1)
+            opts[key] = value
+    return opts
+
+
+def sbatch(argv) -> int:
+    script = argv[-1]
+    opts = options(argv[:-1], script)
+    match = re.fullmatch(r"(\d+)-(\d+)(?:%(\d+))?", opts.get("array", "0-0"))
+    first, last, throttle = int(match.group(1)), int(match.group(2)), match.group(3)
+
+    os.makedirs(STATE_DIR, exist_ok = True)
+    job_id = 1000 + sum(name.endswith(".json") for name in os.listdir(STATE_DIR))
+    write_state(job_id, {str(i) : {"state" : "PENDING", "exit_code" : None} for i in range(first, last + 1)})
+
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "run", str(job_id), script,
+                      throttle or str(last - first + 1), opts.get("output", "slurm-%A_%a.out")],
+                     start_new_session = True, stdin = subprocess.DEVNULL,
+                     stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+    print(job_id)
+    return 0
+
+
+def run(job_id, script, throttle, output) -> None:
+    '''
+    Runs every task of array `job_id`, at most `throttle` at once.
+    '''
+    lock = threading.Lock()
+    slots = threading.Semaphore(int(throttle))
+
+    def set_state(index, state, exit_code = None):
+        with lock:
+            states = read_state(job_id)
+            states[index] = {"state" : state, "exit_code" : exit_code}
+            write_state(job_id, states)
+
+    def task(index):
+        with slots:
+            set_state(index, "RUNNING")
+            env = dict(os.environ, SLURM_JOB_ID = job_id, SLURM_ARRAY_JOB_ID = job_id, SLURM_ARRAY_TASK_ID = index)
+            out_path = output.replace("%A", job_id).replace("%a", index)
+            with open(out_path, "w") as out:
+                code = subprocess.run(["bash", script], env = env, stdout = out, stderr = subprocess.STDOUT).returncode
+            set_state(index, "COMPLETED" if code == 0 else "FAILED", code)
+
+    threads = [threading.Thread(target = task, args = (index,)) for index in read_state(job_id)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def job_ids(argv) -> list:
+    ids = argv[argv.index("-j") + 1].split(",")
+    return [job_id for job_id in ids if os.path.isfile(state_path(job_id))]
+
+
+def squeue(argv) -> int:
+    for job_id in job_ids(argv):
+        for index, task in read_state(job_id).items():
+            if task["state"] in ("PENDING", "RUNNING"):
+                print(f"{job_id}_{index} {task['state']}")
+    return 0
+
+
+def sacct(argv) -> int:
+    for job_id in job_ids(argv):
+        for index, task in read_state(job_id).items():
+            print(f"{job_id}_{index}|{task['state']}|{task['exit_code'] or 0}:0")
+    return 0
+
+
+if __name__ == "__main__":
+    command, argv = sys.argv[1], sys.argv[2:]
+    if command == "run":
+        run(*argv)
+    else:
+        sys.exit({"sbatch" : sbatch, "squeue" : squeue, "sacct" : sacct}[command](argv))
@@ -0,0 +1,94 @@
+'''
+Generators for synthetic LAMMPS outputs used by the benchmarks. Values are random, only
+    the layout matches what LAMMPS writes.
+'''
+import os
+import numpy as np
+
+
+THERMO_HEADINGS = ["Step", "Temp", "PotEng", "KinEng", "TotEng", "Press", "Volume"]
+
+
+def write_log(path, n_rows : int, n_segments : int = 1, seed : int = 0) -> None:
+    '''
+    LAMMPS log with `n_segments` thermo segments of `n_rows` rows each.
+    '''
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        f.write("LAMMPS (2 Aug 2023)\nvariable T equal 300\n")
+        step = 0
+        for _ in range(n_segments):
+            f.write(f"run {n_rows * 10}\n")
+            f.write("Per MPI rank memory allocation (min/avg/max) = 3.1 | 3.1 | 3.1 Mbytes\n")
+            f.write("   " + "   ".join(THERMO_HEADINGS) + "\n")
+            data = rng.normal(size = (n_rows, len(THERMO_HEADINGS) - 1))
+            steps = step + 10*np.arange(n_rows)
+            for chunk in range(0, n_rows, 100_000):
+                rows = np.column_stack([steps[chunk : chunk + 100_000], data[chunk : chunk + 100_000]])
+                f.write("".join(f"{int(r[0]):>10d} " + " ".join(f"{v:.8g}" for v in r[1:]) + "\n" for r in rows))
+            step = steps[-1] + 10
+            f.write(f"Loop time of 1.234 on 1 procs for {n_rows * 10} steps with 256 atoms\n\n")
+        f.write("Total wall time: 0:00:01\n")
+
+
+def write_fix_print(path, n_rows : int, n_cols : int = 4, seed : int = 0) -> None:
+    '''
+    Output of a fix ave/time or fix print: a comment line, the column headings and the data.
+    '''
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size = (n_rows, n_cols))
+    with open(path, "w") as f:
+        f.write("# Time-averaged data for fix bench\n")
+        f.write("# " + " ".join(f"c_{i}" for i in range(n_cols)) + "\n")
+        np.savetxt(f, data, fmt = "%.8g")
+
+
+def write_dump(path, n_frames : int, n_atoms : int, columns : str = "id xs ys zs", seed : int = 0) -> None:
+    '''
+    Text dump (dump custom) with `n_frames` frames of `n_atoms` atoms. The first column is
+        the atom id, the others are random.
+    '''
+    rng = np.random.default_rng(seed)
+    n_cols = len(columns.split()) - 1
+    ids = np.arange(1, n_atoms + 1)
+    with open(path, "w") as f:
+        for frame in range(n_frames):
+            f.write(f"ITEM: TIMESTEP\n{frame * 10}\nITEM: NUMBER OF ATOMS\n{n_atoms}\n"
+                    "ITEM: BOX BOUNDS pp pp pp\n0 1\n0 1\n0 1\n"
+                    f"ITEM: ATOMS {columns}\n")
+            rows = np.column_stack([ids, rng.random((n_atoms, n_cols))])
+            f.write(("%d" + " %.8g"*n_cols + "\n") * n_atoms % tuple(rows.ravel()))
+
+
+def write_simulation_folder(folder, n_frames : int, n_atoms : int, seed : int = 0) -> None:
+    '''
+    Everything tdep_from_lammps.parse_MD_data expects in a simulation folder.
+    '''
+    os.makedirs(folder, exist_ok = True)
+    write_dump(os.path.join(folder, "dump.positions"), n_frames, n_atoms, "id xs ys zs", seed)
+    write_dump(os.path.join(folder, "dump.positions_unrolled"), n_frames, n_atoms, "id xsu ysu zsu", seed + 1)
+    write_dump(os.path.join(folder, "dump.forces"), n_frames, n_atoms, "id fx fy fz", seed + 2)
+    write_dump(os.path.join(folder, "equilibrium.atom"), 1, n_atoms, "id type xs ys zs mass", seed + 3)
+
+    rng = np.random.default_rng(seed)
+    with open(os.path.join(folder, "dump.stat"), "w") as f:
+        f.write("# Fix print output\n")
+        np.savetxt(f, np.column_stack([10*np.arange(n_frames), rng.normal(size = (n_frames, 3))]), fmt = "%.8g")
+    with open(os.path.join(folder, "equilibrium.energies"), "w") as f:
+        f.write("# timestep temperature PE KE\n0 300 -1000 40\n")
+    with open(os.path.join(folder, "infile.ucposcar"), "w") as f:
+        f.write("Ar\n5.2\n1 0 0\n0 1 0\n0 0 1\nAr\n4\nDirect\n0 0 0\n0 0.5 0.5\n0.5 0 0.5\n0.5 0.5 0\n")
+
+
+def write_in_file(path, sleep_time : float = 0.1, n_steps : int = 1000) -> None:
+    '''
+    Minimal in-file for the stub lmp. The stub sleeps for `sleep_time` seconds and writes a
+        log with one thermo row per 10 steps.
+    '''
+    with open(path, "w") as f:
+        f.write("units metal\n"
+                f"variable T equal 300\n"
+                f"variable velocity_seed equal 12345\n"
+                f"variable sleep_time equal {sleep_time}\n"
+                f"variable N_steps equal {n_steps}\n"
+                "run ${N_steps}\n")
@@ -1,3 +1,5 @@
-from .lammps_param_sweep import lammps_param_sweep
-from .make_param_combos import make_param_combos
-from .tdep_from_lammps import tdep_from_lammps
\ No newline at end of file
+from .lammps_param_sweep import main as lammps_param_sweep
+from .make_param_combos import make_param_combos, iter_param_combos, sample_param_combos
+from .tdep_from_lammps import tdep_from_lammps
+from .tdep_convergence import tdep_convergence
+from .adaptive_param_sweep import adaptive_param_sweep
\ No newline at end of file
@@ -0,0 +1,198 @@
+### Parameter sweep that refines itself. A coarse grid is run first, then every round
+### adds parameter points halfway between neighbouring jobs where the observable changes
+### the most or is the least certain. All rounds share one LocalProject.
+
+import json
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from myscripts.src import LocalProject, AdaptiveSeeds
+from myscripts.scripts.lammps_param_sweep import setup, job_name
+
+STATE_FILE = "refinement.json"
+
+
+def job_statistics(project : LocalProject, filename, parser, reducer, param_names : list) -> pd.DataFrame:
+    '''
+    Mean and standard error over seeds of the observable of every job that has results,
+        with the swept parameters as columns. Indexed by job name.
+    '''
+    collected = project.collect(filename, parser, reducer)
+    if len(collected) == 0:
+        return pd.DataFrame(columns = param_names + ["mean", "sem", "n_seeds"])
+    grouped = collected.groupby(level = "job")["value"]
+    stats = pd.DataFrame({"mean" : grouped.mean(), "sem" : grouped.sem(), "n_seeds" : grouped.size()})
+    #A single seed gives no error estimate, treat it as certain rather than dropping the job
+    stats["sem"] = stats["sem"].fillna(0.0)
+    for name in param_names:
+        stats[name] = [project.jobs[job].variables[name] for job in stats.index]
+    return stats
+
+
+def pegged_to(combos : pd.DataFrame, param : str) -> list:
+    '''
+    Parameters that move together with `param` (pegged to it by make_param_combos'
+        index_by, or it to them): one value of each always comes with one value of the other.
+    '''
+    if combos[param].nunique() < 2:
+        return []
+    return [name for name in combos.columns if name != param
+            and combos.groupby(param)[name].nunique().max() == 1
+            and combos.groupby(name)[param].nunique().max() == 1]
+
+
+def candidate_points(stats : pd.DataFrame, param_names : list, refine_params : list, min_spacing : dict,
+                     uncertainty_weight : float) -> list:
+    '''
+    Scores the interval between every pair of neighbouring jobs along each parameter in
+        `refine_params`. Neighbours share the values of every other swept parameter, except
+        those pegged to the refined one, and are adjacent in the refined one. The score is
+        |change in mean| plus `uncertainty_weight` times the combined standard error of the
+        two jobs.
+
+    Returns (score, variables of the midpoint) for every interval wider than
+        2 * min_spacing, highest score first. Parameters pegged to the refined one are
+        interpolated linearly.
+    '''
+    candidates = []
+    for param in refine_params:
+        companions = pegged_to(stats[param_names], param)
+        others = [p for p in param_names if p != param and p not in companions]
+        groups = stats.groupby(others) if others else [(None, stats)]
+        for _, line in groups:
+            line = line.sort_values(param)
+            for (_, a), (_, b) in zip(line.iterrows(), line.iloc[1:].iterrows()):
+                if b[param] == a[param] or b[param] - a[param] < 2 * min_spacing.get(param, 0.0):
+                    continue
+
+                midpoint = {}
+                for name in param_names:
+                    if name == param or name in companions:
+                        if isinstance(a[name], (int, float, np.number)) and isinstance(b[name], (int, float, np.number)):
+                            midpoint[name] = float(f"{(a[name] + b[name]) / 2:.12g}")
+                        elif a[name] == b[name]:
+                            midpoint[name] = a[name]
+                        else:
+                            break
+                    else:
+                        midpoint[name] = a[name]
+                else:
+                    score = abs(b["mean"] - a["mean"]) + uncertainty_weight * np.hypot(a["sem"], b["sem"])
+                    candidates.append((float(score), midpoint))
+
+    candidates.sort(key = lambda c: -c[0])
+    return candidates
+
+
+def adaptive_param_sweep(
+    infile_path : Path,
+    base_path : Path,
+    project_name : str,
+    ncores : int,
+    n_mpi_domains : int,
+    n_seeds : int,
+    param_combos : dict,
+    filename : str,
+    parser,
+    reducer,
+    refine_params : Optional[List[str]] = None,
+    n_rounds : int = 5,
+    points_per_round : int = 4,
+    min_spacing : Optional[dict] = None,
+    uncertainty_weight : float = 2.0,
+    tolerance : float = 0.0,
+    lmp_command : str = "lmp",
+    seed_var_names : List[str] = ["velocity_seed"],
+    adaptive : Optional[AdaptiveSeeds] = None,
+    lazy : bool = True,
+    resume : bool = False,
+):
+    """
+    Runs the coarse grid `param_combos`, then up to `n_rounds` refinement rounds. Every
+    round reduces each seed's `filename` to one number, averages it over seeds and adds
+    up to `points_per_round` new jobs at the midpoints of the highest scoring intervals
+    (see `candidate_points`). The project folder keeps every round, so an interrupted
+    sweep can be resumed with `resume = True`.
+
+    Parameters:
+    - infile_path: Path to the LAMMPS input file
+    - base_path: Path to the directory where the project will be saved
+    - project_name: Name of the project
+    - ncores: Number of cores to split jobs over
+    - n_mpi_domains: Number of MPI ranks per process
+    - n_seeds: Number of seeds per job
+    - param_combos: Coarse grid of parameter combinations generated by `make_param_combos`
+    - filename: File in each seed folder the observable is read from (e.g. log.lammps)
+    - parser: Parsing strategy for `filename` (e.g. ThermoLogParser() or FixPrintParser())
+    - reducer: Function of the parsed dictionary returning the observable as one number
+    - refine_params: Numeric parameters new points are added along, defaults to every swept numeric
+         parameter that is not pegged to another one
+    - n_rounds: Maximum number of refinement rounds after the coarse grid
+    - points_per_round: Maximum number of jobs added per round
+    - min_spacing: Dictionary of parameter name to the smallest spacing worth refining to
+    - uncertainty_weight: Weight of the standard error against the change in the observable
+    - tolerance: Stop once no interval scores above this
+    - lmp_command: Command to run LAMMPS (e.g. lmp)
+    - seed_var_names: List of variable names in the LAMMPS input file
+         that will be used to set random seeds (e.g. "velocity_seed" or "langevin_seed")
+    - adaptive: Optional AdaptiveSeeds deciding the number of seeds of every job instead of `n_seeds`
+    - lazy: Create each seed's folder and in-file only when it is started
+    - resume: Reopen an existing project and continue its refinement
+
+    Returns:
+    - The project and a DataFrame of the mean, standard error and seed count of every job
+    """
+    param_names = list(param_combos.keys())
+    if refine_params is None:
+        #Numeric parameters that are swept, leaving out those pegged to one already chosen
+        combos = pd.DataFrame({name : np.asarray(param_combos[name]) for name in param_names})
+        refine_params = []
+        for name in param_names:
+            if (np.issubdtype(combos[name].dtype, np.number) and combos[name].nunique() > 1
+                    and not any(name in pegged_to(combos, chosen) for chosen in refine_params)):
+                refine_params.append(name)
+    min_spacing = min_spacing or {}
+
+    if resume:
+        project = LocalProject(project_name, infile_path, base_path, resume = True)
+    else:
+        project = setup(infile_path, base_path, project_name, param_combos, n_seeds, seed_var_names, lazy)
+
+    state_path = os.path.join(project.outpath, STATE_FILE)
+    state = {"rounds" : []}
+    if os.path.isfile(state_path):
+        with open(state_path, "r") as f:
+            state = json.load(f)
+
+    while True:
+        project.run_all_jobs_mpi(ncores, n_mpi_domains, lammps_env_var = lmp_command, adaptive = adaptive)
+        stats = job_statistics(project, filename, parser, reducer, param_names)
+        if len(state["rounds"]) >= n_rounds:
+            break
+
+        new_jobs = []
+        scores = []
+        for score, variables in candidate_points(stats, param_names, refine_params, min_spacing, uncertainty_weight):
+            if len(new_jobs) >= points_per_round or score <= tolerance:
+                break
+            name = job_name(variables)
+            if name in project.jobs or any(job["name"] == name for job in new_jobs):
+                continue
+            new_jobs.append({"name" : name, "n_seeds" : n_seeds, "seed_variables" : seed_var_names, "changed_vars" : variables})
+            scores.append(score)
+
+        if len(new_jobs) == 0:
+            print("No interval left to refine.")
+            break
+
+        print(f"Refinement round {len(state['rounds']) + 1}: adding {', '.join(job['name'] for job in new_jobs)}")
+        project.new_jobs(new_jobs, lazy = lazy)
+        state["rounds"].append({"jobs" : [job["name"] for job in new_jobs], "scores" : scores})
+        with open(state_path, "w") as f:
+            json.dump(state, f, indent = 4)
+
+    return project, stats.sort_values(refine_params)
@@ -1,31 +1,32 @@
 from pathlib import Path
 from typing import List
 
-from myscripts.src import LAMMPS_Project
+from myscripts.src import LocalProject
+
+def job_name(data : dict) -> str:
+    return "_".join(f"{name}{value}" for name, value in data.items())
 
 def setup(
         infile_path : Path,
         base_path : Path,
         project_name : str,
-        param_combos,
+        param_combos : dict,
         n_runs : int, 
-        seed_var_names : List[str]
+        seed_var_names : List[str],
+        lazy : bool = False
     ):
 
-    project = LAMMPS_Project(project_name, infile_path, base_path)
-    param_names = param_combos[0]
+    project = LocalProject(project_name, infile_path, base_path)
+    param_names = list(param_combos.keys())
+    n_combos = len(param_combos[param_names[0]])
 
-    for pc in param_combos[1:]:
-        job_name = ""
-        data = {}
-        for i in range(len(pc)):
-            data[param_names[i]] = pc[i]
-            if i == len(pc) - 1:
-                job_name += f"{param_names[i]}{i}"
-            else:
-                job_name += f"{param_names[i]}{i}_"
+    jobs = []
+    for i in range(n_combos):
+        data = {name : param_combos[name][i] for name in param_names}
+        jobs.append({"name" : job_name(data), "n_seeds" : n_runs, "seed_variables" : seed_var_names, "changed_vars" : data})
 
-        project.new_job(job_name, n_runs, seed_var_names, data)
+    #Lazy jobs only get their folders and in-files once the scheduler starts them
+    project.new_jobs(jobs, lazy = lazy)
 
     return project
 
@@ -38,7 +39,8 @@ def main(
     n_seeds: int,
     param_combos: dict,
     lmp_command: str = "lmp",
-    seed_var_names: List[str] = ["velocity_seed"]
+    seed_var_names: List[str] = ["velocity_seed"],
+    lazy: bool = False
 ):
     """
     Parameters:
@@ -52,8 +54,9 @@ def main(
     - lmp_command: Command to run LAMMPS (e.g. lmp)
     - seed_var_names: List of variable names in the LAMMPS input file
          that will be used to set random seeds (e.g. "velocity_seed" or "langevin_seed")
+    - lazy: Create each seed's folder and in-file only when it is started instead of all up front
     """
     
-    proj = setup(infile_path, base_path, project_name , param_combos, n_seeds, seed_var_names)
+    proj = setup(infile_path, base_path, project_name , param_combos, n_seeds, seed_var_names, lazy)
     proj.run_all_jobs_mpi(ncores, np, lammps_env_var = lmp_command)
 
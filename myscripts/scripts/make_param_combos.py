@@ -1,6 +1,5 @@
-from typing import Any, Optional, List
+from typing import Any, Iterator, Optional, List
 import numpy as np
-from itertools import product
 
 
 def make_param_combos(
@@ -38,27 +37,147 @@ def make_param_combos(
     ```
     The first parameter combo is the first enetry in each array, and so on. Note how the lattice constant
     is always pegged to the temperature.
+
+    Combinations are in the same order as `itertools.product` over the free parameters, but are built
+    from index grids so no Python loop runs per combination. For grids too large to hold in memory
+    use `iter_param_combos`.
+    """
+
+    grid = _ParamGrid(params, index_by)
+    return grid.combos(0, grid.n_combos)
+
+
+def iter_param_combos(
+    params : dict[str, List[Any]],
+    index_by: Optional[List[int]] = None,
+    chunk_size : int = 100_000,
+    ) -> Iterator[dict[str, np.ndarray]]:
+
+    """
+    Lazy version of `make_param_combos`. Yields the same combinations, in the same order, in chunks of
+    at most `chunk_size` combinations so the full grid is never held in memory.
+
+    Parameters:
+    -----------
+    - `params : dict`, `index_by : Optional[List[int]]` : Same as `make_param_combos`.
+    - `chunk_size : int` : Maximum number of combinations per chunk.
+
+    Returns:
+    --------
+    - Iterator over dictionaries of parameter names and numpy arrays of length <= `chunk_size`.
     """
 
-    if index_by == None:
-            index_by = -1*np.ones(len(param_names))
+    grid = _ParamGrid(params, index_by)
+    for start in range(0, grid.n_combos, chunk_size):
+        yield grid.combos(start, min(start + chunk_size, grid.n_combos))
+
+
+def sample_param_combos(
+    params : dict[str, List[Any]],
+    n_samples : int,
+    index_by: Optional[List[int]] = None,
+    method : str = "lhs",
+    continuous : bool = False,
+    seed : Optional[int] = None,
+    ) -> dict[str, np.ndarray]:
+
+    """
+    Space-filling alternative to `make_param_combos`. Instead of every combination, `n_samples` combinations
+    are drawn with a Latin hypercube or a Sobol sequence, which cover the parameter space evenly with far
+    fewer simulations than the full grid. The output has the same format as `make_param_combos`.
+
+    Parameters:
+    -----------
+    - `params : dict`, `index_by : Optional[List[int]]` : Same as `make_param_combos`. Pegged parameters
+       follow the parameter they are pegged to.
+    - `n_samples : int` : Number of combinations to draw. Sobol sequences are best balanced when this is a
+       power of 2.
+    - `method : str` : "lhs" (Latin hypercube) or "sobol".
+    - `continuous : bool` : If False, every sample is one of the given values of each parameter. If True,
+       free parameters are sampled anywhere between the smallest and largest given value, and pegged
+       parameters are linearly interpolated against the parameter they are pegged to.
+    - `seed : Optional[int]` : Seed of the sampler, for reproducible sweeps.
+
+    Returns:
+    --------
+    - `data : dict` : Dictionary of parameter names and arrays of length `n_samples`.
+    """
+
+    from scipy.stats import qmc
+
+    grid = _ParamGrid(params, index_by)
+    if method == "lhs":
+        sampler = qmc.LatinHypercube(d = len(grid.free), seed = seed)
+    elif method == "sobol":
+        sampler = qmc.Sobol(d = len(grid.free), seed = seed)
     else:
-        index_by = np.array(index_by)
+        raise ValueError(f"Unknown sampling method {method}, expected \"lhs\" or \"sobol\"")
+    unit_samples = sampler.random(n_samples)
+
+    if not continuous:
+        #Each level of a parameter gets an equal share of [0, 1)
+        free_idx = [np.minimum((unit_samples[:, k] * len(grid.values[j])).astype(int), len(grid.values[j]) - 1)
+                    for k, j in enumerate(grid.free)]
+        return grid.from_indices(free_idx)
+
+    data = {}
+    for k, j in enumerate(grid.free):
+        values = grid.values[j].astype(float)
+        data[grid.names[j]] = values.min() + unit_samples[:, k] * (values.max() - values.min())
+    for j in range(len(grid.names)):
+        if grid.anchor[j] != j:
+            anchor_values = grid.values[grid.anchor[j]].astype(float)
+            order = np.argsort(anchor_values)
+            data[grid.names[j]] = np.interp(data[grid.names[grid.anchor[j]]], anchor_values[order],
+                                            grid.values[j].astype(float)[order])
+    return {name : data[name] for name in grid.names}
+
+
+class _ParamGrid:
+    '''
+    Index bookkeeping shared by the combination functions. Combination i of the grid is
+        np.unravel_index(i, shape) over the free parameters, which is the same order as
+        itertools.product. Pegged parameters take the index of the free parameter they
+        are (possibly indirectly) pegged to.
+    '''
+
+    def __init__(self, params, index_by):
+        self.names = list(params.keys())
+        self.values = [np.asarray(arr) for arr in params.values()]
+
+        if index_by is None:
+            index_by = -1*np.ones(len(self.names), dtype = int)
+        index_by = np.asarray(index_by, dtype = int)
+        if len(index_by) != len(self.names):
+            raise ValueError(f"index_by has {len(index_by)} entries but there are {len(self.names)} parameters")
+
+        #Resolve chains of pegged parameters down to a free parameter
+        self.anchor = []
+        for j in range(len(self.names)):
+            a, seen = j, set()
+            while index_by[a] != -1:
+                if a in seen:
+                    raise ValueError(f"index_by contains a cycle through parameter {self.names[j]}")
+                seen.add(a)
+                a = int(index_by[a])
+            if len(self.values[j]) != len(self.values[a]):
+                raise ValueError(f"Parameter {self.names[j]} is pegged to {self.names[a]} but has a different number of values")
+            self.anchor.append(a)
+
+        self.free = [j for j in range(len(self.names)) if index_by[j] == -1]
+        self.shape = tuple(len(self.values[j]) for j in self.free)
+        self.n_combos = int(np.prod(self.shape))
 
-    param_values =  [np.array(arr) for arr in params.values()]
-    param_names = np.array(list(params.keys()))
 
-    combos = product(*[pv for i,pv in enumerate(param_values) if index_by[i] == -1])
-    n_combos = np.prod([len(param_values[i]) for i in range(len(param_values)) if index_by[i] == -1])
-    data = {param_names[i] : np.zeros(n_combos) for i in range(len(param_names))}
+    def combos(self, start, stop) -> dict:
+        return self.from_indices(np.unravel_index(np.arange(start, stop), self.shape))
 
-    for i, combo in enumerate(combos):
-        for j, param_name in enumerate(param_names):
-            if index_by[j] == -1:
-                data[param_name][i] = combo[j]
-            else:
-                combo_np = np.array(combo)
-                other_idx = np.where(param_values[index_by[j]] == combo_np[index_by[j]])[0][0]
-                data[param_name][i] = param_values[j][other_idx]
 
-    return data
\ No newline at end of file
+    def from_indices(self, free_idx) -> dict:
+        idx_of = dict(zip(self.free, free_idx))
+        data = {}
+        for j, name in enumerate(self.names):
+            column = self.values[j][idx_of[self.anchor[j]]]
+            #Numeric parameters are returned as floats like before
+            data[name] = column.astype(float) if column.dtype.kind in "biuf" else column
+        return data
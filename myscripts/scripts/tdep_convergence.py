@@ -1,155 +1,282 @@
-# ### Run multiple MD simulations with different velocity seeds
-# ### to get set of configurations that are uncorrelated and better
-# ### represent all of phase space.
-
-# from src import LAMMPS_Project
-# from joblib import Parallel, delayed
-# import numpy as np
-# import os
-
-# ## MD PARAMETERS ################
-
-# # Different configurations to generate
-# # Will generate max from this list and sample to create others
-# N_samples = [10,20,30,40,50,75,100,150,200,300,400]
-
-# # Number of simulations to run to generate configurations
-# N_simulations = 20
-# N_steps_per_simulation = 1000000
-
-
-# temp = 1600
-# infile_path = "/home/emeitz/scripts/TDEP/SW/TDEP_SW.in"
-# project_name = f"SW_3UC_TDEP_Samples_{temp}"
-# base_path = os.getenv("EXTRA_STORAGE")
-
-# ncores = 40
-# n_mpi_domains = 4
-# dump_header_len = 9
-
-# ## TDEP PARAMETERS #############
-
-# r_cut2 = 3.77118
-# r_cut3 = 3.77118
-# dt_fs = 1
-# num_unit_cell = 3
-# N_atoms = 216
-# ucposcar_path = r"/home/emeitz/scripts/TDEP/SW/infile.ucposcar"
-# tdep_bin = "/home/emeitz/software/tdep-devel/bin"
-# TDEP_script_path = "/home/emeitz/scripts/TDEP/TDEP_from_MD.py"
-
-# ##############################
-
-
-# N_samples_max = np.amax(N_samples)
-# samples_per_simulation = N_samples_max / N_simulations
-# data_interval = int(np.ceil(N_steps_per_simulation/samples_per_simulation))
-
-
-# #Run Simulations
-# folder_name = "simulation_results"
-# proj = LAMMPS_Project(project_name, infile_path, base_path)
-# proj.new_job(folder_name, N_simulations, ["velocity_seed"], {"T" : temp, "N_steps" : N_steps_per_simulation, "data_interval" : data_interval})
-# proj.run_all_jobs_mpi(ncores, n_mpi_domains)
-
-
-# # Compile Outputs from Each Simulation into One File
-# compiled_data_path = os.path.join(proj.outpath, "COMPILED_DATA")
-# os.mkdir(compiled_data_path)
-
-# dump_files_to_concat = ["dump.positions", "dump.positions_unrolled", "dump.forces"]
-# printed_files_to_concat = ["dump.stat"] #first line is comment each other line corresponds to one step
-# files_to_copy = ["equilibrium.atom", "equilibrium.energies"]
-
-# #Copy eq.atom and eq.energies to each folder
-# for n_samp in np.sort(N_samples):
-#     out_file_path = os.path.join(compiled_data_path, f"N_{n_samp}")
-#     os.mkdir(out_file_path)
-#     for file in files_to_copy:
-#         current_path = os.path.join(proj.outpath, folder_name, f"seed0", file)
-#         copy_to = os.path.join(out_file_path, file)
-#         os.system(f"cp {current_path} {copy_to}")
-
-# #Create version with all samples
-# lines_per_sample = (N_atoms + dump_header_len)
-# max_lines_to_copy = N_samples_max * lines_per_sample
-# first_out_file_path = os.path.join(compiled_data_path, f"N_{N_samples_max}")
-# for file in dump_files_to_concat:
-#     lines_copied = 0
-#     with open(os.path.join(first_out_file_path, file), "w") as outfile:   
-#         for i in range(N_simulations):
-#             infile_path = os.path.join(proj.outpath, folder_name, f"seed{i}", file)
-#             with open(infile_path, "r") as infile:
-#                 for line in infile:
-#                     if lines_copied < max_lines_to_copy:
-#                         outfile.write(line)
-#                         lines_copied += 1
-
-# max_lines_to_copy = N_samples_max
-# for file in printed_files_to_concat:
-#     lines_copied = 0
-#     with open(os.path.join(first_out_file_path, file), "w") as outfile:
-#         outfile.write("# Comment line: Fix print output\n")
-#         for i in range(N_simulations):
-#             infile_path = os.path.join(proj.outpath, folder_name, f"seed{i}", file)
-#             with open(infile_path, "r") as infile:
-#                 for line_num, line in enumerate(infile):
-#                     if line_num != 0 and lines_copied < max_lines_to_copy:
-#                         outfile.write(line)
-#                         lines_copied += 1
-
-# #Create folders for other samples and copy portion of compiled data
-# for n_samp in np.sort(N_samples)[:-1]:
-#     out_file_path = os.path.join(compiled_data_path, f"N_{n_samp}")
-
-#     sample_idxs = np.sort(np.random.choice(range(N_samples_max), n_samp, replace=False))
-
-#     for file in printed_files_to_concat:
-#         with open(os.path.join(out_file_path, file), "w") as outfile:
-#             outfile.write("# Comment line: Fix print output\n")
-#             infile_path = os.path.join(compiled_data_path, f"N_{N_samples_max}", file)
-#             with open(infile_path, "r") as infile:
-#                 for line_num, line in enumerate(infile):
-#                     if line_num != 0 and (line_num-1) in sample_idxs:
-#                         outfile.write(line)
-
-#     #Sample Dump Files
-#     for file in dump_files_to_concat:
-#         infile_path = os.path.join(compiled_data_path, f"N_{N_samples_max}", file)
-#         with open(os.path.join(out_file_path, file), "w") as outfile, open(infile_path, "r") as infile:
-
-#             lines_per_sample = (N_atoms + dump_header_len)
-#             sample_idx = 0
-#             it = np.nditer(sample_idxs);
-#             next_sample_idx = it[0]
-#             while not it.finished:
-#                 if sample_idx == next_sample_idx:
-#                     for _ in range(lines_per_sample):
-#                         outfile.write(infile.readline())
-#                     sample_idx += 1
-#                     it.iternext()
-#                     if not it.finished:
-#                         next_sample_idx = it[0]
-#                     else:
-#                         break
-#                 else: #skip lines and iterator sample_idx
-#                     for _ in range(lines_per_sample):
-#                         infile.readline();
-#                     sample_idx += 1
-                
-
-# #Activate version of TDEP that can remap-forceconstants
-# current_path = os.environ.get('PATH', '')
-# new_path = f'{tdep_bin}:{current_path}'
-# os.environ['PATH'] = new_path
-
-# #Call Main TDEP Script
-
-# for i, n_samp in enumerate(N_samples):
-#     print(f"Running TDEP on {n_samp} Samples")
-#     path = os.path.join(compiled_data_path, f"N_{n_samp}")
-#     os.system(f"python3 {TDEP_script_path} -T {temp} -dt {dt_fs} -nuc {num_unit_cell} -p {path} -ucp {ucposcar_path} -nt {ncores} -r2 {r_cut2} -r3 {r_cut3} -nsteps {n_samp}")
-
-
-# # Parse Force Constants to Julia
+### Convergence of TDEP force constants with the number of MD samples.
+### Configurations from several uncorrelated MD simulations (e.g. the seeds of one job
+### run by lammps_param_sweep) are pooled, nested subsets of N_samples configurations
+### are drawn from the pool and force constants are extracted for every subset.
 
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import typer
+from joblib import Parallel, delayed
+
+from myscripts.src.FileIO.CompressedFile import open_file, resolve_path
+from myscripts.src.FileIO.DumpIndex import DumpIndex
+from myscripts.scripts.tdep_from_lammps import parse_MD_data, run_TDEP
+
+app = typer.Typer()
+
+DUMP_FILES = ["dump.positions", "dump.positions_unrolled", "dump.forces"]
+STAT_FILE = "dump.stat" #first line is comment each other line corresponds to one step
+FILES_TO_COPY = ["equilibrium.atom", "equilibrium.energies"]
+STATE_FILE = "convergence.json"
+
+
+def sample_folder(compiled_path, n_samples) -> str:
+    return os.path.join(compiled_path, f"N_{n_samples}")
+
+
+def load_state(compiled_path, random_seed) -> dict:
+    '''
+    State of a convergence study: the permutation of the pooled configurations every
+        subset is drawn from, the subsets already written and the TDEP runs finished.
+        The subset of size n is the first n entries of the permutation, so subsets are
+        nested and adding a size later does not change the existing ones.
+    '''
+    path = os.path.join(compiled_path, STATE_FILE)
+    if os.path.isfile(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {"random_seed" : random_seed, "permutation" : [], "compiled" : [], "finished" : []}
+
+
+def save_state(compiled_path, state) -> None:
+    path = os.path.join(compiled_path, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def finished_key(n_samples, settings : dict) -> str:
+    '''
+    Name a finished TDEP run is recorded under in the state: the subset size and a hash of
+        every setting that changes the force constants, so changing e.g. a cutoff reruns
+        the subsets instead of keeping the old force constants.
+    '''
+    #-1 and -1.0 are the same cutoff
+    settings = {k : float(v) for k, v in settings.items()}
+    digest = hashlib.sha1(json.dumps(settings, sort_keys = True).encode()).hexdigest()[:12]
+    return f"{n_samples}_{digest}"
+
+
+def extend_permutation(state, pool_size) -> np.ndarray:
+    '''
+    Grows the permutation to cover `pool_size` configurations. New configurations are
+        appended in random order after the existing ones, which keeps earlier subsets valid.
+    '''
+    permutation = np.array(state["permutation"], dtype = int)
+    if pool_size > len(permutation):
+        rng = np.random.default_rng([state["random_seed"], len(permutation)])
+        permutation = np.concatenate([permutation, len(permutation) + rng.permutation(pool_size - len(permutation))])
+        state["permutation"] = permutation.tolist()
+    return permutation
+
+
+def compile_subsets(seed_folders : list, compiled_path, sizes : list, permutation : np.ndarray, ucposcar_path) -> None:
+    '''
+    Writes the subsets of every size in `sizes` in a single pass over the dumps of the
+        seeds. Configuration k (counted across the seeds in order) belongs to the subset
+        of size n if its position in `permutation` is less than n. Frames are copied with
+        their headers, straight from the byte ranges in each dump's DumpIndex, so every
+        subset folder looks like a normal simulation folder.
+    '''
+    pool_size = len(permutation)
+    position = np.empty(pool_size, dtype = int)
+    position[permutation] = np.arange(pool_size)
+
+    for n in sizes:
+        os.makedirs(sample_folder(compiled_path, n), exist_ok = True)
+        for file in FILES_TO_COPY:
+            #Compressed files keep their suffix, readers find them through resolve_path
+            source = resolve_path(os.path.join(seed_folders[0], file))
+            shutil.copy(source, os.path.join(sample_folder(compiled_path, n), os.path.basename(source)))
+        shutil.copy(ucposcar_path, os.path.join(sample_folder(compiled_path, n), "infile.ucposcar"))
+
+    for file in DUMP_FILES:
+        out_files = [open(os.path.join(sample_folder(compiled_path, n), file), "wb") for n in sizes]
+        try:
+            k = 0
+            for seed_folder in seed_folders:
+                #Frames that are in none of the subsets are skipped without being read
+                index = DumpIndex(resolve_path(os.path.join(seed_folder, file)))
+                n_frames = min(len(index), pool_size - k)
+                for frame in range(n_frames):
+                    targets = [out_file for n, out_file in zip(sizes, out_files) if position[k + frame] < n]
+                    if len(targets) > 0:
+                        frame_bytes = index.frame_bytes(frame)
+                        for out_file in targets:
+                            out_file.write(frame_bytes)
+                index.close()
+                k += n_frames
+                if k == pool_size:
+                    break
+        finally:
+            for out_file in out_files:
+                out_file.close()
+        if k < pool_size:
+            raise RuntimeError(f"Only {k} configurations in {file} of {len(seed_folders)} simulations, need {pool_size}")
+
+    out_files = [open(os.path.join(sample_folder(compiled_path, n), STAT_FILE), "w") for n in sizes]
+    try:
+        for out_file in out_files:
+            out_file.write("# Comment line: Fix print output\n")
+        k = 0
+        for seed_folder in seed_folders:
+            with open_file(resolve_path(os.path.join(seed_folder, STAT_FILE)), "r") as f:
+                for line in f:
+                    if line.startswith("#"):
+                        continue
+                    if k == pool_size:
+                        break
+                    for n, out_file in zip(sizes, out_files):
+                        if position[k] < n:
+                            out_file.write(line)
+                    k += 1
+            if k == pool_size:
+                break
+    finally:
+        for out_file in out_files:
+            out_file.close()
+    if k < pool_size:
+        raise RuntimeError(f"Only {k} rows in {STAT_FILE} of {len(seed_folders)} simulations, need {pool_size}")
+
+
+def run_sample_size(path, n_samples, temperature, timestep_fs, num_unit_cell, n_threads, r_cut2, r_cut3, r_cut4, stride,
+                    cache_dir = None, n_jobs = 1) -> tuple:
+    '''
+    Prepares the TDEP input of one subset with `n_jobs` processes and extracts its force
+        constants. Returns the subset size and the error parsing or TDEP failed with (None
+        on success), so one failed size does not stop the others.
+    '''
+    #Remove what is left of an earlier run of this size that did not finish
+    tdep_folder = os.path.join(path, f"TDEP_data{stride}")
+    if os.path.isdir(tdep_folder):
+        shutil.rmtree(tdep_folder)
+
+    try:
+        TDEP_folder = parse_MD_data(path, num_unit_cell, temperature, timestep_fs, True, stride, n_samples, n_jobs)
+        run_TDEP(TDEP_folder, n_threads, r_cut2, r_cut3, r_cut4, stride, cache_dir)
+    except (RuntimeError, ValueError, OSError) as e:
+        return n_samples, f"{type(e).__name__}: {e}"
+    return n_samples, None
+
+
+def tdep_convergence(
+    simulation_path : Path,
+    n_samples : List[int],
+    temperature : float,
+    timestep_fs : float,
+    num_unit_cell : int,
+    ucposcar_path : Path,
+    ncores : int,
+    n_threads : int,
+    r_cut2 : float,
+    r_cut3 : float,
+    r_cut4 : float = -1,
+    stride : int = 1,
+    compiled_path : Optional[Path] = None,
+    random_seed : int = 0,
+    tdep_bin : Optional[Path] = None,
+    cache_dir : Optional[Path] = None,
+):
+    """
+    Extracts force constants from nested subsets of the configurations of several MD simulations.
+
+    Parameters:
+    - simulation_path: Folder with one sub-folder per simulation (e.g. seed0, seed1, ...), each containing
+        dump.positions, dump.positions_unrolled, dump.forces, dump.stat, equilibrium.atom and equilibrium.energies
+    - n_samples: Number of configurations in each subset. The largest must not exceed the configurations available
+    - ncores: Number of cores shared by the TDEP runs
+    - n_threads: MPI ranks of each TDEP run, ncores // n_threads subsets are processed at a time
+    - compiled_path: Folder the subsets are written to (N_{n} sub-folders), defaults to simulation_path/COMPILED_DATA
+    - random_seed: Seed of the permutation subsets are drawn from
+    - tdep_bin: Folder with a version of TDEP that can remap force constants, prepended to PATH
+    - cache_dir: Shared TDEPCache folder, subsets with the same inputs and settings as an earlier run are not rerun
+
+    Calling this again with more sizes only writes and runs the new sizes.
+    """
+
+    simulation_path = os.path.abspath(simulation_path)
+    compiled_path = os.path.abspath(compiled_path or os.path.join(simulation_path, "COMPILED_DATA"))
+    os.makedirs(compiled_path, exist_ok = True)
+
+    seed_folders = sorted((os.path.join(simulation_path, d) for d in os.listdir(simulation_path)
+                           if d.startswith("seed") and d[4:].isdigit()), key = lambda d: int(os.path.basename(d)[4:]))
+    if len(seed_folders) == 0:
+        raise RuntimeError(f"No seed folders found in {simulation_path}")
+
+    sizes = sorted(set(int(n) for n in n_samples))
+    state = load_state(compiled_path, random_seed)
+    permutation = extend_permutation(state, max(max(sizes), len(state["permutation"])))
+
+    to_compile = [n for n in sizes if n not in state["compiled"]]
+    if len(to_compile) > 0:
+        print(f"Writing subsets of {to_compile} samples from {len(seed_folders)} simulations")
+        compile_subsets(seed_folders, compiled_path, to_compile, permutation, ucposcar_path)
+        state["compiled"] = sorted(set(state["compiled"]) | set(to_compile))
+        save_state(compiled_path, state)
+
+    settings = {"temperature" : temperature, "timestep_fs" : timestep_fs, "num_unit_cell" : num_unit_cell,
+                "r_cut2" : r_cut2, "r_cut3" : r_cut3, "r_cut4" : r_cut4, "stride" : stride}
+    to_run = [n for n in sizes if finished_key(n, settings) not in state["finished"]]
+    if len(to_run) == 0:
+        print("Force constants of every sample size already extracted")
+        return compiled_path
+
+    #Activate version of TDEP that can remap-forceconstants
+    if tdep_bin is not None:
+        os.environ["PATH"] = f"{tdep_bin}:{os.environ.get('PATH', '')}"
+
+    n_parallel = max(min(ncores // n_threads, len(to_run)), 1)
+    print(f"Running TDEP on {to_run} samples, {n_parallel} at a time")
+    #Every subset parses its dumps with its share of the cores, not a pool of its own over all of them
+    n_jobs = max(ncores // n_parallel, 1)
+    #Largest subsets take longest, start them first
+    finished = Parallel(n_jobs = n_parallel, return_as = "generator_unordered")(
+        delayed(run_sample_size)(sample_folder(compiled_path, n), n, temperature, timestep_fs, num_unit_cell,
+                                 n_threads, r_cut2, r_cut3, r_cut4, stride, cache_dir, n_jobs)
+        for n in sorted(to_run, reverse = True))
+    failed = []
+    for n, error in finished:
+        if error is not None:
+            print(f"TDEP failed on {n} samples: {error}")
+            failed.append(n)
+            continue
+        print(f"Finished TDEP on {n} samples")
+        state["finished"].append(finished_key(n, settings))
+        save_state(compiled_path, state)
+    if len(failed) > 0:
+        raise RuntimeError(f"TDEP failed on {sorted(failed)} samples, rerun to retry them")
+
+    return compiled_path
+
+
+@app.command()
+def main(
+    simulation_path : Path,
+    temperature : float,
+    timestep_fs : float,
+    num_unit_cell : int,
+    ucposcar_path : Path,
+    ncores : int,
+    n_threads : int,
+    r_cut2 : float,
+    r_cut3 : float,
+    n_samples : List[int] = typer.Option(..., "--n-samples", "-n"),
+    r_cut4 : float = -1,
+    stride : int = 1,
+    compiled_path : Optional[Path] = None,
+    random_seed : int = 0,
+    tdep_bin : Optional[Path] = None,
+    cache_dir : Optional[Path] = None,
+):
+    tdep_convergence(simulation_path, n_samples, temperature, timestep_fs, num_unit_cell, ucposcar_path,
+                     ncores, n_threads, r_cut2, r_cut3, r_cut4, stride, compiled_path, random_seed, tdep_bin, cache_dir)
+
+
+if __name__ == "__main__":
+    app()
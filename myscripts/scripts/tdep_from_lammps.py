@@ -1,65 +1,67 @@
 import numpy as np
 import os
+import shutil
+import subprocess
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Optional
+
+from myscripts.src.FileIO.CompressedFile import open_file, resolve_path
+from myscripts.src.FileIO.DumpFile import DumpFile, split_dumps
+from myscripts.src.FileIO.DumpIndex import DumpIndex
+from myscripts.src.FileIO.TableWriter import write_table
+from myscripts.src.FileIO.TDEPCache import TDEPCache
+from myscripts.src.FileIO.TrajectoryCache import TrajectoryCache
 
 def remove_dump_headers(simulation_folder,tdep_folder):
-    bash_script = f""" #!/bin/bash
-
-        # figure out how many atoms there are
-        na=`head -n 4 dump.forces | tail -n 1`
-        # remove the header from the stat file
-        grep -v '^#' dump.stat > ./{tdep_folder}/infile.stat
-        # figure out how many timesteps there are
-        nt=`wc -l ./{tdep_folder}/infile.stat"""
-    
-    bash_script_end = """| awk '{print $1}'`
-    
-        # create the positions and force files
-        [ -f infile.forces ] && rm infile.forces
-        [ -f infile.positions ] && rm infile.positions
-        for t in `seq 1 ${nt}`
-        do
-            nl=$(( ${na}+9))
-            nll=$(( ${nl}*${t} ))
-            echo "t ${t} ${nl} ${nll}"
-            head -n ${nll} dump.forces | tail -n ${na} >> infile.forces
-            head -n ${nll} dump.positions | tail -n ${na} >> infile.positions
-            head -n ${nll} dump.positions_unrolled | tail -n ${na} >> infile.positions_unrolled
-        done
-
-        head -n ${nll} equilibrium.atom | tail -n ${na} >> infile.eq_positions
-    """
+    '''
+    Strips the 9 line frame headers from dump.forces, dump.positions and
+        dump.positions_unrolled in a single streaming pass over each file, writing
+        infile.forces, infile.positions and infile.positions_unrolled. All three dumps
+        must contain the same frames with the same number of atoms. Compressed dumps
+        (e.g. dump.forces.gz) are used when the plain ones are not there.
+    Also writes the comment-free stat file to the TDEP folder and the atoms of the last
+        frame of equilibrium.atom to infile.eq_positions.
+    parse_MD_data() reads the dumps directly and does not need these files, this is for
+        producing them by hand.
+    '''
+    strip_stat_comments(simulation_folder, tdep_folder)
+
+    # create the positions and force files
+    dumps = {
+        resolve_path(os.path.join(simulation_folder, "dump.forces")) : os.path.join(simulation_folder, "infile.forces"),
+        resolve_path(os.path.join(simulation_folder, "dump.positions")) : os.path.join(simulation_folder, "infile.positions"),
+        resolve_path(os.path.join(simulation_folder, "dump.positions_unrolled")) : os.path.join(simulation_folder, "infile.positions_unrolled"),
+    }
+    n_frames, n_atoms = split_dumps(dumps)
+    print(f"Stripped headers from {n_frames} frames of {n_atoms} atoms")
 
-    bash_script += bash_script_end
+    eq_atoms = None
+    for _, atom_lines in DumpFile(resolve_path(os.path.join(simulation_folder, "equilibrium.atom"))).frames():
+        eq_atoms = atom_lines
+    if eq_atoms is None or len(eq_atoms) != n_atoms:
+        raise RuntimeError(f"equilibrium.atom does not contain a frame with {n_atoms} atoms")
+    with open(os.path.join(simulation_folder, "infile.eq_positions"), "w") as f:
+        f.writelines(eq_atoms)
 
-    bash_file = os.path.join(simulation_folder, "remove_dump_headers")
-    with open(bash_file, "w") as f:
-        f.write(bash_script)
-    
-    os.chdir(simulation_folder)
-    os.system(f"chmod u+x {bash_file}")
-    os.system(f"{bash_file}")
+    return n_frames, n_atoms
+
+def strip_stat_comments(simulation_folder, tdep_folder):
+    # remove the header from the stat file
+    with open_file(resolve_path(os.path.join(simulation_folder, "dump.stat")), "r") as f_in, \
+         open(os.path.join(simulation_folder, tdep_folder, "infile.stat"), "w") as f_out:
+        f_out.writelines(line for line in f_in if not line.startswith("#"))
 
 #Assumes mono-atomic, most issues in generating infile.ssposcar automatically
-def parse_MD_data(simulation_folder, n_unit_cells, temperature, dt_fs, recalc_files, stride, N_steps):
+def parse_MD_data(simulation_folder, n_unit_cells, temperature, dt_fs, recalc_files, stride, N_steps, n_jobs = -1):
+    '''
+    Writes the TDEP input of a simulation folder to a new TDEP_data{stride} folder inside
+        it and returns the path of that folder. Dumps are parsed and written by `n_jobs`
+        processes (all cores by default).
+    '''
 
     if not os.path.isdir(simulation_folder):
         raise RuntimeError(f"Simulation folder is not a valid directory: {simulation_folder}")
     
-    old_files = {
-        "infile.positions",
-        "infile.forces",
-        "infile.positions_unrolled",
-        "infile.eq_positions"
-    }
-
-    #Delete old files generated by remove_dump_headers
-    if recalc_files:
-        for file in old_files:
-            if os.path.isfile(os.path.join(simulation_folder, file)):
-                os.system(f"rm -rf {os.path.join(simulation_folder, file)}")
-
     # Check if required files are present
     required_files = {
         "Eq Position Dump" : "equilibrium.atom", #dump with cols: id type xs ys zs mass (sorted by id)
@@ -70,8 +72,9 @@ def parse_MD_data(simulation_folder, n_unit_cells, temperature, dt_fs, recalc_fi
         "Unit cell" : "infile.ucposcar"
     }
 
+    #Any of these may also be compressed (e.g. dump.forces.gz)
     for file in required_files.values():
-        if not os.path.isfile(os.path.join(simulation_folder, file)):
+        if not os.path.isfile(resolve_path(os.path.join(simulation_folder, file))):
             raise RuntimeError(f"Expected {file} in simulation folder")
         
     #Make new directory for TDEP data
@@ -79,18 +82,50 @@ def parse_MD_data(simulation_folder, n_unit_cells, temperature, dt_fs, recalc_fi
     TDEP_folder = os.path.join(simulation_folder, tdep_folder)
     os.mkdir(TDEP_folder)
     
-    if recalc_files:
-        remove_dump_headers(simulation_folder, tdep_folder)
-
-    #Strip first col from data
-    posn_data = np.loadtxt(os.path.join(simulation_folder, "infile.positions"), usecols = [1,2,3])
-    force_data = np.loadtxt(os.path.join(simulation_folder, "infile.forces"), usecols= [1,2,3])
-    eq_posns = np.loadtxt(os.path.join(simulation_folder, "infile.eq_positions"), usecols = [2,3,4])
+    #Parsed data is cached as memory-mapped .npy files keyed by the dumps they are parsed from.
+    #Entry name : (dump, columns to keep (strips first col))
+    cache = TrajectoryCache(simulation_folder)
+    cached_data = {
+        "positions" : ("dump.positions", [1,2,3]),
+        "forces" : ("dump.forces", [1,2,3]),
+        "eq_positions" : ("equilibrium.atom", [2,3,4]),
+    }
+    sources = {name : resolve_path(os.path.join(simulation_folder, dump)) for name, (dump, _) in cached_data.items()}
+    #Without recalc_files existing entries are reused as they are, even if the dumps changed since
+    reuse = {name : cache.is_valid(name, [sources[name]]) if recalc_files else cache.exists(name) for name in cached_data}
+
+    #Every new TDEP folder needs the stat file
+    strip_stat_comments(simulation_folder, tdep_folder)
+    if recalc_files and not all(reuse.values()):
+        #Text files left by remove_dump_headers no longer match the dumps
+        for file in ["infile.positions", "infile.forces", "infile.positions_unrolled", "infile.eq_positions"]:
+            if os.path.isfile(os.path.join(simulation_folder, file)):
+                os.remove(os.path.join(simulation_folder, file))
+
+    #Trajectories are split into byte ranges parsed over a process pool and written into
+    #the cache chunk by chunk. equilibrium.atom only contributes its last frame
+    for name in ["positions", "forces"]:
+        if not reuse[name]:
+            index = DumpIndex(sources[name])
+            cache.load(name, [sources[name]], None, cached_data[name][1], index, n_jobs)
+            index.close()
+    if not reuse["eq_positions"]:
+        index = DumpIndex(sources["eq_positions"])
+        if len(index) == 0:
+            raise RuntimeError("equilibrium.atom does not contain any frames")
+        cache.store("eq_positions", [sources["eq_positions"]], index.read_frame(-1, usecols = cached_data["eq_positions"][1]))
+        index.close()
+
+    posn_data, force_data, eq_posns = [cache.open(name) for name in cached_data]
+    if len(posn_data) != len(force_data) or len(eq_posns) == 0 or len(posn_data) % len(eq_posns) != 0:
+        raise RuntimeError(f"{len(posn_data)} position rows, {len(force_data)} force rows and {len(eq_posns)} "
+                           "equilibrium atoms do not describe the same frames")
 
     #Save parsed files to TDEP folder
-    np.savetxt(os.path.join(TDEP_folder, "infile.positions"), posn_data, fmt = "%.15f")
-    np.savetxt(os.path.join(TDEP_folder, "infile.forces"), force_data, fmt = "%.15f")
-    np.savetxt(os.path.join(TDEP_folder, "infile.eq_positions"), eq_posns, fmt = "%.15f")
+    #Same output as np.savetxt(fmt = "%.15f"), streamed from the memory-mapped arrays in chunks
+    write_table(os.path.join(TDEP_folder, "infile.positions"), posn_data, "%.15f", n_jobs = n_jobs)
+    write_table(os.path.join(TDEP_folder, "infile.forces"), force_data, "%.15f", n_jobs = n_jobs)
+    write_table(os.path.join(TDEP_folder, "infile.eq_positions"), eq_posns, "%.15f")
 
 
     # Parse ucposcar
@@ -120,9 +155,8 @@ def parse_MD_data(simulation_folder, n_unit_cells, temperature, dt_fs, recalc_fi
         f.write(f"{species[0]}\n")
         f.write(f"{N_atoms}\n")
         f.write("Direct\n")
-        
-        for row in eq_posns:
-            f.write(f"{row[0]:.10f} {row[1]:.10f} {row[2]:.10f}\n")
+
+    write_table(os.path.join(TDEP_folder, "infile.ssposcar"), eq_posns[:, :3], "%.10f", mode = "a")
 
     #Build infile.meta
     with open(os.path.join(TDEP_folder, "infile.meta"), "w") as f:
@@ -133,7 +167,12 @@ def parse_MD_data(simulation_folder, n_unit_cells, temperature, dt_fs, recalc_fi
 
     return TDEP_folder
 
-def run_TDEP(TDEP_folder, n_threads, r_cut2, r_cut3, r_cut4, stride):
+def run_TDEP(TDEP_folder, n_threads, r_cut2, r_cut3, r_cut4, stride, cache_dir = None, cache_size_gb = 10):
+    '''
+    Extracts and remaps the force constants of the inputs in TDEP_folder. If cache_dir is
+        given, results of earlier runs on identical inputs and settings are restored from
+        there instead of running TDEP again, and new results are added to it.
+    '''
     required_files = {
         "Force Dump" : "infile.forces",
         "Position Dump" : "infile.positions",
@@ -147,16 +186,41 @@ def run_TDEP(TDEP_folder, n_threads, r_cut2, r_cut3, r_cut4, stride):
         if not os.path.isfile(os.path.join(TDEP_folder, file)):
             raise RuntimeError(f"Expected {file} in TDEP folder")
     
-    os.chdir(TDEP_folder)
-    os.system(f"mpirun -np {n_threads} extract_forceconstants -rc2 {r_cut2} -rc3 {r_cut3} -rc4 {r_cut4} -s {stride} --potential_energy_differences --verbose > tdep.log")
-    os.system("cp infile.ssposcar infile.newposcar")
-    os.system("mv outfile.forceconstant infile.forceconstant")
-    os.system("mv outfile.forceconstant_thirdorder infile.forceconstant_thirdorder")
-    os.system(f"remap_forceconstant")
-
-def run(temp, dt_fs, num_unit_cell, path, num_threads, r_cut2, r_cut3, r_cut4, recalc_files, stride, nsteps):
+    cache = None
+    if cache_dir is not None:
+        cache = TDEPCache(cache_dir, int(cache_size_gb * 1024**3))
+        key = cache.key(TDEP_folder, {"r_cut2" : r_cut2, "r_cut3" : r_cut3, "r_cut4" : r_cut4, "stride" : stride})
+        if cache.restore(key, TDEP_folder):
+            print(f"Restored TDEP results for {TDEP_folder} from cache")
+            return
+    before = {f.name : f.stat().st_mtime_ns for f in os.scandir(TDEP_folder) if f.is_file()}
+
+    #Run inside the TDEP folder without changing the working directory of this process,
+    #so several TDEP runs can be started from the same process
+    with open(os.path.join(TDEP_folder, "tdep.log"), "w") as log:
+        result = subprocess.run(["mpirun", "-np", str(n_threads), "extract_forceconstants", "-rc2", str(r_cut2),
+                                 "-rc3", str(r_cut3), "-rc4", str(r_cut4), "-s", str(stride),
+                                 "--potential_energy_differences", "--verbose"], cwd = TDEP_folder, stdout = log)
+    if result.returncode != 0:
+        raise RuntimeError(f"extract_forceconstants failed with exit code {result.returncode}, see {os.path.join(TDEP_folder, 'tdep.log')}")
+    shutil.copy(os.path.join(TDEP_folder, "infile.ssposcar"), os.path.join(TDEP_folder, "infile.newposcar"))
+    os.replace(os.path.join(TDEP_folder, "outfile.forceconstant"), os.path.join(TDEP_folder, "infile.forceconstant"))
+    if os.path.isfile(os.path.join(TDEP_folder, "outfile.forceconstant_thirdorder")):
+        os.replace(os.path.join(TDEP_folder, "outfile.forceconstant_thirdorder"), os.path.join(TDEP_folder, "infile.forceconstant_thirdorder"))
+    with open(os.path.join(TDEP_folder, "tdep.log"), "a") as log:
+        result = subprocess.run(["remap_forceconstant"], cwd = TDEP_folder, stdout = log)
+    #Failed or partial results must never reach the cache
+    if result.returncode != 0:
+        raise RuntimeError(f"remap_forceconstant failed with exit code {result.returncode}, see {os.path.join(TDEP_folder, 'tdep.log')}")
+
+    if cache is not None:
+        #Everything TDEP created or changed is part of the result
+        outputs = [f.name for f in os.scandir(TDEP_folder) if f.is_file() and before.get(f.name) != f.stat().st_mtime_ns]
+        cache.store(key, TDEP_folder, outputs)
+
+def run(temp, dt_fs, num_unit_cell, path, num_threads, r_cut2, r_cut3, r_cut4, recalc_files, stride, nsteps, cache_dir = None):
     TDEP_folder = parse_MD_data(path, num_unit_cell, temp, dt_fs, recalc_files, stride, nsteps)
-    run_TDEP(TDEP_folder, num_threads, r_cut2, r_cut3, r_cut4, stride)
+    run_TDEP(TDEP_folder, num_threads, r_cut2, r_cut3, r_cut4, stride, cache_dir)
 
 def tdep_from_lammps(
     temperature : float,
@@ -171,12 +235,14 @@ def tdep_from_lammps(
     r_cut4 : float = -1,
     make_input_files : bool = True,
     stride : int = 1,
+    cache_dir : Optional[Path] = None,
 ):
     """
     Calculates force constants from LAMMPS output. Assumes system is monoatomic. 
+    If cache_dir is given, TDEP results are reused for identical inputs (see TDEPCache).
     """
 
     os.system(f"cp {ucposcar_path} {os.path.join(path, 'infile.ucposcar')}")
 
     run(temperature, timestep_fs, num_unit_cell,
-         path, num_threads, r_cut2, r_cut3, r_cut4, make_input_files, stride, nsteps)
+         path, num_threads, r_cut2, r_cut3, r_cut4, make_input_files, stride, nsteps, cache_dir)
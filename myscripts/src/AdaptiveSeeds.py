@@ -0,0 +1,186 @@
+import os
+import asyncio
+import numpy as np
+import pandas as pd
+from rich import print
+from .FileIO.CompressedFile import resolve_path
+
+
+class AdaptiveSeeds:
+    '''
+    Runs only as many seeds of each job as it takes for an observable to converge. The
+        observable is one scalar per seed, read from a file in the seed folder by a parser
+        (e.g. FixPrintParser) and a reducer (e.g. the mean of one column).
+
+    Seeds are launched in waves per job. A job starts with `min_seeds` seeds, and every
+        time all seeds of its current wave have finished the standard error of the mean
+        over its seeds is compared to `target_sem`. A job that has not converged gets a
+        new wave sized from its current standard error (SEM ~ 1/sqrt(n)), until it hits
+        `max_seeds`. Jobs do not wait on each other, so cores freed by jobs that have
+        converged go to the waves of jobs that still need seeds.
+
+    Pass to LocalProject.run_all_jobs_mpi(adaptive = ...). Jobs are best created with
+        n_seeds = min_seeds, seeds are added to the project as they are needed.
+    '''
+
+    def __init__(self, filename : str, parser, reducer, target_sem : float, relative : bool = False,
+                 min_seeds : int = 3, max_seeds : int = 20):
+        '''
+        Filename: Name of the file inside every seed folder, e.g. "log.lammps".
+        Parser: Parsing strategy with a parse(path) -> dict method, e.g. ThermoLogParser().
+        Reducer: Function taking the parsed dictionary and returning the observable as a
+            single number, e.g. lambda d: d["Temp"].mean()
+        Target SEM: Standard error of the mean over seeds at which a job has converged.
+        Relative: Compare target_sem to SEM / |mean| instead of the SEM itself.
+        Min Seeds / Max Seeds: Seeds every job gets before its error is checked, and the
+            most seeds a job will get if it does not converge.
+        '''
+        if min_seeds < 2:
+            raise RuntimeError("min_seeds must be at least 2 to estimate a standard error")
+        if max_seeds < min_seeds:
+            raise RuntimeError(f"max_seeds ({max_seeds}) is smaller than min_seeds ({min_seeds})")
+        self.filename = filename
+        self.parser = parser
+        self.reducer = reducer
+        self.target_sem = target_sem
+        self.relative = relative
+        self.min_seeds = min_seeds
+        self.max_seeds = max_seeds
+
+        '''
+        Values: Dictionary of job name to {seed id : observable} for every finished seed.
+        Outstanding: Dictionary of job name to the number of its seeds queued or running.
+        '''
+        self.project = None
+        self.values = {}
+        self.outstanding = {}
+
+
+    def start(self, project, seed_jobs : list) -> list:
+        '''
+        Reads the observable of every seed that already finished and returns the seeds to
+            queue first: the unfinished seeds in `seed_jobs` (see LocalProject.get_all_jobs())
+            of jobs that have not converged yet, topped up to min_seeds.
+        '''
+        self.project = project
+        self.values = {}
+        self.outstanding = {}
+
+        pending = {}
+        for job in seed_jobs:
+            pending.setdefault(job.name, []).append(job)
+
+        queue = []
+        for name, job in project.jobs.items():
+            self.values[name] = {}
+            for seed in range(job.n_seeds):
+                if project.manifest.is_finished(name, seed):
+                    value = self.__observable(job, seed)
+                    if value is not None:
+                        self.values[name][seed] = value
+
+            if self.converged(name):
+                continue
+            seeds = pending.get(name, [])
+            self.outstanding[name] = len(seeds)
+            queue.extend(seeds)
+            if len(self.values[name]) + len(seeds) < self.min_seeds:
+                queue.extend(self.__add_seeds(name, self.min_seeds - len(self.values[name]) - len(seeds)))
+            elif len(seeds) == 0:
+                queue.extend(self.__next_wave(name))
+        return queue
+
+
+    async def on_done(self, job, result) -> list:
+        '''
+        Called by the JobScheduler when a seed finishes. Returns the next wave of seeds of
+            `job` once its current wave is complete and it has not converged. The seed's
+            file is parsed in a worker thread, so the scheduler keeps launching and reaping
+            seeds in the meantime.
+        '''
+        if result.exit_code == 0:
+            value = await asyncio.get_running_loop().run_in_executor(None, self.__observable, job, job.seed_id)
+            if value is not None:
+                self.values[job.name][job.seed_id] = value
+        #Only counted once its value is in, so the last seed of a wave sees every value
+        self.outstanding[job.name] -= 1
+        if self.outstanding[job.name] > 0:
+            return []
+        return self.__next_wave(job.name)
+
+
+    def sem(self, job_name : str) -> float:
+        '''
+        Standard error of the mean of the observable over the finished seeds of
+            `job_name` (relative to |mean| if `relative`). NaN with fewer than 2 seeds.
+        '''
+        values = np.array(list(self.values[job_name].values()), dtype = float)
+        if len(values) < 2:
+            return np.nan
+        sem = np.std(values, ddof = 1) / np.sqrt(len(values))
+        if self.relative:
+            sem /= abs(np.mean(values))
+        return float(sem)
+
+
+    def converged(self, job_name : str) -> bool:
+        return len(self.values[job_name]) >= self.min_seeds and self.sem(job_name) <= self.target_sem
+
+
+    def summary(self) -> pd.DataFrame:
+        '''
+        Number of finished seeds, mean and standard error of the observable of every job
+            and whether it converged.
+        '''
+        rows = {}
+        for name, values in self.values.items():
+            rows[name] = {
+                "n_seeds" : len(values),
+                "mean" : float(np.mean(list(values.values()))) if len(values) > 0 else np.nan,
+                "sem" : self.sem(name),
+                "converged" : self.converged(name),
+            }
+        return pd.DataFrame.from_dict(rows, orient = "index")
+
+
+    def __observable(self, job, seed_id : int) -> float:
+        '''
+        Observable of one seed, None (with a warning) if it cannot be read. Touches no
+            state, so it can run in a worker thread.
+        '''
+        path = resolve_path(os.path.join(job.seed_path(seed_id), self.filename))
+        if not os.path.isfile(path):
+            print(f"[yellow]WARNING[/yellow] {path} does not exist, seed left out of {job.name}'s error estimate")
+            return None
+        try:
+            return float(self.reducer(self.parser.parse(path)))
+        except Exception as e:
+            print(f"[yellow]WARNING[/yellow] Could not read observable from {path} ({e}), seed left out of {job.name}'s error estimate")
+            return None
+
+
+    def __next_wave(self, job_name : str) -> list:
+        '''
+        Seeds to add to `job_name`, sized so the SEM is expected to reach the target if
+            it falls as 1/sqrt(n). Empty if the job has converged or reached max_seeds.
+        '''
+        if self.converged(job_name):
+            return []
+        n_seeds = self.project.jobs[job_name].n_seeds
+        n_values = len(self.values[job_name])
+        if n_seeds >= self.max_seeds:
+            return []
+
+        if n_values < self.min_seeds:
+            #Failed seeds are replaced
+            n_new = self.min_seeds - n_values
+        else:
+            n_needed = int(np.ceil(n_values * (self.sem(job_name) / self.target_sem)**2))
+            n_new = max(n_needed - n_values, 1)
+        return self.__add_seeds(job_name, min(n_new, self.max_seeds - n_seeds))
+
+
+    def __add_seeds(self, job_name : str, n_new : int) -> list:
+        seeds = self.project.add_seeds(job_name, n_new)
+        self.outstanding[job_name] = self.outstanding.get(job_name, 0) + len(seeds)
+        return seeds
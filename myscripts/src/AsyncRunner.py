@@ -0,0 +1,206 @@
+import os
+import sys
+import asyncio
+import shlex
+import signal
+import socket
+import subprocess
+import time
+
+
+class RunResult:
+    '''
+    Outcome of a single child process launched by an AsyncRunner.
+    '''
+
+    def __init__(self, cmd : list, cwd : str, exit_code : int, stderr : str, start_time : float, end_time : float,
+                 user_time : float = None, system_time : float = None, max_rss_mb : float = None, host : str = None):
+        '''
+        Cmd: Argument list the child was launched with.
+        Cwd: Working directory of the child.
+        Exit Code: Exit code of the child. Negative if killed by a signal.
+        Stderr: Everything the child wrote to stderr.
+        Start Time / End Time: Wall clock times (time.time()) the child was launched / reaped.
+        User Time / System Time: CPU seconds used by the child and every descendant it
+            waited for (e.g. the ranks started by mpirun). None if the child never started.
+        Max RSS MB: Peak resident memory of the largest single process among them.
+        Host: Host name of the machine the child ran on.
+        '''
+        self.cmd = cmd
+        self.cwd = cwd
+        self.exit_code = exit_code
+        self.stderr = stderr
+        self.start_time = start_time
+        self.end_time = end_time
+        self.user_time = user_time
+        self.system_time = system_time
+        self.max_rss_mb = max_rss_mb
+        self.host = host if host is not None else socket.gethostname()
+
+    @property
+    def wall_time(self) -> float:
+        return self.end_time - self.start_time
+
+    @property
+    def cpu_time(self) -> float:
+        if self.user_time is None:
+            return None
+        return self.user_time + self.system_time
+
+    def stderr_tail(self, n_lines : int = 5) -> str:
+        return "\n".join(self.stderr.strip().splitlines()[-n_lines:])
+
+
+class AsyncRunner:
+    '''
+    Launches child processes (e.g. LAMMPS) from a single asyncio event loop. Each child
+        gets its own working directory, so nothing relies on the process-wide cwd and
+        hundreds of children can be driven from one Python process.
+
+    Children are reaped with os.wait4 from the event loop itself, which gives the CPU time
+        and peak memory of every child alongside its exit code. The loop is woken by a
+        pidfd per child on Linux and by SIGCHLD elsewhere, stderr is read through the
+        loop's pipe transport, so no thread is needed per child.
+    '''
+
+    #How often children are checked when neither a pidfd nor a SIGCHLD handler is available
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, max_concurrent : int = None):
+        '''
+        Max Concurrent: Upper limit on the number of children alive at once. None means
+            no limit (the caller is expected to do its own scheduling).
+        '''
+        self.max_concurrent = max_concurrent
+        self.__semaphore = None
+        self.__loop = None
+        #Exit checks of the children waiting on SIGCHLD
+        self.__sigchld_checks = set()
+
+
+    async def run(self, cmd, cwd : str) -> RunResult:
+        '''
+        Runs `cmd` (a string or an argument list) inside `cwd` and waits for it to exit.
+            Stdout is discarded, stderr is captured.
+        '''
+        args = shlex.split(cmd) if isinstance(cmd, str) else [str(arg) for arg in cmd]
+
+        if self.max_concurrent is None:
+            return await self.__run(args, cwd)
+
+        #A semaphore belongs to one event loop, make a new one if run from another loop
+        if self.__loop is not asyncio.get_running_loop():
+            self.__loop = asyncio.get_running_loop()
+            self.__semaphore = asyncio.Semaphore(self.max_concurrent)
+        async with self.__semaphore:
+            return await self.__run(args, cwd)
+
+
+    async def __run(self, args : list, cwd : str) -> RunResult:
+        start_time = time.time()
+        try:
+            proc = subprocess.Popen(args, cwd = cwd, stdout = subprocess.DEVNULL, stderr = subprocess.PIPE)
+        except (FileNotFoundError, PermissionError) as e:
+            #Report launch failures like a shell would instead of killing the coordinator
+            return RunResult(args, cwd, 127, str(e), start_time, time.time())
+
+        loop = asyncio.get_running_loop()
+        exited = self.__wait_for_exit(proc.pid, loop)
+        reader = asyncio.StreamReader()
+        transport = None
+        try:
+            transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), proc.stderr)
+            stderr = await reader.read()
+            status, usage, end_time = await exited
+        except asyncio.CancelledError:
+            exited.cancel()
+            proc.kill()
+            raise
+        finally:
+            if transport is not None:
+                transport.close()
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+        #ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        max_rss_mb = usage.ru_maxrss / (1024**2 if sys.platform == "darwin" else 1024)
+        return RunResult(args, cwd, proc.returncode, stderr.decode(errors = "replace"), start_time, end_time,
+                         usage.ru_utime, usage.ru_stime, max_rss_mb)
+
+
+    def __wait_for_exit(self, pid : int, loop) -> asyncio.Future:
+        '''
+        Future set to (wait status, resource usage, end time) of child `pid` once it exits.
+            Cancelling the future stops watching the child.
+        '''
+        future = loop.create_future()
+
+        def check():
+            if future.done():
+                return
+            try:
+                pid_done, status, usage = os.wait4(pid, os.WNOHANG)
+            except ChildProcessError:
+                future.set_exception(RuntimeError(f"Child {pid} was reaped by someone else, its exit code is lost"))
+                return
+            if pid_done != 0:
+                future.set_result((status, usage, time.time()))
+
+        try:
+            pidfd = os.pidfd_open(pid)
+        except (AttributeError, OSError):
+            pidfd = None
+
+        if pidfd is not None:
+            #A pidfd becomes readable when the child exits
+            loop.add_reader(pidfd, check)
+            def stop(_):
+                if not loop.is_closed():
+                    loop.remove_reader(pidfd)
+                os.close(pidfd)
+        else:
+            try:
+                if len(self.__sigchld_checks) == 0:
+                    loop.add_signal_handler(signal.SIGCHLD, self.__on_sigchld)
+                self.__sigchld_checks.add(check)
+                handle = None
+            except (RuntimeError, ValueError, AttributeError):
+                #Not in the main thread (or no SIGCHLD), fall back to polling
+                def poll():
+                    nonlocal handle
+                    check()
+                    if not future.done():
+                        handle = loop.call_later(self.POLL_INTERVAL, poll)
+                handle = loop.call_later(self.POLL_INTERVAL, poll)
+            def stop(_):
+                if handle is not None:
+                    handle.cancel()
+                    return
+                self.__sigchld_checks.discard(check)
+                if len(self.__sigchld_checks) == 0 and not loop.is_closed():
+                    loop.remove_signal_handler(signal.SIGCHLD)
+            #The child may have exited before the handler was installed
+            check()
+
+        future.add_done_callback(stop)
+        return future
+
+
+    def __on_sigchld(self) -> None:
+        #One SIGCHLD may stand for several children, check every child still running
+        for check in list(self.__sigchld_checks):
+            check()
+
+
+    async def run_many(self, commands : list) -> list:
+        '''
+        Runs every (cmd, cwd) pair in `commands` concurrently, respecting `max_concurrent`.
+            Results are returned in the same order as `commands`.
+        '''
+        return await asyncio.gather(*[self.run(cmd, cwd) for cmd, cwd in commands])
+
+
+    def run_sync(self, cmd, cwd : str) -> RunResult:
+        '''
+        Blocking version of run() for use outside of an event loop.
+        '''
+        return asyncio.run(self.run(cmd, cwd))
@@ -0,0 +1,172 @@
+import os
+import io
+import bz2
+import glob
+import gzip
+import lzma
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+
+#Suffix LAMMPS (and compress_file) give each format, and the magic bytes files of that format start with
+FORMATS = {
+    "gzip" : (".gz", b"\x1f\x8b"),
+    "xz" : (".xz", b"\xfd7zXZ\x00"),
+    "zstd" : (".zst", b"\x28\xb5\x2f\xfd"),
+    "bz2" : (".bz2", b"BZh"),
+}
+
+
+def compression_of(path) -> str:
+    '''
+    Compression format of the file at `path` ("gzip", "xz", "zstd" or "bz2") from its first
+        bytes, None for an uncompressed (or missing) file.
+    '''
+    try:
+        with open(path, 'rb') as f:
+            start = f.read(6)
+    except (FileNotFoundError, IsADirectoryError):
+        return None
+    for name, (_, magic) in FORMATS.items():
+        if start.startswith(magic):
+            return name
+    return None
+
+
+def is_compressed(path) -> bool:
+    return compression_of(path) is not None
+
+
+def resolve_path(path) -> str:
+    '''
+    `path` if it exists, otherwise the first compressed version of it that does
+        (e.g. dump.forces.gz for dump.forces). Returns `path` unchanged if neither exists,
+        so the caller's usual missing file error is raised.
+    '''
+    if os.path.exists(path):
+        return path
+    for suffix, _ in FORMATS.values():
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return path
+
+
+def open_file(path, mode = 'r', level : int = None, errors : str = None):
+    '''
+    Opens a plain or compressed file. When reading the format is detected from the first
+        bytes of the file, when writing from the suffix of `path`. Compressed files are
+        decompressed as they are read, nothing is written to disk.
+
+    Mode: 'r' / 'w' / 'a' for text, 'rb' / 'wb' / 'ab' for bytes.
+    Level: Compression level when writing, None for the default of the format.
+    Errors: Text decoding error handling, as for open().
+
+    zstd needs the optional zstandard package.
+    '''
+    binary_mode = mode.replace('t', '').replace('b', '') + 'b'
+    if 'r' in mode:
+        method = compression_of(path)
+    else:
+        method = next((name for name, (suffix, _) in FORMATS.items() if str(path).endswith(suffix)), None)
+
+    if method is None:
+        return open(path, mode, errors = errors) if 'b' not in mode else open(path, mode)
+
+    if method == "gzip":
+        f = gzip.open(path, binary_mode, **({} if level is None else {"compresslevel" : level}))
+    elif method == "xz":
+        f = lzma.open(path, binary_mode, **({} if level is None or 'r' in mode else {"preset" : level}))
+    elif method == "bz2":
+        f = bz2.open(path, binary_mode, **({} if level is None else {"compresslevel" : level}))
+    else:
+        f = _open_zstd(path, binary_mode, level)
+
+    if 'b' in mode:
+        return f
+    return io.TextIOWrapper(f, errors = errors)
+
+
+def _open_zstd(path, mode, level : int = None):
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(f"Reading or writing {path} needs the zstandard package (pip install zstandard)")
+
+    if 'r' in mode:
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames = True, closefd = True)
+        return io.BufferedReader(reader)
+    writer = zstandard.ZstdCompressor(level = 3 if level is None else level)
+    return writer.stream_writer(open(path, mode), closefd = True)
+
+
+def compress_file(path, method : str = "gzip", level : int = None, remove : bool = True) -> str:
+    '''
+    Compresses `path` to `path` + the suffix of `method` and returns the new path. The
+        compressed file is written under a temporary name first, so a half written file is
+        never picked up by resolve_path(). The original is removed unless `remove` is False.
+    '''
+    if method not in FORMATS:
+        raise ValueError(f"method must be one of {list(FORMATS)}, got {method}")
+    out_path = path + FORMATS[method][0]
+    tmp_path = out_path + ".tmp" + FORMATS[method][0]
+
+    with open(path, 'rb') as f_in, open_file(tmp_path, 'wb', level) as f_out:
+        shutil.copyfileobj(f_in, f_out, 1 << 24)
+    shutil.copystat(path, tmp_path)
+    os.replace(tmp_path, out_path)
+    if remove:
+        os.remove(path)
+    return out_path
+
+
+class OutputCompressor():
+    '''
+    Compresses the output files of finished seeds in background threads (zlib, lzma, bz2
+        and zstandard release the GIL while compressing), so the next seeds are started
+        without waiting. Files that are already compressed are left alone.
+
+    e.g. OutputCompressor(["dump.*", "log.lammps"]) compresses every dump and the log.
+    '''
+
+    def __init__(self, patterns : list, method : str = "gzip", level : int = None, n_threads : int = 2):
+        '''
+        Patterns: Glob patterns of the files to compress, relative to the seed folder.
+        Method: "gzip", "xz", "bz2" or "zstd".
+        Level: Compression level, None for the default of the format.
+        N Threads: Number of files compressed at once.
+        '''
+        if method not in FORMATS:
+            raise ValueError(f"method must be one of {list(FORMATS)}, got {method}")
+        self.patterns = patterns
+        self.method = method
+        self.level = level
+        self.n_threads = n_threads
+        self.__executor = None
+        self.__futures = []
+
+
+    def submit(self, folder) -> None:
+        '''
+        Queues every file in `folder` matching `patterns` for compression.
+        '''
+        if self.__executor is None:
+            self.__executor = ThreadPoolExecutor(self.n_threads)
+        suffixes = tuple(suffix for suffix, _ in FORMATS.values())
+        for pattern in self.patterns:
+            for path in sorted(glob.glob(os.path.join(folder, pattern))):
+                #Index sidecars (DumpIndex) and already compressed files are skipped
+                if os.path.isfile(path) and not path.endswith(suffixes + (".npz",)) and not is_compressed(path):
+                    self.__futures.append(self.__executor.submit(compress_file, path, self.method, self.level))
+
+
+    def wait(self) -> list:
+        '''
+        Blocks until every queued file is compressed. Returns the compressed paths, raises
+            the first error a compression ran into.
+        '''
+        paths = [future.result() for future in self.__futures]
+        self.__futures = []
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+        return paths
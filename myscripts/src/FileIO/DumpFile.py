@@ -0,0 +1,106 @@
+from itertools import islice, zip_longest
+
+from .CompressedFile import open_file
+
+
+class DumpFile():
+    '''
+    Streaming reader for LAMMPS text dumps (e.g. dump custom). Frames are read one at a
+        time, so memory use is bounded by a single frame no matter how long the
+        trajectory is.
+
+    Every frame is a 9 line header followed by one line per atom:
+        ITEM: TIMESTEP / <step> / ITEM: NUMBER OF ATOMS / <N> / ITEM: BOX BOUNDS ... /
+        <3 box lines> / ITEM: ATOMS <columns>
+
+    Compressed dumps (e.g. from "dump custom/gz") are decompressed as they are streamed.
+    '''
+
+    HEADER_LINES = 9
+
+    def __init__(self, path):
+        '''
+        Path: Absolute file path to the dump, contains filename and extension.
+        e.g. C:/Users/ejmei/Desktop/dump.forces
+        '''
+        self.path = path
+
+
+    def frames(self):
+        '''
+        Generator over the frames of the dump. Yields (timestep, atom_lines) where
+            atom_lines are the raw text lines of the frame with the header removed.
+        '''
+        for timestep, _, atom_lines in self.raw_frames():
+            yield timestep, atom_lines
+
+
+    def raw_frames(self):
+        '''
+        Same as frames() but yields (timestep, header_lines, atom_lines), so frames can be
+            copied to another dump unchanged.
+        '''
+        with open_file(self.path, 'r') as f:
+            while True:
+                header = list(islice(f, self.HEADER_LINES))
+                if len(header) == 0:
+                    return
+                if len(header) < self.HEADER_LINES or not header[0].startswith("ITEM: TIMESTEP"):
+                    raise RuntimeError(f"Malformed or truncated frame header in {self.path}")
+
+                timestep = int(header[1])
+                n_atoms = int(header[3])
+                atom_lines = list(islice(f, n_atoms))
+                if len(atom_lines) < n_atoms:
+                    raise RuntimeError(f"Truncated frame at timestep {timestep} in {self.path}")
+
+                yield timestep, header, atom_lines
+
+
+    def strip_headers(self, out_path) -> tuple:
+        '''
+        Writes the atom lines of every frame to `out_path` without the frame headers.
+            Returns (number of frames, number of atoms per frame).
+        '''
+        return split_dumps({self.path : out_path})
+
+
+def split_dumps(paths : dict) -> tuple:
+    '''
+    Strips the frame headers from several dumps of the same trajectory in a single pass
+        over each file. Every dump must have the same timesteps and atom count in every
+        frame, otherwise a RuntimeError is raised.
+
+    Paths: Dictionary of dump path to the path the header-less atom lines are written to.
+
+    Returns (number of frames, number of atoms per frame).
+    '''
+    dump_paths = list(paths.keys())
+    frame_iters = [DumpFile(path).frames() for path in dump_paths]
+    out_files = [open(out_path, 'w') for out_path in paths.values()]
+
+    n_frames = 0
+    n_atoms = None
+    try:
+        for frames in zip_longest(*frame_iters):
+            if any(frame is None for frame in frames):
+                short = [dump_paths[i] for i, frame in enumerate(frames) if frame is None]
+                raise RuntimeError(f"Dumps have different numbers of frames, {short} ended after {n_frames} frames")
+
+            timesteps = {timestep for timestep, _ in frames}
+            if len(timesteps) != 1:
+                raise RuntimeError(f"Dumps are out of sync at frame {n_frames}, timesteps: {sorted(timesteps)}")
+
+            frame_atoms = {len(atom_lines) for _, atom_lines in frames}
+            if len(frame_atoms) != 1 or (n_atoms is not None and n_atoms not in frame_atoms):
+                raise RuntimeError(f"Atom counts do not agree at timestep {timesteps.pop()}: {sorted(frame_atoms)}")
+            n_atoms = frame_atoms.pop()
+
+            for out_file, (_, atom_lines) in zip(out_files, frames):
+                out_file.writelines(atom_lines)
+            n_frames += 1
+    finally:
+        for out_file in out_files:
+            out_file.close()
+
+    return n_frames, n_atoms
@@ -0,0 +1,243 @@
+import os
+import numpy as np
+from itertools import islice
+from joblib import Parallel, delayed
+
+from .DumpFile import DumpFile
+from .CompressedFile import open_file, is_compressed
+
+
+def _parse_byte_range(path, start, stop, atom_ranges, usecols) -> np.ndarray:
+    '''
+    Runs in a worker process. Reads bytes [start, stop) of a dump in one go and parses the
+        atom lines of every frame in it, `atom_ranges` are their (start, stop) offsets
+        relative to `start`.
+    '''
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(stop - start)
+    return _parse_atom_lines(data, atom_ranges, usecols)
+
+
+def _parse_atom_lines(data, atom_ranges, usecols) -> np.ndarray:
+    rows = []
+    for atom_start, atom_stop in atom_ranges:
+        rows.extend(data[atom_start:atom_stop].decode().splitlines())
+    return np.loadtxt(rows, usecols = usecols, ndmin = 2)
+
+
+class DumpIndex():
+    '''
+    Byte offset, timestep and atom count of every frame of a LAMMPS text dump. With the
+        index any frame can be read directly, so strided or random subsets of a trajectory
+        only cost the frames that are actually read, and a dump can be split into byte
+        ranges that are parsed in parallel.
+
+    The index is saved next to the dump as "<dump>.index.npz" and rebuilt when the dump
+        changes. If the dump only grew (e.g. the simulation is still running) only the new
+        frames are indexed.
+
+    Compressed dumps are indexed by offsets into the decompressed stream. A compressed
+        stream can only be read forwards cheaply, so frames are read through one open
+        stream that is only reopened to go backwards, and parse() runs in a single pass.
+    '''
+
+    SUFFIX = ".index.npz"
+
+    def __init__(self, path, save : bool = True):
+        '''
+        Path: Absolute file path to the dump, contains filename and extension.
+        Save: Write the index next to the dump so later instances can load it.
+
+        Offsets: Byte offset of the start of every frame, plus the end of the last frame.
+        Atom Offsets: Byte offset of the first atom line of every frame.
+        Timesteps / N Atoms: Timestep and number of atoms of every frame.
+        '''
+        self.path = path
+        self.index_path = path + self.SUFFIX
+        self.save_index = save
+        self.compressed = is_compressed(path)
+        self.__stream = None
+        self.__signature = None
+
+        self.offsets = np.zeros(1, dtype = np.int64)
+        self.atom_offsets = np.zeros(0, dtype = np.int64)
+        self.timesteps = np.zeros(0, dtype = np.int64)
+        self.n_atoms = np.zeros(0, dtype = np.int64)
+        self.update()
+
+
+    def __len__(self) -> int:
+        return len(self.timesteps)
+
+
+    def update(self) -> None:
+        '''
+        Brings the index up to date with the dump, loading a saved index when possible.
+        '''
+        stat = os.stat(self.path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if len(self) > 0 and self.__signature == signature:
+            return
+        if len(self) == 0 and os.path.isfile(self.index_path):
+            saved = np.load(self.index_path)
+            self.offsets, self.atom_offsets = saved["offsets"], saved["atom_offsets"]
+            self.timesteps, self.n_atoms = saved["timesteps"], saved["n_atoms"]
+            if (int(saved["size"]), int(saved["mtime_ns"])) == signature:
+                self.__signature = signature
+                return
+
+        if self.offsets[-1] > stat.st_size or not self.__last_frame_unchanged():
+            #Dump was rewritten, start over
+            self.offsets = np.zeros(1, dtype = np.int64)
+            self.atom_offsets = self.timesteps = self.n_atoms = np.zeros(0, dtype = np.int64)
+
+        #Offsets of a compressed dump are into the decompressed stream, only a rescan can tell its end
+        if self.offsets[-1] < stat.st_size or self.compressed:
+            self.__scan(int(self.offsets[-1]))
+        self.__signature = signature
+
+        if self.save_index:
+            try:
+                np.savez(self.index_path + ".tmp.npz", offsets = self.offsets, atom_offsets = self.atom_offsets,
+                         timesteps = self.timesteps, n_atoms = self.n_atoms,
+                         size = stat.st_size, mtime_ns = stat.st_mtime_ns)
+                os.replace(self.index_path + ".tmp.npz", self.index_path)
+            except OSError:
+                #Read-only folder, keep the index in memory only
+                pass
+
+
+    def __last_frame_unchanged(self) -> bool:
+        if len(self) == 0:
+            return True
+        if self.compressed:
+            #A compressed dump is rewritten as a whole, it cannot be appended to in place
+            return False
+        with open(self.path, 'rb') as f:
+            f.seek(int(self.offsets[-2]))
+            header = list(islice(f, 2))
+        return len(header) == 2 and header[0].startswith(b"ITEM: TIMESTEP") and int(header[1]) == self.timesteps[-1]
+
+
+    def __scan(self, start) -> None:
+        '''
+        Indexes every complete frame from byte `start` on. A frame that is still being
+            written is left for the next update.
+        '''
+        offsets, atom_offsets, timesteps, n_atoms = [], [], [], []
+        end = start
+        with open_file(self.path, 'rb') as f:
+            f.seek(start)
+            while True:
+                header = list(islice(f, DumpFile.HEADER_LINES))
+                if len(header) < DumpFile.HEADER_LINES:
+                    break
+                if not header[0].startswith(b"ITEM: TIMESTEP"):
+                    raise RuntimeError(f"Malformed frame header at byte {end} in {self.path}")
+                atom_offset = f.tell()
+                n = int(header[3])
+                if sum(1 for _ in islice(f, n)) < n:
+                    break
+
+                offsets.append(end)
+                atom_offsets.append(atom_offset)
+                timesteps.append(int(header[1]))
+                n_atoms.append(n)
+                end = f.tell()
+
+        self.offsets = np.concatenate([self.offsets[:-1], np.array(offsets + [end], dtype = np.int64)])
+        self.atom_offsets = np.concatenate([self.atom_offsets, np.array(atom_offsets, dtype = np.int64)])
+        self.timesteps = np.concatenate([self.timesteps, np.array(timesteps, dtype = np.int64)])
+        self.n_atoms = np.concatenate([self.n_atoms, np.array(n_atoms, dtype = np.int64)])
+
+
+    def frame_bytes(self, frame, header : bool = True) -> bytes:
+        '''
+        Raw text of frame `frame`, with or without its header. Negative indices count
+            from the last frame.
+        '''
+        frame = range(len(self))[frame]
+        start = self.offsets[frame] if header else self.atom_offsets[frame]
+        return self.__read(int(start), int(self.offsets[frame + 1]))
+
+
+    def __read(self, start, stop) -> bytes:
+        if not self.compressed:
+            with open(self.path, 'rb') as f:
+                f.seek(start)
+                return f.read(stop - start)
+
+        if self.__stream is None or self.__stream.tell() > start:
+            self.close()
+            self.__stream = open_file(self.path, 'rb')
+        self.__stream.seek(start)
+        return self.__stream.read(stop - start)
+
+
+    def close(self) -> None:
+        '''
+        Closes the stream kept open to read frames of a compressed dump.
+        '''
+        if self.__stream is not None:
+            self.__stream.close()
+            self.__stream = None
+
+
+    def read_frame(self, frame, usecols = None) -> np.ndarray:
+        '''
+        Atom data of frame `frame` as an (n_atoms, n_cols) array.
+        '''
+        return np.loadtxt(self.frame_bytes(frame, header = False).decode().splitlines(), usecols = usecols, ndmin = 2)
+
+
+    def read_frames(self, frames, usecols = None) -> np.ndarray:
+        '''
+        Atom data of every frame in `frames` (indices, a slice or a boolean mask), only
+            those frames are read. Returns an (n_frames, n_atoms, n_cols) array, all frames
+            must have the same number of atoms.
+        '''
+        frames = np.arange(len(self))[frames]
+        if len(set(self.n_atoms[frames])) > 1:
+            raise RuntimeError(f"Frames of {self.path} have different numbers of atoms, read them one at a time")
+        return np.stack([self.read_frame(i, usecols) for i in frames])
+
+
+    def parse(self, usecols = None, frames_per_chunk : int = None, n_jobs : int = -1) -> np.ndarray:
+        '''
+        Atom data of every frame, stacked into an (total atoms, n_cols) array like the
+            header-less files written by split_dumps(). The dump is split into byte ranges
+            of `frames_per_chunk` whole frames which are parsed in a pool of processes.
+        '''
+        if len(self) == 0:
+            return np.zeros((0, 0))
+        return np.concatenate(list(self.parse_chunks(usecols, frames_per_chunk, n_jobs)))
+
+
+    def parse_chunks(self, usecols = None, frames_per_chunk : int = None, n_jobs : int = -1):
+        '''
+        Same as parse() but yields the array of every `frames_per_chunk` frames in order
+            instead of joining them, so a trajectory larger than memory can be written out
+            chunk by chunk. Only a few chunks are held at once.
+        '''
+        if frames_per_chunk is None:
+            frames_per_chunk = max(len(self) // (4*(os.cpu_count() or 1)), 1)
+
+        jobs = []
+        for first in range(0, len(self), frames_per_chunk):
+            last = min(first + frames_per_chunk, len(self))
+            start, stop = int(self.offsets[first]), int(self.offsets[last])
+            atom_ranges = [(int(self.atom_offsets[i]) - start, int(self.offsets[i + 1]) - start) for i in range(first, last)]
+            jobs.append((start, stop, atom_ranges))
+
+        if self.compressed:
+            try:
+                for start, stop, atom_ranges in jobs:
+                    yield _parse_atom_lines(self.__read(start, stop), atom_ranges, usecols)
+            finally:
+                self.close()
+        elif n_jobs == 1 or len(jobs) == 1:
+            for job in jobs:
+                yield _parse_byte_range(self.path, *job, usecols)
+        else:
+            yield from Parallel(n_jobs = n_jobs, return_as = "generator")(delayed(_parse_byte_range)(self.path, *job, usecols) for job in jobs)
@@ -4,8 +4,15 @@ class InFile():
 
     '''
     Class to keep track of, and modify variables for a LAMMPS in-file
+
+    The in-file is read once and kept in memory as a template: a list of its lines plus the
+        line number of every variable definition. Modified copies of the in-file are rendered
+        from the template and written with a single write, the original file is never re-read.
     '''
 
+    #Styles whose value is a single word or expression
+    SINGLE_VALUE_STYLES = ("equal", "string", "atom", "vector", "getenv", "file", "atomfile", "internal")
+
     def __init__(self, path):
         '''
         Path: Absolute file path to the in-file, contains filename and extension.
@@ -15,6 +22,10 @@ class InFile():
 
         '''
         Name: Filename with extension
+        Lines: Lines of the in-file, including line endings
+        Variables: Every variable defined in the in-file (any style). Maps the name to a
+            dictionary with its "style", "value" (string, list of strings for styles that
+            take several values like index) and "line_number".
         Free Variables: All variables which are purely numeric. Any variable that is a function
             of other variables or a string is ignored.
         Free Variable Line Number: 0 indexed line number corresponding to the line in the in-file
@@ -22,30 +33,51 @@ class InFile():
         '''
         self.name = os.path.basename(path)
 
+        self.lines = []
+        self.variables = {}
         self.free_variables = {}
         self.free_variable_line_numbers = {}
         self.__parse_variables()
-        
+
 
 
     def __parse_variables(self) -> None:
         '''
-        Opens in-file and extracts parameters which are specified as 'variables' AND 
-            do not depend on other variables or output from LAMMPS.
+        Opens in-file and records every 'variable' command. Parameters which are specified
+            as 'equal' variables AND do not depend on other variables or output from LAMMPS
+            are also listed as free variables.
 
-        Example: 
-            "variable dt equal 0.002" will be parsed
-            "variable t_damp equal 100*dt" will NOT be parsed
+        Example:
+            "variable dt equal 0.002" will be a free variable
+            "variable t_damp equal 100*dt" will be a variable but NOT a free variable
         '''
 
         with open(self.path, 'r') as f:
-            for line_number, line in enumerate(f.readlines()):
-                if line.strip().startswith("variable"):
-                    _, var, _, value, *_ = line.strip().split()
-                    if value.replace('.', '', 1).isdigit():
-                        self.free_variables[var] = float(value)
-                        self.free_variable_line_numbers[var] = line_number
-    
+            self.lines = f.read().splitlines(keepends = True)
+
+        for line_number, line in enumerate(self.lines):
+            tokens = line.split("#", 1)[0].split(None, 3)
+            if len(tokens) < 4 or tokens[0] != "variable":
+                continue
+            _, var, style, value = tokens
+            value = value.strip()
+
+            if style in self.SINGLE_VALUE_STYLES:
+                self.variables[var] = {"style" : style, "value" : self.__unquote(value), "line_number" : line_number}
+            else:
+                self.variables[var] = {"style" : style, "value" : value.split(), "line_number" : line_number}
+
+            if style == "equal" and value.replace('.', '', 1).isdigit():
+                self.free_variables[var] = float(value)
+                self.free_variable_line_numbers[var] = line_number
+
+
+    @staticmethod
+    def __unquote(value) -> str:
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+            return value[1:-1]
+        return value
+
 
     def display_variables(self) -> None:
         '''
@@ -59,27 +91,57 @@ class InFile():
         else:
             print("No variables parsed from in-file.")
 
-    
-    def edit_variables(self, changed_variables : dict) -> None:
+
+    def render(self, changed_variables : dict) -> str:
         '''
-        Opens the in-file for this job and modifies the variable values to match those
-        pass in the constructor.
+        Returns the text of the in-file with the values of `changed_variables` substituted.
+            The style and inline comment of each variable are kept. Styles that take several
+            values (e.g. index) accept a list, expressions containing spaces are quoted.
 
         Changed Variables: A dictionary where the keys are the variable to change and the
             value is the updated value to write to the in-file
         '''
-        #Copy file contents
-        with open(self.path, 'r+') as in_file:
-            lines = in_file.readlines()
-        #Edit file contents
+        lines = list(self.lines)
         for new_variable, value in changed_variables.items():
-            if new_variable in self.free_variables.keys():
-                idx = self.free_variable_line_numbers[new_variable]
-                lines[idx] = f"variable {new_variable} equal {value}\n"
+            if new_variable in self.variables:
+                variable = self.variables[new_variable]
+                idx = variable["line_number"]
+                text = lines[idx].rstrip("\r\n")
+                ending = lines[idx][len(text):] or "\n"
+                #Keep an inline comment, and the spacing before it
+                comment = text[len(text.split("#", 1)[0].rstrip()):] if "#" in text else ""
+                lines[idx] = self.__format_variable(new_variable, variable["style"], value) + comment + ending
             else:
                 print("============================================================================")
                 print(f"{new_variable} is not a modifiable variable in the in-file. This variable will not be changed. In-file located at: {self.path}")
                 print("============================================================================")
-        #Re-write file contents
-        with open(self.path,'w') as in_file:
-            in_file.writelines(lines)
\ No newline at end of file
+        return "".join(lines)
+
+
+    def __format_variable(self, name, style, value) -> str:
+        if style in self.SINGLE_VALUE_STYLES:
+            value = str(value)
+            if any(c.isspace() for c in value):
+                value = f"\"{value}\""
+        elif isinstance(value, (list, tuple)):
+            value = " ".join(str(v) for v in value)
+        return f"variable {name} {style} {value}"
+
+
+    def write(self, path : str, changed_variables : dict = None) -> None:
+        '''
+        Writes the in-file, with `changed_variables` substituted, to `path` in one write.
+        '''
+        with open(path, 'w') as f:
+            f.write(self.render(changed_variables or {}))
+
+
+    def edit_variables(self, changed_variables : dict) -> None:
+        '''
+        Modifies the variable values of this in-file in place to match those passed in.
+
+        Changed Variables: A dictionary where the keys are the variable to change and the
+            value is the updated value to write to the in-file
+        '''
+        self.write(self.path, changed_variables)
+        self.__init__(self.path)
@@ -1,37 +1,153 @@
+import io
 import numpy as np
 
+from .CompressedFile import open_file, is_compressed
+
+
+def convert_thermo_rows(rows, n_cols) -> np.ndarray:
+    '''
+    Converts a chunk of thermo rows (strings) to an (n_rows, n_cols) array in one call.
+        Rows without exactly `n_cols` values (e.g. a line cut off by a crash) are dropped.
+    '''
+    try:
+        return np.loadtxt(rows, ndmin = 2).reshape(-1, n_cols)
+    except ValueError:
+        rows = [row for row in rows if len(row.split()) == n_cols]
+        return np.loadtxt(rows, ndmin = 2).reshape(-1, n_cols)
+
+
 class LogFile():
     '''
+    Parser for the thermo output of a LAMMPS log file. The log is streamed line by line,
+        so memory use does not depend on the size of the log, and numbers are converted
+        in chunks of rows rather than one value at a time.
+
+    Every `run`/`minimize` in the input produces one thermo segment: the line after
+        "Per MPI rank memory allocation" holds the column headings and the segment ends
+        at "Loop time of ...". A segment without "Loop time" (e.g. a run that is still
+        going or was killed) ends at the end of the file.
+
+    Compressed logs (gzip, xz, bz2, zstd) are decompressed while they are streamed.
     '''
 
-    def __init__(self, path):
+    SEGMENT_START = ("Per MPI rank memory", "Memory usage per processor")
+    SEGMENT_END = "Loop time"
+
+    def __init__(self, path, chunk_rows = 100_000):
         '''
         Path: Absolute file path to the log-file, contains filename and extension.
         e.g. C:/Users/ejmei/Desktop/log.lammps
+        Chunk Rows: Number of thermo rows converted to numbers at a time.
         '''
         self.path = path
+        self.chunk_rows = chunk_rows
 
 
     def parse_thermo_table(self):
-        with open(self.path,'r') as f:
-            start_line = -1
-            end_line = -1
-            lines = f.readlines()
-            for i,line in enumerate(lines):
-                if line.strip().startswith("Per MPI rank"):
-                    start_line = i + 1
-                if line.strip().startswith("Loop time"):
-                    end_line = i - 1
-            data = lines[start_line : end_line + 1]
-
-        #Parse out column headings
-        data = np.array(data)
-        column_headings = data[0].strip().split()
-        data = data[1:] 
-        #Parse data
-        data = [[float(val) for val in line.strip().split()] for line in data]
-
-        #Build output dictionary
-        data = np.array(data)
-        data_dict = {column_headings[i]:data[:,i] for i in range(len(column_headings))}
-        return data_dict
+        '''
+        Thermo data of the last segment in the log as a dictionary of column heading to
+            values. Only the last segment is read, found by searching backwards from the end
+            of the file.
+        '''
+        if is_compressed(self.path):
+            #No seeking backwards in a compressed stream, keep only the last segment instead
+            last = None
+            with open_file(self.path, 'r', errors = "replace") as f:
+                for segment in self.__segments(f):
+                    last = segment
+            if last is None:
+                raise RuntimeError(f"No thermo output found in {self.path}")
+            return last
+
+        offset = self.__last_segment_offset()
+        if offset is None:
+            raise RuntimeError(f"No thermo output found in {self.path}")
+
+        with open(self.path, 'rb') as raw:
+            raw.seek(offset)
+            with io.TextIOWrapper(raw, errors = "replace") as f:
+                for segment in self.__segments(f):
+                    return segment
+        raise RuntimeError(f"No thermo output found in {self.path}")
+
+
+    def parse_thermo_segments(self) -> list:
+        '''
+        Thermo data of every segment in the log, in order. Each segment is a dictionary of
+            column heading to values.
+        '''
+        with open_file(self.path, 'r', errors = "replace") as f:
+            return list(self.__segments(f))
+
+
+    def __segments(self, f):
+        '''
+        Generator over the thermo segments in the open text file `f`.
+        '''
+        headings = None
+        rows = []
+        chunks = []
+        for line in f:
+            stripped = line.strip()
+            if stripped.startswith(self.SEGMENT_START):
+                if headings:
+                    yield self.__build_segment(headings, chunks, rows)
+                headings, rows, chunks = [], [], []
+            elif headings is None:
+                continue
+            elif stripped.startswith(self.SEGMENT_END):
+                if headings:
+                    yield self.__build_segment(headings, chunks, rows)
+                headings = None
+            elif len(headings) == 0:
+                #First line after the start of a segment that is not a warning holds the headings
+                if stripped and not stripped.startswith("WARNING"):
+                    headings = stripped.split()
+            elif self.is_thermo_row(stripped):
+                rows.append(stripped)
+                if len(rows) == self.chunk_rows:
+                    chunks.append(convert_thermo_rows(rows, len(headings)))
+                    rows = []
+            #Anything else (WARNING lines, blank lines, etc.) inside a segment is skipped
+
+        if headings:
+            yield self.__build_segment(headings, chunks, rows)
+
+
+    @staticmethod
+    def is_thermo_row(stripped) -> bool:
+        return len(stripped) > 0 and (stripped[0].isdigit() or stripped[0] in "-+.")
+
+
+    def __build_segment(self, headings, chunks, rows) -> dict:
+        if len(rows) > 0:
+            chunks.append(convert_thermo_rows(rows, len(headings)))
+        if len(chunks) > 0:
+            data = np.concatenate(chunks)
+        else:
+            data = np.zeros((0, len(headings)))
+        return {headings[i] : data[:,i] for i in range(len(headings))}
+
+
+    def __last_segment_offset(self, block_size = 1 << 20):
+        '''
+        Byte offset of the start of the last thermo segment, found by reading the file
+            backwards in blocks. Returns None if there is no segment.
+        '''
+        markers = [m.encode() for m in self.SEGMENT_START]
+        overlap = max(len(m) for m in markers) - 1
+        with open(self.path, 'rb') as f:
+            f.seek(0, io.SEEK_END)
+            pos = f.tell()
+            carry = b""
+            while pos > 0:
+                read = min(block_size, pos)
+                pos -= read
+                f.seek(pos)
+                block = f.read(read) + carry
+                idx = max(block.rfind(m) for m in markers)
+                if idx != -1:
+                    return pos + idx
+                #Keep the start of this block in case a marker is split across blocks
+                carry = block[:overlap]
+        return None
@@ -0,0 +1,149 @@
+import os
+import time
+
+from .LogFile import LogFile, convert_thermo_rows
+
+
+class LogTail(LogFile):
+    '''
+    Incremental reader for a LAMMPS log that is still being written. Every call to poll()
+        only reads the bytes appended since the previous call, so following thousands of
+        logs costs one stat() per log when nothing changed.
+
+    Keeps track of the current timestep, the step the current run will end at (from the
+        echoed "run N" command) and the simulation speed in timesteps per second.
+    '''
+
+    def __init__(self, path, smoothing = 0.3):
+        '''
+        Path: Absolute file path to the log-file, the file does not need to exist yet.
+        Smoothing: Weight of the newest measurement in the exponential moving average of
+            the simulation speed.
+
+        Offset: Number of bytes of the log consumed so far.
+        Headings: Column headings of the current thermo segment, None outside of a segment.
+        Last Row: Dictionary of heading to value of the newest thermo row.
+        Step / Target Step: Current timestep and the timestep the current run ends at.
+        Steps Per Second: Smoothed simulation speed, None until two rows have been seen.
+        '''
+        super().__init__(path)
+        self.smoothing = smoothing
+        self._reset()
+
+
+    def _reset(self) -> None:
+        '''
+        Forgets everything read so far, the next poll() reads the log from the start.
+        '''
+        self.offset = 0
+        self.headings = None
+        self.last_row = None
+        self.step = None
+        self.target_step = None
+        self.steps_per_second = None
+
+        self.__partial_line = ""
+        self.__run_length = None
+        self.__upto = False
+        self.__last_poll = None
+
+
+    def poll(self) -> dict:
+        '''
+        Parses thermo rows appended since the last call. Returns a dictionary of heading to
+            values of the new rows (of the current segment), or None if there are none.
+        '''
+        try:
+            size = os.stat(self.path).st_size
+        except FileNotFoundError:
+            return None
+
+        if size < self.offset:
+            #Log was truncated or rewritten (e.g. seed re-run), start over
+            self._reset()
+        if size == self.offset:
+            return None
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        self.offset = size
+
+        #The last line may still be being written, keep it for the next poll
+        lines = (self.__partial_line + data.decode(errors = "replace")).split("\n")
+        self.__partial_line = lines.pop()
+
+        rows = []
+        new_rows = None
+        for line in lines:
+            stripped = line.strip()
+            if stripped.startswith(self.SEGMENT_START):
+                #A segment cut short (no "Loop time") still counts towards progress
+                new_rows = self.__apply(rows) or new_rows
+                self.headings, rows = [], []
+            elif self.headings is None:
+                self.__parse_run_command(stripped)
+            elif stripped.startswith(self.SEGMENT_END):
+                #Rows read in the same poll as the end of their segment
+                new_rows = self.__apply(rows) or new_rows
+                self.headings, rows = None, []
+            elif len(self.headings) == 0:
+                if stripped and not stripped.startswith("WARNING"):
+                    self.headings = stripped.split()
+            elif self.is_thermo_row(stripped):
+                rows.append(stripped)
+
+        return self.__apply(rows) or new_rows
+
+
+    def __apply(self, rows) -> dict:
+        '''
+        Updates the progress with `rows` of the current segment and returns them as a
+            dictionary of heading to values, None if there are none.
+        '''
+        if not self.headings or len(rows) == 0:
+            return None
+        data = convert_thermo_rows(rows, len(self.headings))
+        if len(data) == 0:
+            return None
+        self.__update_progress(data)
+        return {self.headings[i] : data[:,i] for i in range(len(self.headings))}
+
+
+    def __parse_run_command(self, stripped) -> None:
+        #Input commands are echoed to the log, with variables already substituted
+        tokens = stripped.split()
+        if len(tokens) >= 2 and tokens[0] == "run" and tokens[1].isdigit():
+            self.__run_length = int(tokens[1])
+            self.__upto = "upto" in tokens[2:]
+            self.target_step = None
+
+
+    def __update_progress(self, data) -> None:
+        step_col = self.headings.index("Step") if "Step" in self.headings else 0
+        now = time.time()
+        step = int(data[-1, step_col])
+
+        if self.target_step is None and self.__run_length is not None:
+            first_step = int(data[0, step_col])
+            self.target_step = self.__run_length if self.__upto else first_step + self.__run_length
+
+        if self.step is not None and self.__last_poll is not None and now > self.__last_poll and step >= self.step:
+            speed = (step - self.step) / (now - self.__last_poll)
+            if self.steps_per_second is None:
+                self.steps_per_second = speed
+            else:
+                self.steps_per_second = self.smoothing*speed + (1 - self.smoothing)*self.steps_per_second
+
+        self.step = step
+        self.__last_poll = now
+        self.last_row = {self.headings[i] : data[-1, i] for i in range(len(self.headings))}
+
+
+    def eta(self) -> float:
+        '''
+        Estimated seconds until the current run finishes, None if unknown.
+        '''
+        if self.target_step is None or self.step is None or not self.steps_per_second:
+            return None
+        return max(self.target_step - self.step, 0) / self.steps_per_second
@@ -1,5 +1,8 @@
 import numpy as np
+from itertools import chain
+from joblib import Parallel, delayed
 from .AbstractParsingStrategy import AbstractParsingStrategy
+from ..CompressedFile import open_file
 
 
 class FixPrintParser(AbstractParsingStrategy):
@@ -7,33 +10,97 @@ class FixPrintParser(AbstractParsingStrategy):
     Implementation of AbstractParsingStrategy designed for data output as columns.
         This object should work to parse the output of commands like:
         "fix Uavg all ave/time 100 5 1000 c_2 v_pesq file Uavg.txt"
-        
+
     Assumes the first non-commented line is the data and the commented line before
         that is the column headings. Also assumes all data is numeric and casts
-        them to a float.
+        them to a float. Compressed files are read without decompressing them to disk.
     '''
 
+    RAGGED_MODES = ("trim", "pad", "error")
+
     def __init__(self):
         super().__init__()
-    
+
     def parse(self, path : str, comment_str = "#", delimiter = None) -> dict:
-        data = []
-        with open(path,'r') as f:
-            first_data_line = -1
-            lines = f.readlines()
-            for i in range(len(lines)):
-                if not lines[i].strip().startswith(comment_str):
-                    #Record first line to contain data
-                    if first_data_line == -1:
-                        first_data_line = i
-                    #Parse data on line and convert to float
-                    line_data = lines[i].strip().split(delimiter)
-                    data.append([float(val) for val in line_data])
-            column_heading_line = first_data_line - 1
-            column_headings = lines[column_heading_line].replace(comment_str,'').strip().split()
+        column_headings, data = self.parse_array(path, comment_str, delimiter)
 
         #Build output dictionary
-        data = np.array(data)
         data_dict = {column_headings[i]:data[:,i] for i in range(len(column_headings))}
 
-        return data_dict
\ No newline at end of file
+        return data_dict
+
+
+    def parse_array(self, path : str, comment_str = "#", delimiter = None) -> tuple:
+        '''
+        Returns (column headings, data) where data is an (n_rows, n_cols) array. Only the
+            header is read line by line, the data block is converted in one NumPy call.
+        '''
+        with open_file(path,'r') as f:
+            column_heading_line = None
+            first_row = None
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip().startswith(comment_str):
+                    column_heading_line = line
+                elif line.strip():
+                    first_row = line
+                    break
+
+            if column_heading_line is None:
+                raise RuntimeError(f"No commented column headings found in {path}")
+            column_headings = column_heading_line.replace(comment_str,'').strip().split()
+
+            if first_row is None:
+                return column_headings, np.zeros((0, len(column_headings)))
+
+            #Comment lines further down are skipped like before. The first row is put back in
+            #front of the stream instead of seeking, which compressed streams may not support
+            data = np.loadtxt(chain([first_row], f), comments = comment_str, delimiter = delimiter, ndmin = 2)
+
+        return column_headings, data
+
+
+    def parse_many(self, paths : list, comment_str = "#", delimiter = None, ragged = "trim", n_jobs = -1) -> tuple:
+        '''
+        Parses the same output file from several seeds and stacks them.
+
+        Paths: List of files to parse, e.g. the same fix output from every seed of a job.
+        Ragged: What to do if files have different numbers of rows (e.g. a run that was
+            killed early):
+                "trim" : Keep only the first n_rows of every file, n_rows of the shortest file.
+                "pad" : Pad shorter files with NaN up to the rows of the longest file.
+                "error" : Raise a RuntimeError.
+        N Jobs: Number of processes the files are parsed with (joblib convention, -1 uses
+            every core).
+
+        Returns (column headings, data) where data has shape (n_files, n_rows, n_cols).
+        '''
+        if ragged not in self.RAGGED_MODES:
+            raise ValueError(f"ragged must be one of {self.RAGGED_MODES}, got {ragged}")
+        if len(paths) == 0:
+            raise ValueError("No paths to parse")
+
+        if n_jobs == 1 or len(paths) == 1:
+            parsed = [self.parse_array(path, comment_str, delimiter) for path in paths]
+        else:
+            parsed = Parallel(n_jobs = min(n_jobs, len(paths)) if n_jobs > 0 else n_jobs)(
+                delayed(self.parse_array)(path, comment_str, delimiter) for path in paths)
+
+        column_headings = parsed[0][0]
+        for path, (headings, _) in zip(paths, parsed):
+            if headings != column_headings:
+                raise RuntimeError(f"Column headings of {path} ({headings}) do not match those of {paths[0]} ({column_headings})")
+
+        n_rows = [len(data) for _, data in parsed]
+        n_cols = parsed[0][1].shape[1]
+        if len(set(n_rows)) > 1 and ragged == "error":
+            raise RuntimeError(f"Files have different numbers of rows: {dict(zip(paths, n_rows))}")
+
+        rows = min(n_rows) if ragged == "trim" else max(n_rows)
+        stacked = np.full((len(paths), rows, n_cols), np.nan)
+        for i, (_, data) in enumerate(parsed):
+            stacked[i, :min(len(data), rows)] = data[:rows]
+
+        return column_headings, stacked
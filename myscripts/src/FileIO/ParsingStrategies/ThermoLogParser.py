@@ -0,0 +1,32 @@
+import numpy as np
+from .AbstractParsingStrategy import AbstractParsingStrategy
+from ..LogFile import LogFile
+
+
+class ThermoLogParser(AbstractParsingStrategy):
+    '''
+    Implementation of AbstractParsingStrategy for LAMMPS log files, so thermo output
+        can be used anywhere a parsing strategy is expected (e.g. LocalProject.collect).
+
+    Returns the thermo table of the last run in the log, or of every run concatenated
+        if `all_segments` is True. Segments are only concatenated when they share the
+        same column headings.
+    '''
+
+    def __init__(self, all_segments : bool = False):
+        super().__init__()
+        self.all_segments = all_segments
+
+    def parse(self, path : str, comment_str = "#", delimiter = None) -> dict:
+        log = LogFile(path)
+        if not self.all_segments:
+            return log.parse_thermo_table()
+
+        segments = log.parse_thermo_segments()
+        if len(segments) == 0:
+            raise RuntimeError(f"No thermo output found in {path}")
+        headings = list(segments[-1].keys())
+        if any(list(segment.keys()) != headings for segment in segments):
+            raise RuntimeError(f"Thermo segments in {path} have different column headings, cannot concatenate them")
+
+        return {h : np.concatenate([segment[h] for segment in segments]) for h in headings}
@@ -1 +1,2 @@
-from FixPrintParser import FixPrintParser
\ No newline at end of file
+from .FixPrintParser import FixPrintParser
+from .ThermoLogParser import ThermoLogParser
\ No newline at end of file
@@ -0,0 +1,107 @@
+import os
+import json
+import shutil
+import hashlib
+import time
+import numbers
+
+from .TrajectoryCache import file_hash
+
+
+class TDEPCache():
+    '''
+    Content-addressed cache of TDEP results. An entry is keyed by the hash of every TDEP
+        input file plus the settings TDEP was run with (cutoffs, stride), so running TDEP
+        again on identical inputs, from any folder, restores the earlier results instead.
+
+    Entries are folders named after their key inside the cache folder, which can be shared
+        between projects. When the cache grows beyond `max_bytes` the least recently used
+        entries are removed.
+    '''
+
+    INPUT_FILES = ["infile.forces", "infile.positions", "infile.ucposcar", "infile.ssposcar", "infile.meta", "infile.stat"]
+    META_NAME = "entry.json"
+
+    def __init__(self, path, max_bytes : int = 10 * 1024**3):
+        '''
+        Path: Cache folder, created if it does not exist.
+        Max Bytes: Size the cache is trimmed to after every new entry.
+        '''
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(self.path, exist_ok = True)
+
+
+    def key(self, folder, settings : dict) -> str:
+        '''
+        Key of the results of running TDEP in `folder` with `settings`.
+        '''
+        h = hashlib.sha256()
+        for name in self.INPUT_FILES:
+            input_path = os.path.join(folder, name)
+            h.update(name.encode())
+            h.update(file_hash(input_path).encode() if os.path.isfile(input_path) else b"missing")
+        #Numbers are compared by value, -1 and -1.0 are the same cutoff
+        settings = {k : float(v) if isinstance(v, numbers.Real) and not isinstance(v, bool) else v
+                    for k, v in settings.items()}
+        h.update(json.dumps(settings, sort_keys = True, default = str).encode())
+        return h.hexdigest()
+
+
+    def restore(self, key, folder) -> bool:
+        '''
+        Copies the files of entry `key` into `folder`. Returns False if there is no such entry.
+        '''
+        entry_path = os.path.join(self.path, key)
+        meta_path = os.path.join(entry_path, self.META_NAME)
+        if not os.path.isfile(meta_path):
+            return False
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        for name in meta["files"]:
+            shutil.copy2(os.path.join(entry_path, name), os.path.join(folder, name))
+
+        #Modification time of the entry folder marks when it was last used
+        os.utime(entry_path)
+        return True
+
+
+    def store(self, key, folder, files : list) -> None:
+        '''
+        Saves `files` (names inside `folder`) as entry `key` and trims the cache.
+        '''
+        entry_path = os.path.join(self.path, key)
+        if os.path.isdir(entry_path):
+            return
+
+        #Build the entry under a temporary name so a half written entry is never restored
+        tmp_path = os.path.join(self.path, f".tmp_{key}_{os.getpid()}")
+        os.makedirs(tmp_path, exist_ok = True)
+        for name in files:
+            shutil.copy2(os.path.join(folder, name), os.path.join(tmp_path, name))
+        with open(os.path.join(tmp_path, self.META_NAME), 'w') as f:
+            json.dump({"files" : list(files), "created" : time.time()}, f, indent = 4)
+
+        try:
+            os.rename(tmp_path, entry_path)
+        except OSError:
+            #Another process stored the same entry first
+            shutil.rmtree(tmp_path, ignore_errors = True)
+        self.__evict()
+
+
+    def __evict(self) -> None:
+        entries = []
+        for name in os.listdir(self.path):
+            entry_path = os.path.join(self.path, name)
+            if name.startswith(".tmp_") or not os.path.isdir(entry_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_path, f)) for f in os.listdir(entry_path))
+            entries.append((os.stat(entry_path).st_mtime, size, entry_path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_path, ignore_errors = True)
+            total -= size
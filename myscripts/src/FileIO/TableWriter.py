@@ -0,0 +1,41 @@
+import numpy as np
+from joblib import Parallel, delayed
+
+
+def _format_chunk(chunk, row_fmt) -> str:
+    '''
+    Formats every row of `chunk` with one string operation for the whole chunk, instead
+        of one per row like np.savetxt.
+    '''
+    return (row_fmt * len(chunk)) % tuple(np.asarray(chunk).ravel().tolist())
+
+
+def write_table(path, data, fmt : str = "%.15f", delimiter : str = " ", chunk_rows : int = 100_000,
+                n_jobs : int = 1, mode : str = "w") -> None:
+    '''
+    Writes a 2D array as text, byte-identical to np.savetxt(path, data, fmt = fmt,
+        delimiter = delimiter). Rows are formatted and written `chunk_rows` at a time, so
+        a memory-mapped `data` is streamed from disk and memory use stays bounded by one
+        chunk (or one chunk per worker).
+
+    Fmt: printf-style format of a single value, e.g. "%.15f".
+    N Jobs: Number of processes chunks are formatted in (joblib convention, -1 uses every
+        core). Chunks are still written in order.
+    Mode: "w" to overwrite `path` or "a" to append to it.
+    '''
+    #asanyarray keeps memory-mapped arrays memory-mapped
+    data = np.asanyarray(data)
+    if data.ndim == 1:
+        data = data.reshape(-1, 1)
+    row_fmt = delimiter.join([fmt]*data.shape[1]) + "\n"
+    starts = range(0, len(data), chunk_rows)
+
+    with open(path, mode) as f:
+        if n_jobs == 1 or len(starts) <= 1:
+            for start in starts:
+                f.write(_format_chunk(data[start : start + chunk_rows], row_fmt))
+        else:
+            chunks = Parallel(n_jobs = n_jobs, return_as = "generator")(
+                delayed(_format_chunk)(data[start : start + chunk_rows], row_fmt) for start in starts)
+            for chunk in chunks:
+                f.write(chunk)
@@ -0,0 +1,178 @@
+import os
+import json
+import hashlib
+import numpy as np
+from itertools import islice
+from joblib import effective_n_jobs
+
+from .CompressedFile import open_file
+
+
+def file_hash(path, chunk_size = 1 << 24) -> str:
+    '''
+    SHA-256 of the contents of the file at `path`, read in chunks.
+    '''
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_fingerprint(path) -> dict:
+    '''
+    Size, modification time and content hash of the file at `path`.
+    '''
+    stat = os.stat(path)
+    return {"size" : stat.st_size, "mtime_ns" : stat.st_mtime_ns, "sha256" : file_hash(path)}
+
+
+def fingerprint_matches(path, fingerprint : dict) -> bool:
+    '''
+    True if the file at `path` still has the contents described by `fingerprint`. A
+        different size is a mismatch straight away, the (slow) hash is only recomputed
+        when the size matches but the modification time does not.
+    '''
+    if not os.path.isfile(path):
+        return False
+    stat = os.stat(path)
+    if stat.st_size != fingerprint["size"]:
+        return False
+    if stat.st_mtime_ns == fingerprint["mtime_ns"]:
+        return True
+    return file_hash(path) == fingerprint["sha256"]
+
+
+class TrajectoryCache():
+    '''
+    Binary cache of arrays parsed from text files in a simulation folder. Each entry is
+        stored once as a .npy file in a ".trajectory_cache" sub-folder and opened
+        memory-mapped afterwards, so repeated loads skip text parsing and only touch the
+        pages that are actually used.
+
+    Entries are keyed by the size, modification time and hash of the files they were
+        derived from and are rebuilt automatically when any of those files change.
+    '''
+
+    DIRNAME = ".trajectory_cache"
+
+    def __init__(self, folder, chunk_rows = 1_000_000):
+        '''
+        Folder: Simulation folder the cache lives in.
+        Chunk Rows: Number of text rows parsed at a time when building an entry.
+        '''
+        self.path = os.path.join(folder, self.DIRNAME)
+        self.chunk_rows = chunk_rows
+        os.makedirs(self.path, exist_ok = True)
+
+
+    def __entry_paths(self, name) -> tuple:
+        return os.path.join(self.path, f"{name}.npy"), os.path.join(self.path, f"{name}.json")
+
+
+    def exists(self, name) -> bool:
+        '''
+        True if entry `name` has been built, whether or not its sources changed since.
+        '''
+        npy_path, meta_path = self.__entry_paths(name)
+        return os.path.isfile(npy_path) and os.path.isfile(meta_path)
+
+
+    def open(self, name) -> np.ndarray:
+        '''
+        Returns the existing entry `name` as a read-only memory-mapped array without
+            checking it against its sources.
+        '''
+        return np.load(self.__entry_paths(name)[0], mmap_mode = 'r')
+
+
+    def is_valid(self, name, sources : list) -> bool:
+        '''
+        True if entry `name` exists and was built from the current contents of `sources`.
+        '''
+        npy_path, meta_path = self.__entry_paths(name)
+        if not (os.path.isfile(npy_path) and os.path.isfile(meta_path)):
+            return False
+
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if sorted(meta["sources"].keys()) != sorted(os.path.abspath(s) for s in sources):
+            return False
+        return all(fingerprint_matches(path, fp) for path, fp in meta["sources"].items())
+
+
+    def load(self, name, sources : list, text_path, usecols, dump_index = None, n_jobs : int = -1) -> np.ndarray:
+        '''
+        Returns entry `name` as a read-only memory-mapped array. If the entry is missing or
+            any file in `sources` changed, columns `usecols` of the whitespace separated
+            text file `text_path` are parsed (in chunks of `chunk_rows` rows) and stored first.
+            If a DumpIndex is given the atom lines of that dump are parsed in parallel
+            instead (also `chunk_rows` rows at a time) by `n_jobs` processes, `text_path`
+            is then not needed.
+        '''
+        npy_path, meta_path = self.__entry_paths(name)
+        if not self.is_valid(name, sources):
+            if dump_index is not None:
+                self.__build_from_dump(npy_path, dump_index, usecols, n_jobs)
+            else:
+                self.__build(npy_path, text_path, usecols)
+            self.__write_meta(meta_path, sources)
+
+        return np.load(npy_path, mmap_mode = 'r')
+
+
+    def store(self, name, sources : list, data : np.ndarray) -> None:
+        '''
+        Saves an array that was derived from `sources` some other way (e.g. one frame of a
+            dump) as entry `name`.
+        '''
+        npy_path, meta_path = self.__entry_paths(name)
+        tmp_path = npy_path + ".tmp.npy"
+        np.save(tmp_path, np.asarray(data, dtype = np.float64))
+        os.replace(tmp_path, npy_path)
+        self.__write_meta(meta_path, sources)
+
+
+    def __write_meta(self, meta_path, sources : list) -> None:
+        with open(meta_path, 'w') as f:
+            json.dump({"sources" : {os.path.abspath(s) : file_fingerprint(s) for s in sources}}, f, indent = 4)
+
+
+    def __build(self, npy_path, text_path, usecols) -> None:
+        with open_file(text_path, 'r') as f:
+            n_rows = sum(1 for line in f if line.strip())
+
+        tmp_path = npy_path + ".tmp.npy"
+        out = np.lib.format.open_memmap(tmp_path, mode = 'w+', dtype = np.float64, shape = (n_rows, len(usecols)))
+        with open_file(text_path, 'r') as f:
+            row = 0
+            while row < n_rows:
+                chunk = np.loadtxt(islice(f, self.chunk_rows), usecols = usecols, ndmin = 2)
+                out[row : row + len(chunk)] = chunk
+                row += len(chunk)
+        out.flush()
+        del out
+        os.replace(tmp_path, npy_path)
+
+
+    def __build_from_dump(self, npy_path, dump_index, usecols, n_jobs) -> None:
+        #The index knows the number of rows up front, so chunks go straight into the memory map
+        n_rows = int(np.sum(dump_index.n_atoms))
+        #Enough chunks to keep every worker busy, none larger than chunk_rows
+        frames_per_chunk = min(len(dump_index) // (4*effective_n_jobs(n_jobs)),
+                               self.chunk_rows // max(int(np.max(dump_index.n_atoms, initial = 1)), 1))
+        frames_per_chunk = max(frames_per_chunk, 1)
+
+        tmp_path = npy_path + ".tmp.npy"
+        out = None
+        row = 0
+        for chunk in dump_index.parse_chunks(usecols, frames_per_chunk, n_jobs):
+            if out is None:
+                out = np.lib.format.open_memmap(tmp_path, mode = 'w+', dtype = np.float64, shape = (n_rows, chunk.shape[1]))
+            out[row : row + len(chunk)] = chunk
+            row += len(chunk)
+        if out is None:
+            out = np.lib.format.open_memmap(tmp_path, mode = 'w+', dtype = np.float64, shape = (0, len(usecols or [])))
+        out.flush()
+        del out
+        os.replace(tmp_path, npy_path)
@@ -1 +1,2 @@
-from .ParsingStrategies import *
\ No newline at end of file
+from .ParsingStrategies import *
+from .CompressedFile import OutputCompressor, compress_file, open_file, resolve_path
\ No newline at end of file
@@ -0,0 +1,186 @@
+import os
+import re
+import socket
+
+
+class HostPool:
+    '''
+    Slots (cores) of every host of a multi-node allocation and which of them are free.
+        Used by the JobScheduler to give every launch its own slots and pass them to mpirun
+        ("--host node1:4,node2:2"), instead of letting every mpirun fill the first node.
+
+    A job is kept on a single host when one has enough free slots, choosing the fullest
+        such host so large blocks stay free for wide jobs. Otherwise it is spread over the
+        hosts with the most free slots, unless `allow_split` is False, in which case jobs
+        that fit on one host wait until one has room.
+    '''
+
+    def __init__(self, slots : dict, host_flag : str = "--host", allow_split : bool = True, cores : dict = None):
+        '''
+        Slots: Dictionary of host name to number of slots.
+        Host Flag: mpirun option taking a "host:n,host:n" list ("--host" for Open MPI,
+            "-hosts" for MPICH / Intel MPI).
+        Allow Split: Spread jobs over several hosts when no single host has room.
+        Cores: Dictionary of host name to the IDs of the cores this allocation may use on
+            that host (at least one per slot). Only ranks on these hosts are pinned to
+            specific cores, the core IDs of other hosts are not known.
+        '''
+        if len(slots) == 0:
+            raise RuntimeError("A host pool needs at least one host")
+        self.slots = dict(slots)
+        self.host_flag = host_flag
+        self.allow_split = allow_split
+        self.cores = {}
+        for host, ids in (cores or {}).items():
+            if host in self.slots:
+                if len(ids) < self.slots[host]:
+                    raise RuntimeError(f"{host} has {self.slots[host]} slots but only {len(ids)} cores")
+                self.cores[host] = list(ids)[:self.slots[host]]
+
+        '''
+        Free: Dictionary of host name to the list of its free slot IDs (0 to slots - 1).
+            Slot i of a host in Cores is pinned to its i-th core.
+        '''
+        self.free = {host : list(range(n)) for host, n in self.slots.items()}
+
+
+    @classmethod
+    def from_hostfile(cls, path, **kwargs) -> 'HostPool':
+        '''
+        Reads an Open MPI ("node1 slots=4"), MPICH ("node1:4") or PBS style (one line per
+            slot) hostfile. Lines for the same host add up.
+        '''
+        slots = {}
+        with open(path, "r") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                fields = line.split()
+                host, _, count = fields[0].partition(":")
+                n = int(count) if count else 1
+                for field in fields[1:]:
+                    if field.startswith("slots="):
+                        n = int(field[len("slots="):])
+                slots[host] = slots.get(host, 0) + n
+        return cls(slots, **kwargs)
+
+
+    @classmethod
+    def from_slurm(cls, nodelist : str = None, tasks_per_node : str = None, **kwargs) -> 'HostPool':
+        '''
+        Hosts of the current SLURM allocation, from SLURM_JOB_NODELIST (e.g. "node[01-03,07]")
+            and SLURM_TASKS_PER_NODE (e.g. "4(x3),2"), or SLURM_JOB_CPUS_PER_NODE if the
+            number of tasks was not set. The cores of the node this runs on are the ones
+            SLURM confined this process to, the cores of other nodes are not known.
+        '''
+        nodelist = nodelist or os.environ.get("SLURM_JOB_NODELIST") or os.environ.get("SLURM_NODELIST")
+        if nodelist is None:
+            raise RuntimeError("SLURM_JOB_NODELIST is not set, not inside a SLURM allocation")
+        tasks_per_node = tasks_per_node or os.environ.get("SLURM_TASKS_PER_NODE") or os.environ.get("SLURM_JOB_CPUS_PER_NODE")
+        if tasks_per_node is None:
+            raise RuntimeError("Neither SLURM_TASKS_PER_NODE nor SLURM_JOB_CPUS_PER_NODE is set")
+
+        hosts = cls.expand_nodelist(nodelist)
+        counts = []
+        for entry in tasks_per_node.split(","):
+            match = re.fullmatch(r"(\d+)(?:\(x(\d+)\))?", entry.strip())
+            if match is None:
+                raise RuntimeError(f"Cannot parse tasks per node: {tasks_per_node}")
+            counts += [int(match.group(1))] * int(match.group(2) or 1)
+        if len(counts) != len(hosts):
+            raise RuntimeError(f"{len(hosts)} hosts in {nodelist} but {len(counts)} entries in {tasks_per_node}")
+        slots = dict(zip(hosts, counts))
+
+        local = os.environ.get("SLURMD_NODENAME") or socket.gethostname().split(".")[0]
+        if "cores" not in kwargs and local in slots and hasattr(os, "sched_getaffinity"):
+            allowed = sorted(os.sched_getaffinity(0))
+            if len(allowed) >= slots[local]:
+                kwargs["cores"] = {local : allowed}
+        return cls(slots, **kwargs)
+
+
+    @staticmethod
+    def expand_nodelist(nodelist : str) -> list:
+        '''
+        Expands a SLURM host list, e.g. "node[01-03,07],gpu1" -> node01, node02, node03,
+            node07, gpu1. Zero padding is kept.
+        '''
+        #Split on commas that are not inside brackets
+        entries = re.findall(r"(?:[^,\[]|\[[^\]]*\])+", nodelist)
+        hosts = []
+        for entry in entries:
+            match = re.search(r"\[([^\]]*)\]", entry)
+            if match is None:
+                hosts.append(entry)
+                continue
+            prefix, suffix = entry[:match.start()], entry[match.end():]
+            for part in match.group(1).split(","):
+                first, _, last = part.partition("-")
+                width = len(first)
+                for i in range(int(first), int(last or first) + 1):
+                    #The rest of the entry may hold further bracket groups
+                    hosts += HostPool.expand_nodelist(f"{prefix}{i:0{width}d}{suffix}")
+        return hosts
+
+
+    @property
+    def n_slots(self) -> int:
+        return sum(self.slots.values())
+
+
+    def can_allocate(self, n_ranks : int) -> bool:
+        free = [len(ids) for ids in self.free.values()]
+        if any(n >= n_ranks for n in free):
+            return True
+        if not self.allow_split and n_ranks <= max(self.slots.values()):
+            return False
+        return sum(free) >= n_ranks
+
+
+    def allocate(self, n_ranks : int) -> dict:
+        '''
+        Takes `n_ranks` free slots and returns them as a dictionary of host name to slot
+            IDs, or None if they cannot be placed right now.
+        '''
+        if not self.can_allocate(n_ranks):
+            return None
+
+        fitting = [host for host, ids in self.free.items() if len(ids) >= n_ranks]
+        if len(fitting) > 0:
+            #Best fit: the host with the fewest free slots that still has room
+            hosts = [min(fitting, key = lambda host: len(self.free[host]))]
+        else:
+            hosts = sorted(self.free, key = lambda host: -len(self.free[host]))
+
+        placement = {}
+        remaining = n_ranks
+        for host in hosts:
+            n = min(remaining, len(self.free[host]))
+            if n == 0:
+                continue
+            placement[host], self.free[host] = self.free[host][:n], self.free[host][n:]
+            remaining -= n
+            if remaining == 0:
+                break
+        return placement
+
+
+    def release(self, placement : dict) -> None:
+        for host, ids in placement.items():
+            self.free[host] = sorted(self.free[host] + ids)
+
+
+    def launcher_args(self, placement : dict, pin_cpus : bool = False) -> str:
+        '''
+        mpirun options restricting a launch to the slots in `placement`. When pinning, ranks
+            on a single host with known cores are bound to the cores of their slots, other
+            launches are only bound to cores.
+        '''
+        args = f"{self.host_flag} {','.join(f'{host}:{len(ids)}' for host, ids in placement.items())}"
+        if pin_cpus:
+            host, ids = next(iter(placement.items()))
+            if len(placement) == 1 and host in self.cores:
+                args += f" --cpu-set {','.join(str(self.cores[host][i]) for i in ids)}"
+            args += " --bind-to core"
+        return args
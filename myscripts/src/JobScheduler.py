@@ -0,0 +1,291 @@
+import os
+import asyncio
+import inspect
+import time
+import numpy as np
+
+from .AsyncRunner import AsyncRunner
+from .HostPool import HostPool
+from .RuntimeEstimator import RuntimeEstimator
+
+
+class JobScheduler:
+    '''
+    Work-queue scheduler for running Job seeds on a fixed core budget. A new seed is
+        started as soon as enough cores are free, so no cores sit idle waiting on the
+        slowest seed of a batch.
+
+    Jobs can use different numbers of MPI ranks. The queue is ordered longest (estimated)
+        job first and packed into the free cores first-fit. Smaller jobs may backfill
+        cores while a wide job waits, as long as they are not expected to delay it.
+
+    All seeds are driven from a single asyncio event loop through an AsyncRunner, no
+        worker processes are needed.
+    '''
+
+    def __init__(self, ncores : int, n_mpi_domains : int, estimator : RuntimeEstimator = None,
+                 pin_cpus : bool = False, atoms_per_rank : int = None, atom_count = None,
+                 mpi_launcher : str = "mpirun", hosts : HostPool = None):
+        '''
+        Ncores: Total number of cores this scheduler is allowed to keep busy.
+        N MPI Domains: Number of MPI ranks used by jobs that do not set their own.
+        Estimator: RuntimeEstimator used to order the queue. Wall times of successful
+            seeds are recorded into it.
+        Pin CPUs: Give every job its own set of core IDs and bind its ranks to them, so
+            ranks from different jobs do not compete for the same cores.
+        Atoms Per Rank: If set, jobs without their own rank count get
+            ceil(n_atoms / atoms_per_rank) ranks instead of `n_mpi_domains`.
+        Atom Count: Name of the in-file variable holding the atom count, or a function of
+            a job's variables returning it. See Job.atom_count().
+        MPI Launcher: Command used to start MPI jobs.
+        Hosts: HostPool of a multi-node allocation. Every launch is given its own slots
+            and restricted to them, jobs are kept on one host when possible. Ncores may be
+            None to use every slot of the pool.
+        '''
+        if hosts is not None:
+            if ncores is None:
+                ncores = hosts.n_slots
+            elif ncores > hosts.n_slots:
+                raise RuntimeError(f"Cannot use {ncores} cores, the host pool only has {hosts.n_slots} slots.")
+        self.ncores = ncores
+        self.n_mpi_domains = n_mpi_domains
+        self.estimator = estimator if estimator is not None else RuntimeEstimator()
+        self.pin_cpus = pin_cpus
+        self.atoms_per_rank = atoms_per_rank
+        self.atom_count = atom_count
+        self.mpi_launcher = mpi_launcher
+        self.hosts = hosts
+        self.runner = AsyncRunner()
+
+        if n_mpi_domains > ncores:
+            raise RuntimeError(f"Cannot run jobs with {n_mpi_domains} MPI domains on {ncores} cores.")
+
+        #Core IDs handed out when pinning, prefer the cores this process is allowed on
+        try:
+            allowed = sorted(os.sched_getaffinity(0))
+        except AttributeError:
+            allowed = []
+        self.cpu_ids = allowed[:ncores] if len(allowed) >= ncores else list(range(ncores))
+
+
+    def ranks(self, job) -> int:
+        '''
+        Number of MPI ranks `job` will be launched with.
+        '''
+        if job.n_mpi_domains is not None:
+            n_ranks = job.n_mpi_domains
+        elif self.atoms_per_rank is not None and job.atom_count(self.atom_count) is not None:
+            n_ranks = int(np.ceil(job.atom_count(self.atom_count) / self.atoms_per_rank))
+            n_ranks = min(max(n_ranks, 1), self.ncores)
+        else:
+            n_ranks = self.n_mpi_domains
+
+        if n_ranks > self.ncores:
+            raise RuntimeError(f"{job.name} needs {n_ranks} MPI domains but only {self.ncores} cores are available.")
+        return n_ranks
+
+
+    def ranks_per_seed(self, job) -> int:
+        '''
+        Ranks each seed of `job` runs on. Only differs from ranks() for a PartitionBundle,
+            where the ranks are split between several seeds.
+        '''
+        return self.ranks(job) // getattr(job, "n_partitions", 1)
+
+
+    def estimate(self, job) -> float:
+        #A PartitionBundle lasts as long as its slowest seed
+        return max(self.estimator.estimate(seed.variables, self.ranks_per_seed(job), seed.atom_count(self.atom_count))
+                   for seed in getattr(job, "seeds", [job]))
+
+
+    def command(self, job, lammps_env_var : str, cpus : list = None, placement : dict = None) -> str:
+        cmd = f"{self.mpi_launcher} -np {self.ranks(job)}"
+        if placement is not None:
+            cmd += f" {self.hosts.launcher_args(placement, self.pin_cpus)}"
+        elif cpus is not None:
+            cmd += f" --cpu-set {','.join(str(c) for c in cpus)} --bind-to core"
+        return f"{cmd} {lammps_env_var}"
+
+
+    def run(self, jobs : list, run_fn, lammps_env_var : str, on_done = None) -> dict:
+        '''
+        Awaits `run_fn(job, lammps_cmd, runner = self.runner)` for every job in `jobs`, where
+            `lammps_cmd` is the MPI launch command for that job. `run_fn` must be a
+            coroutine function returning a RunResult.
+
+        On Done: Optional function called as on_done(job, result) when a job finishes. The
+            jobs it returns are added to the queue (see AdaptiveSeeds). It may be a coroutine
+            function, seeds keep being launched and reaped while it runs.
+
+        Returns a dictionary of timing and core utilisation statistics for this run.
+            The RunResult of every job is stored under "results", keyed by (job name, seed id).
+        '''
+        return asyncio.run(self.run_async(jobs, run_fn, lammps_env_var, on_done))
+
+
+    async def run_async(self, jobs : list, run_fn, lammps_env_var : str, on_done = None) -> dict:
+        '''
+        Same as run() but for use from inside an already running event loop.
+        '''
+        #Longest processing time first, widest first on ties, otherwise keep the given order.
+        #Without any timing history the estimates are only relative costs, which can
+        #order the queue but not be compared against the clock when backfilling. Nothing
+        #is backfilled until the first job has finished and the estimates are in seconds.
+        calibrated = len(self.estimator.history) > 0
+        estimates = {id(job) : self.estimate(job) for job in jobs}
+        queue_order = lambda job: (-estimates[id(job)], -self.ranks(job))
+        queue = sorted(jobs, key = queue_order)
+
+        free_cpus = list(self.cpu_ids)
+        free_cores = self.ncores
+        timings = []
+        results = {}
+        start_time = time.time()
+
+        running = {}
+        #on_done coroutines that have not finished yet
+        callbacks = set()
+        def add_jobs(new_jobs):
+            nonlocal queue
+            if len(new_jobs) > 0:
+                estimates.update({id(new_job) : self.estimate(new_job) for new_job in new_jobs})
+                queue = sorted(queue + new_jobs, key = queue_order)
+
+        while queue or running or callbacks:
+            #Fill free cores before waiting on anything
+            while queue:
+                now = time.time() - start_time
+                ends = [(timings[idx][0] + estimates[id(job)], n_ranks) for job, idx, n_ranks, _, _ in running.values()]
+                i = self.__next_job(queue, free_cores, ends if calibrated else None, now, estimates)
+                if i is None:
+                    break
+
+                job = queue.pop(i)
+                n_ranks = self.ranks(job)
+                cpus = placement = None
+                if self.hosts is not None:
+                    placement = self.hosts.allocate(n_ranks)
+                elif self.pin_cpus:
+                    cpus, free_cpus = sorted(free_cpus[:n_ranks]), free_cpus[n_ranks:]
+                free_cores -= n_ranks
+
+                task = asyncio.ensure_future(run_fn(job, self.command(job, lammps_env_var, cpus, placement), runner = self.runner))
+                running[task] = (job, len(timings), n_ranks, cpus, placement)
+                timings.append([time.time() - start_time, None, n_ranks])
+
+            done, _ = await asyncio.wait(set(running) | callbacks, return_when = asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task in callbacks:
+                    callbacks.discard(task)
+                    add_jobs(task.result())
+                    continue
+
+                job, idx, n_ranks, cpus, placement = running.pop(task)
+                timings[idx][1] = time.time() - start_time
+                free_cores += n_ranks
+                if cpus is not None:
+                    free_cpus = sorted(free_cpus + cpus)
+                if placement is not None:
+                    self.hosts.release(placement)
+
+                result = task.result()
+                results[(job.name, job.seed_id)] = result
+                for seed, wall_time in self.__seed_timings(job, result):
+                    self.estimator.record(seed.variables, self.ranks_per_seed(job), wall_time)
+                if not calibrated and len(self.estimator.history) > 0:
+                    #Replace the relative costs of every waiting and running job by times
+                    calibrated = True
+                    estimates = {id(other) : self.estimate(other) for other in queue + [r[0] for r in running.values()]}
+                    queue = sorted(queue, key = queue_order)
+
+                if on_done is not None:
+                    new_jobs = on_done(job, result)
+                    if inspect.isawaitable(new_jobs):
+                        callbacks.add(asyncio.ensure_future(new_jobs))
+                    else:
+                        add_jobs(new_jobs)
+
+        stats = self.__utilisation(timings, time.time() - start_time)
+        stats["results"] = results
+        return stats
+
+
+    def __seed_timings(self, job, result) -> list:
+        '''
+        (seed, wall time) of every seed of `job` that finished successfully. A PartitionBundle
+            times each partition on its own.
+        '''
+        if hasattr(job, "seed_timings"):
+            return job.seed_timings(result)
+        return [(job, result.wall_time)] if result.exit_code == 0 else []
+
+
+    def __next_job(self, queue : list, free_cores : int, ends : list, now : float, estimates : dict):
+        '''
+        Index of the next job in `queue` to start, or None if nothing should start yet.
+
+        The head of the queue starts if it fits. Otherwise cores are reserved for it at the
+            earliest (estimated) time enough running jobs will have finished, and a later job
+            may only start now if it fits and is expected to finish before then, or if it only
+            uses cores the head of the queue will not need. Without `ends` (estimates are not
+            times yet) nothing is backfilled.
+        '''
+        head_ranks = self.ranks(queue[0])
+        if self.__fits(head_ranks, free_cores):
+            return 0
+        if ends is None:
+            return None
+
+        shadow_time = np.inf
+        extra_cores = 0
+        available = free_cores
+        for end, n_ranks in sorted(ends):
+            available += n_ranks
+            if available >= head_ranks:
+                shadow_time = end
+                extra_cores = available - head_ranks
+                break
+
+        for i, job in enumerate(queue[1:], 1):
+            n_ranks = self.ranks(job)
+            if not self.__fits(n_ranks, free_cores):
+                continue
+            if now + estimates[id(job)] <= shadow_time or n_ranks <= extra_cores:
+                return i
+        return None
+
+
+    def __fits(self, n_ranks : int, free_cores : int) -> bool:
+        return n_ranks <= free_cores and (self.hosts is None or self.hosts.can_allocate(n_ranks))
+
+
+    def __utilisation(self, timings : list, wall_time : float) -> dict:
+        '''
+        Core utilisation is the fraction of the available core-seconds (ncores * wall time)
+            that were spent running seeds. When every seed uses the same number of ranks,
+            the wall time the same seeds would have taken when run in fixed batches of
+            ncores // n_ranks (in dispatch order) is also estimated for comparison.
+        '''
+        durations = [end - start for start, end, _ in timings]
+        widths = {n_ranks for _, _, n_ranks in timings}
+        busy_core_seconds = sum((end - start)*n_ranks for start, end, n_ranks in timings)
+
+        batched_wall_time = None
+        batched_utilisation = None
+        if len(widths) == 1:
+            max_parallel_jobs = self.ncores // widths.pop()
+            batched_wall_time = sum(max(durations[i:i + max_parallel_jobs])
+                                    for i in range(0, len(durations), max_parallel_jobs))
+            batched_utilisation = busy_core_seconds / (self.ncores * batched_wall_time) if batched_wall_time > 0 else 0.0
+
+        return {
+            "ncores" : self.ncores,
+            "n_mpi_domains" : self.n_mpi_domains,
+            "n_seeds" : len(durations),
+            "wall_time" : wall_time,
+            "busy_core_seconds" : busy_core_seconds,
+            "utilisation" : busy_core_seconds / (self.ncores * wall_time) if wall_time > 0 else 0.0,
+            "batched_wall_time_estimate" : batched_wall_time,
+            "batched_utilisation_estimate" : batched_utilisation,
+        }
@@ -1,18 +1,19 @@
 import os
 import numpy as np
-import shutil
-import time
+import shlex
 
-from .FileIO.InFile import InFile
+from .AsyncRunner import AsyncRunner, RunResult
 
 class Job:
 
     def __init__(self, parent_project : 'AbstractProject', name: str, n_seeds: int, seed_variables :list,
-                  variables : dict = None, create_file_structure: bool = True, seed_id : int = None):
+                  variables : dict = None, create_file_structure: bool = True, seed_id : int = None,
+                  n_mpi_domains : int = None):
         '''
         Parent Project:
         Name:
         Variables:
+        N MPI Domains: Number of MPI ranks this job runs with. None lets the scheduler decide.
         '''
         self.parent_project = parent_project
         self.name = name
@@ -20,12 +21,12 @@ class Job:
         self.n_seeds = n_seeds
         self.seed_id = seed_id
         self.seed_variables = seed_variables
+        self.n_mpi_domains = n_mpi_domains
 
         '''
         Outpath: Path to output for this job. Will be inside parent project folder.
         In-File Name: Name generated from parent_project in-file and ID
         In-File Path: Path to in-file for this job.
-        In-File: An InFile object which parses and manipultes the in-file text.
         '''
         self.outpath = os.path.join(self.parent_project.outpath, self.name)
         self.parent_in_file_name = os.path.basename(self.parent_project.infile_path)
@@ -59,44 +60,92 @@ class Job:
             from the 'parent_project'. File will be written to this Job's output folder.
         '''
         for i in range(self.n_seeds):
-            seed_outpath = os.path.join(self.outpath, f"seed{i}")
-            in_file_path = os.path.join(seed_outpath, self.in_file_name)
+            self.__create_in_file(i)
 
-            #Check if the in-file for this job was already created previously
-            if not os.path.isfile(in_file_path):
-                #Copy parent-project in-file to this job's sub-folder
-                shutil.copy2(self.parent_project.infile_path, seed_outpath)
 
-                #Rename in-file to incldue job name
-                os.rename(os.path.join(seed_outpath, self.parent_in_file_name), in_file_path)
+    def __create_in_file(self, seed_num) -> None:
+        in_file_path = os.path.join(self.seed_path(seed_num), self.in_file_name)
 
-                in_file = InFile(in_file_path)
-                
-                if self.variables is not None:
-                    #Modify variables inside in-file to match user changes
-                    in_file.edit_variables(self.variables)
-                
-                    #Modify seed_variables
-                    for sv in self.seed_variables:
-                        if sv in self.variables:
-                            in_file.edit_variables({sv : np.random.randint(1000,1000000)})
-                        else:
-                            raise RuntimeError(f"Key {sv} was not found in file. Cannot modify. Aborting.")
+        #Check if the in-file for this job was already created previously
+        if not os.path.isfile(in_file_path):
+            changed_variables = {}
+            if self.variables is not None:
+                #Modify variables inside in-file to match user changes
+                changed_variables = dict(self.variables)
 
+                #Modify seed_variables
+                for sv in self.seed_variables:
+                    if sv in self.variables:
+                        changed_variables[sv] = np.random.randint(1000,1000000)
+                    else:
+                        raise RuntimeError(f"Key {sv} was not found in file. Cannot modify. Aborting.")
 
+            #Render from the parent project's parsed in-file, no copy of the file is re-read
+            self.parent_project.in_file.write(in_file_path, changed_variables)
 
-    def run(self, lammps_cmd, seed_num) -> int:
+
+    def prepare_seed(self, seed_num) -> None:
+        '''
+        Creates the folder and in-file of seed `seed_num` if they do not exist yet. Jobs
+            created with create_file_structure = False (lazy jobs) only touch the file
+            system here, right before the seed is run.
+        '''
+        try:
+            os.makedirs(self.seed_path(seed_num), exist_ok = True)
+        except PermissionError:
+            raise PermissionError(f"Python does not have permission to create directory: {self.seed_path(seed_num)}")
+        self.__create_in_file(seed_num)
+
+
+    def atom_count(self, atom_count) -> int:
+        '''
+        Number of atoms simulated by this job, used to size and order jobs.
+
+        Atom Count: Name of the variable holding the atom count, or a function that takes
+            this job's variables and returns it. Returns None if it cannot be determined.
+        '''
+        if atom_count is None or self.variables is None:
+            return None
+        if callable(atom_count):
+            return int(atom_count(self.variables))
+        if atom_count in self.variables:
+            return int(self.variables[atom_count])
+        return None
+
+
+    def seed_path(self, seed_num) -> str:
+        return os.path.join(self.outpath, f"seed{seed_num}")
+
+
+    def command(self, lammps_cmd, seed_num) -> list:
+        '''
+        Argument list that runs this job's in-file for seed `seed_num` through the LAMMPS CLI.
+        '''
+        infile_path = os.path.join(self.seed_path(seed_num), self.in_file_name)
+        return shlex.split(lammps_cmd) + ["-in", infile_path, "-screen", "none"]
+
+
+    async def run_async(self, lammps_cmd, seed_num, runner : AsyncRunner = None) -> RunResult:
         '''
-        Executes job through LAMMPS CLI.
+        Executes job through LAMMPS CLI without blocking the event loop.
         Can pass env var as "lmp_serial" for serial or "mpirun -np {#} lmp_mpi" for mpi
+
+        LAMMPS is started inside the seed folder (LAMMPS dumps output at path it is run from).
+            The working directory is set for the child process only, so any number of
+            seeds can run concurrently from the same Python process.
         '''
-        #Build and run command to exectue LAMMPS
+        if runner is None:
+            runner = AsyncRunner()
+        return await runner.run(self.command(lammps_cmd, seed_num), self.seed_path(seed_num))
+
 
-        #cd to project folder cause LAMMPS dumps output at path it is run from
-        os.chdir(os.path.join(self.outpath, f"seed{seed_num}"))   
-        infile_path = os.path.join(self.outpath, f"seed{seed_num}",self.in_file_name)
-        #Build and run lammps command
-        start_time = time.time()
-        res = os.system(f"{lammps_cmd} -in {infile_path} -screen none")
-        print("--- %s seconds ---" % (time.time() - start_time))
-        return res
+    def run(self, lammps_cmd, seed_num) -> int:
+        '''
+        Blocking version of run_async(). Returns the exit code of LAMMPS. The resources used
+            are added to the parent project's ResourceLog.
+        '''
+        result = AsyncRunner().run_sync(self.command(lammps_cmd, seed_num), self.seed_path(seed_num))
+        seed_job = Job(self.parent_project, self.name, 1, self.seed_variables, self.variables, False, seed_num,
+                       self.n_mpi_domains)
+        self.parent_project.resources.record(seed_job, result)
+        return result.exit_code
@@ -1,12 +1,25 @@
 import os
+import asyncio
 import copy
+import inspect
+import json
 import shutil
 import time
-from joblib import Parallel, delayed
 from rich import print
 
 from .LAMMPS_Job import Job
+from .AdaptiveSeeds import AdaptiveSeeds
+from .AsyncRunner import AsyncRunner, RunResult
+from .HostPool import HostPool
+from .JobScheduler import JobScheduler
+from .PartitionBundle import PartitionBundle
+from .ProgressDashboard import ProgressDashboard
+from .ProjectManifest import ProjectManifest
+from .ResourceLog import ResourceLog
+from .ResultCollector import ResultCollector
+from .RuntimeEstimator import RuntimeEstimator
 from .FileIO.InFile import InFile
+from .FileIO.CompressedFile import OutputCompressor
 
 
 #All jobs created within a project will be stored in the same place
@@ -16,17 +29,21 @@ class LocalProject:
     - Expects local version of LAMMPS to be accessible through the command line.
     '''
 
-    def __init__(self, name : str, infile_path : str, basepath: str, only_make_plots: bool = False):
+    def __init__(self, name : str, infile_path : str, basepath: str, only_make_plots: bool = False,
+                 resume : bool = False):
         '''
         name : Name of project
         infile_path : path to in file, contains file name and extension
         basepath : Root of file system for this project.
         outpath: Folder created inside of basepath labeled with project name.
+        resume : Reopen an existing project folder instead of raising. Jobs are rebuilt from
+            the project manifest and only seeds that did not finish are run again.
         '''
         self.name = name
         self.infile_path = infile_path
         self.basepath = basepath
         self.only_make_plots = only_make_plots
+        self.resume = resume
         self.outpath = os.path.join(self.basepath,self.name)
 
         if not only_make_plots:
@@ -38,12 +55,29 @@ class LocalProject:
         Old Jobs: A list of Job objects created by previous instances of this project. Collected from
             output folder of the project.
         New Jobs: A list of Job objects created by the current instance of this project. 
-        Job Tracker: An object that creates and maintains a text file of which Jobs
-            have been run and assigns unique IDs to each run of a Job to ensure
-            that no data is overwritten.
+        Manifest: ProjectManifest (manifest.json in the project folder) recording every
+            job's variables and the status and exit code of each seed.
+        Utilisation: Core utilisation of every call to run_all_jobs_mpi ("batches") and of
+            the project as a whole. Saved to utilisation.json in the project folder.
+        Resources: ResourceLog (resources.jsonl in the project folder) with the wall time,
+            CPU time, peak memory, host and rank count of every seed that was run.
         '''
         self.in_file = InFile(self.infile_path)
-        self.jobs = {}
+        self.manifest = ProjectManifest(self.outpath)
+        self.resources = ResourceLog(None if only_make_plots else self.outpath)
+        self.jobs = self.__collect_old_jobs()
+        self.utilisation = {"batches" : [], "project" : {}}
+        self.dashboard = None
+
+        utilisation_path = os.path.join(self.outpath, "utilisation.json")
+        if os.path.isfile(utilisation_path):
+            with open(utilisation_path, "r") as f:
+                self.utilisation = json.load(f)
+
+        if self.manifest.infile_name is None:
+            self.manifest.infile_name = os.path.basename(self.infile_path)
+        if not only_make_plots:
+            self.manifest.compact()
 
 
 
@@ -59,43 +93,73 @@ class LocalProject:
                 #Reset infile path to be the one in the project folder
                 self.infile_path = os.path.join(self.outpath,os.path.basename(self.infile_path))
             except FileExistsError: 
-                raise RuntimeError(f"A project with this name already exists in : {self.basepath}")
+                if not self.resume:
+                    raise RuntimeError(f"A project with this name already exists in : {self.basepath}. Pass resume = True to reopen it.")
+                manifest = ProjectManifest(self.outpath)
+                if not manifest.exists():
+                    raise RuntimeError(f"Cannot resume project, no {ProjectManifest.FILENAME} in : {self.outpath}")
+                #Keep using the in-file the project was created with
+                self.infile_path = os.path.join(self.outpath, manifest.infile_name)
             except PermissionError: raise PermissionError(f"Python does not have permission to create: {self.outpath}")
         else:
             raise RuntimeError(f"{self.basepath} does not exist")
 
 
-    # def __collect_old_jobs(self) -> dict:
-    #     '''
-    #     If this project has been executed previously there will be Job folders
-    #     inside of 'outpath'. This function collects the names of those jobs.
-    #     '''
-    #     old_jobs = {}
-    #     for path in os.listdir(self.outpath):
-    #         if os.path.isdir(os.path.join(self.outpath,path)):
-    #             old_job_name = os.path.basename(path)
-    #             old_jobs[old_job_name] = "old_job"
-    #     return old_jobs
+    def __collect_old_jobs(self) -> dict:
+        '''
+        If this project has been executed previously its jobs are recorded in the manifest
+            inside of 'outpath'. This function rebuilds those Job objects without touching
+            their folders.
+        '''
+        old_jobs = {}
+        for name, job in self.manifest.jobs.items():
+            old_jobs[name] = Job(self, name, job["n_seeds"], job["seed_variables"], job["variables"],
+                                 create_file_structure = False, n_mpi_domains = job["n_mpi_domains"])
+
+        if len(old_jobs) > 0:
+            counts = self.manifest.summary()
+            print(f"Found {len(old_jobs)} jobs in {self.outpath}: {counts[ProjectManifest.DONE]} seeds done, "
+                  f"{counts[ProjectManifest.FAILED]} failed, "
+                  f"{counts[ProjectManifest.PENDING] + counts[ProjectManifest.RUNNING]} unfinished.")
+        return old_jobs
 
 
-    def new_job(self, name: str, n_seeds :int, seed_variables : list, changed_vars : dict = None) -> None:
+    def new_job(self, name: str, n_seeds :int, seed_variables : list, changed_vars : dict = None,
+                n_mpi_domains : int = None, lazy : bool = False) -> None:
         '''
         Creates job if no job with 'name' exists in the project folder.
 
         Name: Name of job to create or load from project structure
         Changed_Vars: Variables to change in the in-file, will be ignored if
             job already existed in file structure.
+        N MPI Domains: Number of MPI ranks every seed of this job runs with. If None the
+            value passed to run_all_jobs_mpi is used (or one inferred from the atom count).
+        Lazy: Only record the job in the manifest. Its seed folders and in-files are created
+            when each seed is dispatched, so setting up large sweeps does not touch the file system.
         '''
-        name = name.strip()
+        self.__add_job(name, n_seeds, seed_variables, changed_vars, n_mpi_domains, lazy)
+        self.__save_manifest()
 
-        # #Check if a job with this name was created before
-        # if name in self.old_jobs.keys():
-        #     self.active_jobs[name] = Job(self, name)
-        #     print("Found job with same name in file structure. Re-activating old job with its orignal variables.")
-        #     return
+
+    def new_jobs(self, jobs : list, lazy : bool = False) -> None:
+        '''
+        Creates many jobs at once, the manifest is only written once at the end.
+
+        Jobs: List of dictionaries of new_job() arguments, e.g.
+            [{"name" : "T100", "n_seeds" : 5, "seed_variables" : ["velocity_seed"], "changed_vars" : {"T" : 100}}]
+        Lazy: See new_job().
+        '''
+        for job in jobs:
+            self.__add_job(lazy = lazy, **job)
+        self.__save_manifest()
 
 
+    def __add_job(self, name: str, n_seeds :int, seed_variables : list, changed_vars : dict = None,
+                  n_mpi_domains : int = None, lazy : bool = False) -> None:
+        name = name.strip()
+
         #Check if a job with this name already exists in the current project instance
+        #(this includes jobs reloaded from the manifest of a resumed project)
         if (name in self.jobs.keys()):
             print("=====================================================================")
             print(f"A job with name {name} already exists in the current project instance. This job will not be created.")
@@ -111,7 +175,9 @@ class LocalProject:
                     raise KeyError(f"{key} is not a modifiable variable in the in-file at {self.infile_path}")
                 
         
-        self.jobs[name] = Job(self, name, n_seeds, seed_variables, job_variables)
+        self.jobs[name] = Job(self, name, n_seeds, seed_variables, job_variables,
+                              create_file_structure = not lazy, n_mpi_domains = n_mpi_domains)
+        self.manifest.add_job(self.jobs[name])
 
     # def run_all_jobs(self, lammps_env_var = "lmp") -> None:
     #     if len(self.jobs) > 0:
@@ -127,51 +193,259 @@ class LocalProject:
     #     else:
     #         print("No active yet. See create_job() & activate_old_job().")
         
-    def get_all_jobs(self):
+    def get_all_jobs(self, skip_finished : bool = True):
         #For each seed in a job create a dummy Job() object with 1 seed and correct paths
+        #Seeds the manifest lists as done are left out unless skip_finished is False
         all_jobs = []
         for job in self.jobs.values():
-            for seed in range(job.n_seeds):
-                all_jobs.append(Job(self, job.name, 1, job.seed_variables, job.variables, False, seed))
+            all_jobs.extend(self.__seed_jobs(job, skip_finished))
 
         return all_jobs
+
+    def __seed_jobs(self, job : Job, skip_finished : bool = True) -> list:
+        return [Job(self, job.name, 1, job.seed_variables, job.variables, False, seed, job.n_mpi_domains)
+                for seed in range(job.n_seeds)
+                if not (skip_finished and self.manifest.is_finished(job.name, seed))]
+
+    def add_seeds(self, job_name : str, n_new : int) -> list:
+        '''
+        Adds `n_new` seeds to job `job_name` and returns them as single-seed Job objects
+            (see get_all_jobs()). Their folders and in-files are created when they are run.
+        '''
+        job = self.jobs[job_name]
+        first_seed = job.n_seeds
+        job.n_seeds += n_new
+        self.manifest.add_seeds(job_name, n_new)
+        self.__commit_manifest()
+        return [Job(self, job.name, 1, job.seed_variables, job.variables, False, seed, job.n_mpi_domains)
+                for seed in range(first_seed, job.n_seeds)]
+
+    def __save_manifest(self) -> None:
+        if not self.only_make_plots:
+            self.manifest.save()
+
+    def __commit_manifest(self) -> None:
+        #Seed status changes only append to the manifest journal, see ProjectManifest
+        if not self.only_make_plots:
+            self.manifest.commit()
     
-    def run_all_jobs_mpi(self, ncores, n_mpi_domains, lammps_env_var = "lmp"):
-                #Run all active jobs -- NO PARALLELISM OVER SEEDS
+    def run_all_jobs_mpi(self, ncores, n_mpi_domains, lammps_env_var = "lmp", atoms_per_rank : int = None,
+                         atom_count = None, pin_cpus : bool = False, timing_history : str = None,
+                         live : bool = False, poll_interval : float = 2.0, seeds_per_launch : int = 1,
+                         mpi_launcher : str = "mpirun", adaptive : AdaptiveSeeds = None, hosts : HostPool = None,
+                         compress : OutputCompressor = None):
+        '''
+        Runs every seed of every job, keeping at most `ncores` cores busy. Seeds are taken
+            from a work queue so the next seed starts as soon as enough cores are free.
+
+        N MPI Domains: MPI ranks for jobs that did not set their own in new_job().
+        Atoms Per Rank / Atom Count: Infer the rank count of such jobs from their atom count
+            instead, see JobScheduler.
+        Pin CPUs: Bind the ranks of every job to their own set of cores.
+        Timing History: JSON file with wall times of previous jobs, used to run the longest
+            jobs first. Defaults to timings.json in the project folder. Timings from this
+            run are added to it.
+        Live: Show a live table of every running seed's step, speed and ETA, refreshed
+            every `poll_interval` seconds.
+        Seeds Per Launch: If more than 1, up to this many seeds with the same rank count are
+            run by one mpirun using LAMMPS partitions (see PartitionBundle). Worth it for
+            short runs of small systems where start-up is a large part of the wall time.
+        MPI Launcher: Command used to start MPI jobs, e.g. "srun" or "mpiexec".
+        Adaptive: AdaptiveSeeds deciding how many seeds each job needs. Seeds are added to
+            jobs whose observable has not converged yet and jobs that have converged get
+            no more seeds, whatever their n_seeds was.
+        Hosts: HostPool of a multi-node allocation, e.g. HostPool.from_slurm() or
+            HostPool.from_hostfile(path). Every mpirun is restricted to the slots it was
+            given instead of all landing on the first node. Ncores may be None to use
+            every slot.
+        Compress: OutputCompressor compressing the outputs of every seed that finished
+            successfully in the background, e.g. OutputCompressor(["dump.*"]). The parsers
+            and tdep_from_lammps read the compressed files directly.
+        '''
         start_time = time.time()
+        if adaptive is not None and seeds_per_launch > 1:
+            raise RuntimeError("Adaptive seeding cannot be combined with seeds_per_launch > 1")
 
-        max_parallel_jobs = int(ncores//n_mpi_domains)
-        cmd = f"mpirun -np {n_mpi_domains} {lammps_env_var}"
+        if timing_history is None and not self.only_make_plots:
+            timing_history = os.path.join(self.outpath, "timings.json")
+        estimator = RuntimeEstimator(timing_history)
 
-        jobs = self.get_all_jobs()
+        scheduler = JobScheduler(ncores, n_mpi_domains, estimator, pin_cpus, atoms_per_rank, atom_count, mpi_launcher, hosts)
+        jobs, run_fn, on_done = self.get_all_jobs(), self.run_single_job_seed, None
+        if seeds_per_launch > 1:
+            jobs = PartitionBundle.bundle(self, jobs, [scheduler.ranks(job) for job in jobs], seeds_per_launch, scheduler.ncores,
+                                          [scheduler.estimate(job) for job in jobs])
+            run_fn = self.run_partition_bundle
+        if adaptive is not None:
+            jobs, on_done = adaptive.start(self, jobs), adaptive.on_done
+        if compress is not None:
+            on_done = self.__compress_on_done(compress, on_done)
 
-        if len(jobs) <= max_parallel_jobs:
-            Parallel(n_jobs = max_parallel_jobs)(delayed(self.run_single_job_seed)(job, cmd) for job in jobs)
+        if live:
+            self.dashboard = ProgressDashboard(poll_interval)
+            stats = asyncio.run(self.__run_with_dashboard(scheduler, jobs, run_fn, lammps_env_var, on_done))
+            self.dashboard = None
+        else:
+            stats = scheduler.run(jobs, run_fn, lammps_env_var, on_done)
+        stats.pop("results")
+        estimator.save()
+        self.__save_manifest()
+        if compress is not None:
+            print(f"Compressed {len(compress.wait())} output files")
 
-        else: #chunk jobs into smaller arrays smaller than "max_parallel_jobs"
-            job_chunked = [jobs[i:i + max_parallel_jobs] for i in range(0, len(jobs), max_parallel_jobs)]
-            n_chunks = len(job_chunked)
-            for i,chunk in enumerate(job_chunked):
-                print("===============");print(f"Batch {i+1} of {n_chunks}"); print("===============")
-                Parallel(n_jobs = len(chunk))(delayed(self.run_single_job_seed)(job, cmd) for job in chunk)
+        self.__record_utilisation(stats)
         print(f"[bold green]JOBS COMPLETE[/bold green] All jobs took {time.time() - start_time} seconds")
+        if stats["batched_utilisation_estimate"] is not None:
+            print(f"Core utilisation: {100*stats['utilisation']:.1f}% "
+                  f"(fixed batches would have been ~{100*stats['batched_utilisation_estimate']:.1f}%)")
+        else:
+            print(f"Core utilisation: {100*stats['utilisation']:.1f}%")
+        if adaptive is not None:
+            summary = adaptive.summary()
+            print(f"{summary['converged'].sum()} of {len(summary)} jobs converged using {summary['n_seeds'].sum()} seeds")
+
+    def __compress_on_done(self, compress : OutputCompressor, on_done = None):
+        '''
+        Wraps `on_done` so the outputs of every successful seed are queued for compression
+            once `on_done` (e.g. AdaptiveSeeds reading the observable) is through with them.
+        '''
+        async def finished(job, result : RunResult) -> list:
+            new_jobs = on_done(job, result) if on_done is not None else []
+            if inspect.isawaitable(new_jobs):
+                new_jobs = await new_jobs
+            for seed in (job.seeds if isinstance(job, PartitionBundle) else [job]):
+                if self.manifest.is_finished(seed.name, seed.seed_id):
+                    compress.submit(seed.seed_path(seed.seed_id))
+            return new_jobs
+        return finished
+
+    async def __run_with_dashboard(self, scheduler : JobScheduler, jobs : list, run_fn, lammps_env_var, on_done = None) -> dict:
+        dashboard_task = asyncio.ensure_future(self.dashboard.run())
+        try:
+            return await scheduler.run_async(jobs, run_fn, lammps_env_var, on_done)
+        finally:
+            self.dashboard.stop()
+            await dashboard_task
+
+    def __record_utilisation(self, stats : dict) -> None:
+        '''
+        Appends the statistics of one scheduler run to `utilisation`, updates the
+            project-wide totals and writes both to utilisation.json in the project folder.
+        '''
+        self.utilisation["batches"].append(stats)
 
-    def run_single_job_seed(self, job : Job, lammps_cmd):
+        batches = self.utilisation["batches"]
+        busy_core_seconds = sum(b["busy_core_seconds"] for b in batches)
+        available_core_seconds = sum(b["ncores"]*b["wall_time"] for b in batches)
+        self.utilisation["project"] = {
+            "n_seeds" : sum(b["n_seeds"] for b in batches),
+            "wall_time" : sum(b["wall_time"] for b in batches),
+            "busy_core_seconds" : busy_core_seconds,
+            "utilisation" : busy_core_seconds / available_core_seconds if available_core_seconds > 0 else 0.0,
+        }
+
+        if not self.only_make_plots:
+            with open(os.path.join(self.outpath, "utilisation.json"), "w") as f:
+                json.dump(self.utilisation, f, indent = 4)
+
+    async def run_single_job_seed(self, job : Job, lammps_cmd, runner : AsyncRunner = None) -> RunResult:
         print(f"[blue] Running [/blue]: {job.name} seed {job.seed_id}\n")
-        exit_status = job.run(lammps_cmd, job.seed_id)
-        if exit_status != 0:
-            print(f"{job.name} failed. Exited with code {exit_status} on seed {job.seed_id}."); print()
-        print(f"{job.name} seed {job.seed_id} [green] completed [/green] successfully."); print()
+        #No-op unless the job was created lazily
+        job.prepare_seed(job.seed_id)
+        self.manifest.set_seed_status(job.name, job.seed_id, ProjectManifest.RUNNING)
+        self.__commit_manifest()
+        if self.dashboard is not None:
+            self.dashboard.add(job.name, job.seed_id, job.seed_path(job.seed_id))
+
+        result = await job.run_async(lammps_cmd, job.seed_id, runner)
+        self.resources.record(job, result)
+        if self.dashboard is not None:
+            self.dashboard.remove(job.name, job.seed_id, result.exit_code == 0)
+        if result.exit_code != 0:
+            print(f"{job.name} failed. Exited with code {result.exit_code} on seed {job.seed_id}.")
+            print(result.stderr_tail()); print()
+            self.manifest.set_seed_status(job.name, job.seed_id, ProjectManifest.FAILED, result.exit_code)
+        else:
+            print(f"{job.name} seed {job.seed_id} [green] completed [/green] successfully in {result.wall_time:.1f} seconds."); print()
+            self.manifest.set_seed_status(job.name, job.seed_id, ProjectManifest.DONE, result.exit_code)
+        self.__commit_manifest()
+        return result
     
 
+    async def run_partition_bundle(self, bundle : PartitionBundle, lammps_cmd, runner : AsyncRunner = None) -> RunResult:
+        '''
+        Runs every seed of `bundle` in one multi-partition LAMMPS launch. Whether each seed
+            finished is read from its own log, so one crashed partition only fails its seed.
+        '''
+        print(f"[blue] Running [/blue]: {', '.join(f'{job.name} seed {job.seed_id}' for job in bundle.seeds)} "
+              f"as {bundle.n_partitions} partitions\n")
+        for job in bundle.seeds:
+            job.prepare_seed(job.seed_id)
+            self.manifest.set_seed_status(job.name, job.seed_id, ProjectManifest.RUNNING)
+            if self.dashboard is not None:
+                self.dashboard.add(job.name, job.seed_id, job.seed_path(job.seed_id))
+        self.__commit_manifest()
+
+        bundle.write_wrapper()
+        if runner is None:
+            runner = AsyncRunner()
+        result = await runner.run(bundle.command(lammps_cmd), bundle.outpath)
+
+        for job in bundle.seeds:
+            success = bundle.seed_finished(job)
+            exit_code = 0 if success else (result.exit_code if result.exit_code != 0 else 1)
+            #Every partition runs for the whole launch on its own share of the ranks
+            self.resources.record(job, result, bundle.ranks_per_partition, exit_code, 1 / bundle.n_partitions)
+            if self.dashboard is not None:
+                self.dashboard.remove(job.name, job.seed_id, success)
+            if success:
+                print(f"{job.name} seed {job.seed_id} [green] completed [/green] successfully in {result.wall_time:.1f} seconds.")
+                self.manifest.set_seed_status(job.name, job.seed_id, ProjectManifest.DONE, 0)
+            else:
+                print(f"{job.name} failed. Exited with code {exit_code} on seed {job.seed_id}.")
+                self.manifest.set_seed_status(job.name, job.seed_id, ProjectManifest.FAILED, exit_code)
+        if result.exit_code != 0:
+            print(result.stderr_tail())
+        print()
+        self.__commit_manifest()
+        return result
+
+
     def run_job_serial(self, job_name, lammps_cmd = "lmp"):
         if self.only_make_plots:
             raise RuntimeError("Flag only_make_plots is set to True")
         try:
-            for seed in range(self.jobs[job_name].n_seeds):
-                exit_status = self.jobs[job_name].run(lammps_cmd, seed)
-                if exit_status != 0:
-                    print(f"{job_name} failed. Exited with code {exit_status} on seed {seed}."); print()
-            print(f"{job_name} completed successfully."); print()
+            job = self.jobs[job_name]
         except KeyError:
             raise KeyError(f"No job with name {job_name}")
+
+        async def run_seeds():
+            return [await self.run_single_job_seed(seed_job, lammps_cmd) for seed_job in self.__seed_jobs(job)]
+
+        results = asyncio.run(run_seeds())
+        if all(result.exit_code == 0 for result in results):
+            print(f"{job_name} completed successfully."); print()
+
+
+    def collect(self, filename : str, parser, reducer, cache_key : str = None, n_jobs : int = -1):
+        '''
+        Parses `filename` in every seed folder of every job in parallel and reduces it with
+            `reducer`. Returns a pandas DataFrame indexed by (job, seed) with each job's
+            variables as columns alongside the reduced results. Results are saved in the
+            project folder so later calls only parse seeds that are new or have changed.
+            See ResultCollector for the arguments.
+
+        e.g. project.collect("log.lammps", ThermoLogParser(), lambda d: d["Temp"].mean(), "mean_temp")
+        '''
+        return ResultCollector(self, filename, parser, reducer, cache_key).collect(n_jobs)
+
+
+    def resource_report(self, by = None):
+        '''
+        Core-hours, CPU hours, wall time and peak memory of every seed run so far, summed per
+            job or, with `by` set to one or more variable names, per value of those
+            variables. See ResourceLog.report().
+
+        e.g. project.resource_report("T") to find the temperatures that are slow to run
+        '''
+        return self.resources.report(by)
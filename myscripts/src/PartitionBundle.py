@@ -0,0 +1,142 @@
+import os
+import shlex
+
+from .LAMMPS_Job import Job
+
+
+class PartitionBundle:
+    '''
+    Several seeds that are run by a single multi-partition LAMMPS launch:
+        "mpirun -np P*R lmp -partition PxR -in in.partition"
+
+    Each of the P partitions (R ranks each) changes into its own seed folder, opens its own
+        log.lammps there and includes the seed's usual in-file, so the output ends up exactly
+        where a seed launched on its own would have put it. For small systems this saves one
+        mpirun start-up and LAMMPS initialisation per seed.
+
+    Looks enough like a Job (name, variables, n_mpi_domains, atom_count) for the JobScheduler
+        to queue it, n_partitions tells the scheduler how many seeds share the ranks.
+    '''
+
+    WRAPPER_NAME = "in.partition"
+    #Printed by LAMMPS to the log of every partition that exits normally
+    FINISHED_MARKER = "Total wall time"
+
+    def __init__(self, parent_project : 'AbstractProject', seeds : list, ranks_per_partition : int):
+        '''
+        Seeds: Single-seed Job objects (see LocalProject.get_all_jobs()), all run with
+            `ranks_per_partition` MPI ranks.
+        '''
+        if len(seeds) == 0:
+            raise RuntimeError("Cannot create a partition bundle without seeds")
+        self.parent_project = parent_project
+        self.seeds = seeds
+        self.ranks_per_partition = ranks_per_partition
+
+        '''
+        Name: Label of the bundle, named after its first (longest) seed.
+        Outpath: Folder holding the wrapper in-file and the universe log of the launch.
+        '''
+        self.name = f"{seeds[0].name}_seed{seeds[0].seed_id}_x{len(seeds)}"
+        self.seed_id = None
+        self.variables = seeds[0].variables
+        self.n_partitions = len(seeds)
+        self.n_mpi_domains = self.n_partitions * ranks_per_partition
+        self.outpath = os.path.join(parent_project.outpath, "partitions", self.name)
+
+
+    def atom_count(self, atom_count) -> int:
+        return self.seeds[0].atom_count(atom_count)
+
+
+    def write_wrapper(self) -> str:
+        '''
+        Writes the in-file every partition starts from and returns its path. World-style
+            variables give each partition its own seed folder and in-file.
+        '''
+        os.makedirs(self.outpath, exist_ok = True)
+        seed_dirs = " ".join(f"\"{os.path.abspath(seed.seed_path(seed.seed_id))}\"" for seed in self.seeds)
+        in_files = " ".join(f"\"{seed.in_file_name}\"" for seed in self.seeds)
+
+        wrapper_path = os.path.join(self.outpath, self.WRAPPER_NAME)
+        with open(wrapper_path, 'w') as f:
+            f.write(f"variable partition_seed_dir world {seed_dirs}\n"
+                    f"variable partition_in_file world {in_files}\n"
+                    "shell cd ${partition_seed_dir}\n"
+                    "log log.lammps\n"
+                    "include ${partition_in_file}\n")
+        return wrapper_path
+
+
+    def command(self, lammps_cmd) -> list:
+        '''
+        Argument list that runs every seed of the bundle. `lammps_cmd` is the MPI launch
+            command for all n_mpi_domains ranks (see JobScheduler.command()).
+        '''
+        wrapper_path = os.path.join(self.outpath, self.WRAPPER_NAME)
+        return shlex.split(lammps_cmd) + ["-partition", f"{self.n_partitions}x{self.ranks_per_partition}",
+                                          "-in", wrapper_path, "-plog", "none", "-pscreen", "none", "-screen", "none"]
+
+
+    def seed_finished(self, seed : Job) -> bool:
+        '''
+        True if the log of `seed` shows that its partition exited normally. The exit code
+            of the launch only says whether every partition did.
+        '''
+        log_path = os.path.join(seed.seed_path(seed.seed_id), "log.lammps")
+        try:
+            with open(log_path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(f.tell() - 4096, 0))
+                return self.FINISHED_MARKER.encode() in f.read()
+        except FileNotFoundError:
+            return False
+
+
+    def seed_timings(self, result) -> list:
+        '''
+        (seed, wall time) of every seed whose partition finished, from `result` of the
+            launch. A partition is done when it last wrote its log, so its wall time runs
+            from the launch to that moment rather than to the end of the slowest partition.
+        '''
+        timings = []
+        for seed in self.seeds:
+            if not self.seed_finished(seed):
+                continue
+            log_path = os.path.join(seed.seed_path(seed.seed_id), "log.lammps")
+            end_time = min(os.path.getmtime(log_path), result.end_time)
+            timings.append((seed, max(end_time - result.start_time, 0.0)))
+        return timings
+
+
+    @staticmethod
+    def bundle(parent_project, seeds : list, widths : list, seeds_per_launch : int, max_ranks : int,
+               estimates : list = None, max_spread : float = 1.5) -> list:
+        '''
+        Groups `seeds` into bundles of up to `seeds_per_launch` seeds with the same number of
+            ranks (`widths`). No bundle uses more than `max_ranks` ranks.
+
+        A launch lasts as long as its slowest partition, so seeds are sorted by their
+            estimated wall time (`estimates`, longest first) and seeds of the same job are
+            kept together. A bundle is closed early when the next seed's estimate is more
+            than `max_spread` times shorter than that of the bundle's first seed.
+        '''
+        if estimates is None:
+            estimates = [1.0]*len(seeds)
+        order = sorted(range(len(seeds)), key = lambda i: (-estimates[i], seeds[i].name, seeds[i].seed_id))
+
+        groups = {}
+        for i in order:
+            groups.setdefault(widths[i], []).append(i)
+
+        bundles = []
+        for width, group in groups.items():
+            size = max(min(seeds_per_launch, max_ranks // width), 1)
+            current = []
+            for i in group:
+                if len(current) == size or (len(current) > 0 and estimates[current[0]] > max_spread*estimates[i]):
+                    bundles.append(PartitionBundle(parent_project, [seeds[j] for j in current], width))
+                    current = []
+                current.append(i)
+            bundles.append(PartitionBundle(parent_project, [seeds[j] for j in current], width))
+        return bundles
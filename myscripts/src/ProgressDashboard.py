@@ -0,0 +1,102 @@
+import os
+import asyncio
+import time
+from rich.live import Live
+from rich.table import Table
+
+from .FileIO.LogTail import LogTail
+
+
+class ProgressDashboard:
+    '''
+    Live terminal table of every running seed: current step, simulation speed and ETA.
+        Progress is read from each seed's log with a LogTail, so a poll only reads what
+        was appended to the logs since the previous poll.
+    '''
+
+    def __init__(self, poll_interval : float = 2.0, log_name : str = "log.lammps", max_rows : int = 50):
+        '''
+        Poll Interval: Seconds between refreshes.
+        Log Name: Name of the LAMMPS log inside each seed folder.
+        Max Rows: Maximum number of running seeds listed, the rest are only counted.
+        '''
+        self.poll_interval = poll_interval
+        self.log_name = log_name
+        self.max_rows = max_rows
+
+        self.active = {}
+        self.n_done = 0
+        self.n_failed = 0
+        self.__stopped = False
+        self.__stop_event = None
+
+
+    def add(self, name : str, seed_id : int, seed_path : str) -> None:
+        '''
+        Starts following the log of a seed that was just launched.
+        '''
+        self.active[(name, seed_id)] = (LogTail(os.path.join(seed_path, self.log_name)), time.time())
+
+
+    def remove(self, name : str, seed_id : int, success : bool) -> None:
+        self.active.pop((name, seed_id), None)
+        if success:
+            self.n_done += 1
+        else:
+            self.n_failed += 1
+
+
+    def poll(self) -> None:
+        for tail, _ in self.active.values():
+            tail.poll()
+
+
+    def render(self) -> Table:
+        table = Table(title = f"{len(self.active)} running, {self.n_done} done, {self.n_failed} failed")
+        for column in ["Job", "Seed", "Step", "Target", "Steps/s", "ETA", "Elapsed"]:
+            table.add_column(column, justify = "left" if column == "Job" else "right")
+
+        for (name, seed_id), (tail, start_time) in list(self.active.items())[:self.max_rows]:
+            eta = tail.eta()
+            table.add_row(
+                name,
+                str(seed_id),
+                str(tail.step) if tail.step is not None else "-",
+                str(tail.target_step) if tail.target_step is not None else "-",
+                f"{tail.steps_per_second:.1f}" if tail.steps_per_second is not None else "-",
+                self.__format_seconds(eta) if eta is not None else "-",
+                self.__format_seconds(time.time() - start_time),
+            )
+        if len(self.active) > self.max_rows:
+            table.caption = f"... and {len(self.active) - self.max_rows} more running seeds"
+        return table
+
+
+    async def run(self) -> None:
+        '''
+        Polls and redraws the table every `poll_interval` seconds until stop() is called.
+        '''
+        self.__stop_event = asyncio.Event()
+        if self.__stopped:
+            self.__stop_event.set()
+        with Live(self.render(), refresh_per_second = 4) as live:
+            while not self.__stop_event.is_set():
+                self.poll()
+                live.update(self.render())
+                try:
+                    await asyncio.wait_for(self.__stop_event.wait(), timeout = self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            live.update(self.render())
+
+
+    def stop(self) -> None:
+        self.__stopped = True
+        if self.__stop_event is not None:
+            self.__stop_event.set()
+
+
+    @staticmethod
+    def __format_seconds(seconds : float) -> str:
+        seconds = int(seconds)
+        return f"{seconds // 3600}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
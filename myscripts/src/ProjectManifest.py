@@ -0,0 +1,162 @@
+import os
+import json
+import numpy as np
+
+
+class ProjectManifest:
+    '''
+    Persistent index of a project, stored as manifest.json in the project folder.
+        Records the variables of every job and the status and exit code of each of
+        its seeds, so a project can be reopened and only unfinished seeds re-run.
+
+    Seed status is one of PENDING, RUNNING, DONE or FAILED. A seed left as RUNNING
+        was interrupted (e.g. node reboot or walltime kill) and counts as unfinished.
+
+    Seed status changes and added seeds are appended to manifest.journal by commit()
+        instead of rewriting manifest.json, so recording a seed costs the same however
+        many jobs the project has. The journal is replayed on load and folded back into
+        manifest.json by save().
+    '''
+
+    FILENAME = "manifest.json"
+    JOURNAL = "manifest.journal"
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, project_path : str):
+        '''
+        Path: Location of manifest.json inside `project_path`.
+        Infile Name: Name of the project in-file copied into the project folder.
+        Jobs: Dictionary of job name to {"variables", "n_seeds", "seed_variables",
+            "n_mpi_domains", "seeds"}, where "seeds" is a list of {"status", "exit_code"}.
+        '''
+        self.path = os.path.join(project_path, self.FILENAME)
+        self.journal_path = os.path.join(project_path, self.JOURNAL)
+        self.infile_name = None
+        self.jobs = {}
+        #Journal entries not written yet
+        self.__pending = []
+
+        if os.path.isfile(self.path):
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.infile_name = data["infile_name"]
+            self.jobs = data["jobs"]
+            self.__replay()
+
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+
+    def save(self) -> None:
+        '''
+        Writes the whole manifest and empties the journal. Writes to a temporary file first
+            so an interrupted write never corrupts the manifest.
+        '''
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"infile_name" : self.infile_name, "jobs" : self.jobs}, f, indent = 1, default = self.__to_json)
+        os.replace(tmp_path, self.path)
+        #Entries in the journal are all in manifest.json now (replaying them again is harmless)
+        if os.path.isfile(self.journal_path):
+            os.remove(self.journal_path)
+        self.__pending = []
+
+
+    def commit(self) -> None:
+        '''
+        Appends the seed changes made since the last commit() or save() to the journal.
+            Only jobs already in manifest.json can be journaled, new jobs need save().
+        '''
+        if len(self.__pending) == 0:
+            return
+        with open(self.journal_path, "a") as f:
+            f.write("".join(json.dumps(entry, default = self.__to_json) + "\n" for entry in self.__pending))
+        self.__pending = []
+
+
+    def compact(self) -> None:
+        '''
+        Folds a journal left by a previous run into manifest.json.
+        '''
+        if os.path.isfile(self.journal_path):
+            self.save()
+
+
+    def __replay(self) -> None:
+        if not os.path.isfile(self.journal_path):
+            return
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    #Last line cut short by a crash
+                    break
+                if entry["job"] not in self.jobs:
+                    continue
+                if "n_seeds" in entry:
+                    self.__grow(entry["job"], entry["n_seeds"])
+                else:
+                    self.jobs[entry["job"]]["seeds"][entry["seed"]] = {"status" : entry["status"], "exit_code" : entry["exit_code"]}
+
+
+    def __grow(self, job_name : str, n_seeds : int) -> None:
+        job = self.jobs[job_name]
+        job["seeds"].extend({"status" : self.PENDING, "exit_code" : None} for _ in range(n_seeds - len(job["seeds"])))
+        job["n_seeds"] = max(job["n_seeds"], n_seeds)
+
+
+    def add_job(self, job) -> None:
+        self.jobs[job.name] = {
+            "variables" : job.variables,
+            "n_seeds" : job.n_seeds,
+            "seed_variables" : job.seed_variables,
+            "n_mpi_domains" : job.n_mpi_domains,
+            "seeds" : [{"status" : self.PENDING, "exit_code" : None} for _ in range(job.n_seeds)],
+        }
+
+
+    def add_seeds(self, job_name : str, n_new : int) -> None:
+        n_seeds = self.jobs[job_name]["n_seeds"] + n_new
+        self.__grow(job_name, n_seeds)
+        #The new total rather than n_new, so replaying the entry twice changes nothing
+        self.__pending.append({"job" : job_name, "n_seeds" : n_seeds})
+
+
+    def set_seed_status(self, job_name : str, seed_id : int, status : str, exit_code : int = None) -> None:
+        self.jobs[job_name]["seeds"][seed_id] = {"status" : status, "exit_code" : exit_code}
+        self.__pending.append({"job" : job_name, "seed" : seed_id, "status" : status, "exit_code" : exit_code})
+
+
+    def seed_status(self, job_name : str, seed_id : int) -> str:
+        return self.jobs[job_name]["seeds"][seed_id]["status"]
+
+
+    def is_finished(self, job_name : str, seed_id : int) -> bool:
+        return job_name in self.jobs and self.seed_status(job_name, seed_id) == self.DONE
+
+
+    def summary(self) -> dict:
+        '''
+        Number of seeds in each status, over all jobs.
+        '''
+        counts = {self.PENDING : 0, self.RUNNING : 0, self.DONE : 0, self.FAILED : 0}
+        for job in self.jobs.values():
+            for seed in job["seeds"]:
+                counts[seed["status"]] += 1
+        return counts
+
+
+    @staticmethod
+    def __to_json(value):
+        #Variables often come from numpy arrays (e.g. make_param_combos)
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        raise TypeError(f"Cannot store {type(value)} in project manifest")
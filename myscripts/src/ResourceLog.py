@@ -0,0 +1,151 @@
+import os
+import json
+import shlex
+import numpy as np
+import pandas as pd
+
+
+class ResourceLog:
+    '''
+    Structured record of the resources used by every seed execution, kept as
+        resources.jsonl in the project folder (one JSON object per line, appended as
+        seeds finish). Each record holds the job, seed and variables, the host, rank
+        count, wall time, CPU time, peak memory and exit code of one run of that seed.
+
+    Seeds that are run again (e.g. after a failure) get a new record, so the log holds
+        every core-hour spent, not only those of the final runs.
+    '''
+
+    FILENAME = "resources.jsonl"
+
+    def __init__(self, project_path : str = None):
+        '''
+        Path: Location of resources.jsonl inside `project_path`. None keeps records in
+            memory only.
+        Records: Records added by this instance, see record().
+        '''
+        self.path = os.path.join(project_path, self.FILENAME) if project_path is not None else None
+        self.records = []
+
+
+    def record(self, job, result, n_ranks : int = None, exit_code : int = None, share : float = 1.0) -> dict:
+        '''
+        Adds a record of `result` (a RunResult) for seed `job.seed_id` of `job`.
+
+        N Ranks: MPI ranks the seed ran on. If None it is read from the "-np"/"-n" option
+            of the launch command, or 1 if there is none.
+        Exit Code: Overrides the exit code of `result`, for seeds that share one launch.
+        Share: Fraction of the launch's CPU time used by this seed, for seeds that share
+            one launch (LAMMPS partitions).
+        '''
+        if n_ranks is None:
+            n_ranks = self.ranks_from_command(result.cmd)
+        cpu_time = result.cpu_time * share if result.cpu_time is not None else None
+
+        entry = {
+            "job" : job.name,
+            "seed" : job.seed_id,
+            "variables" : job.variables,
+            "host" : self.hosts_from_command(result.cmd) or result.host,
+            "n_ranks" : n_ranks,
+            "start_time" : result.start_time,
+            "wall_time" : result.wall_time,
+            "cpu_time" : cpu_time,
+            "max_rss_mb" : result.max_rss_mb,
+            "exit_code" : result.exit_code if exit_code is None else exit_code,
+            "core_hours" : result.wall_time * n_ranks / 3600,
+        }
+        self.records.append(entry)
+
+        if self.path is not None:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry, default = self.__to_json) + "\n")
+        return entry
+
+
+    def load(self) -> list:
+        '''
+        Every record in resources.jsonl, including those of earlier runs of the project.
+            A partially written last line (interrupted run) is skipped.
+        '''
+        if self.path is None or not os.path.isfile(self.path):
+            return list(self.records)
+
+        records = []
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return records
+
+
+    def report(self, by = None) -> pd.DataFrame:
+        '''
+        Resource usage summed over every record, grouped by job or by variable value.
+
+        By: None to group by job, or the name (or a list of names) of in-file variables to
+            group by, e.g. "T" for the core-hours spent at each temperature.
+
+        Columns are the number of runs and failed runs, core-hours (wall time * ranks),
+            CPU hours, CPU efficiency (CPU hours / core-hours), mean wall time in seconds
+            and the largest peak memory in MB.
+        '''
+        records = self.load()
+        if len(records) == 0:
+            return pd.DataFrame()
+
+        df = pd.DataFrame(records)
+        if by is None:
+            by = ["job"]
+        else:
+            by = [by] if isinstance(by, str) else list(by)
+            for name in by:
+                df[name] = [(variables or {}).get(name) for variables in df["variables"]]
+
+        df["failed"] = df["exit_code"] != 0
+        df["cpu_hours"] = df["cpu_time"].astype(float) / 3600
+        report = df.groupby(by).agg(
+            n_runs = ("seed", "size"),
+            n_failed = ("failed", "sum"),
+            core_hours = ("core_hours", "sum"),
+            #Runs without a CPU time (e.g. on SLURM) leave it unknown instead of 0
+            cpu_hours = ("cpu_hours", lambda x: x.sum(min_count = 1)),
+            mean_wall_time = ("wall_time", "mean"),
+            max_rss_mb = ("max_rss_mb", "max"),
+        )
+        report["cpu_efficiency"] = report["cpu_hours"] / report["core_hours"]
+        return report.sort_values("core_hours", ascending = False)
+
+
+    @staticmethod
+    def ranks_from_command(cmd) -> int:
+        args = shlex.split(cmd) if isinstance(cmd, str) else list(cmd)
+        for i, arg in enumerate(args[:-1]):
+            if arg in ("-np", "-n"):
+                return int(args[i + 1])
+        return 1
+
+
+    @staticmethod
+    def hosts_from_command(cmd) -> str:
+        '''
+        Comma separated hosts of a launch restricted with --host / -hosts (see HostPool),
+            None if it was not restricted.
+        '''
+        args = shlex.split(cmd) if isinstance(cmd, str) else list(cmd)
+        for i, arg in enumerate(args[:-1]):
+            if arg in ("--host", "-host", "-hosts"):
+                return ",".join(entry.split(":")[0] for entry in args[i + 1].split(","))
+        return None
+
+
+    @staticmethod
+    def __to_json(value):
+        #Variables often come from numpy arrays (e.g. make_param_combos)
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        raise TypeError(f"Cannot store {type(value)} in resource log")
@@ -0,0 +1,207 @@
+import os
+import re
+import sys
+import sysconfig
+import types
+import pickle
+import hashlib
+import functools
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from .FileIO.CompressedFile import resolve_path
+
+#Functions and classes defined under these paths are identified by name (see ResultCollector)
+LIBRARY_PATHS = tuple({sysconfig.get_paths()[key] for key in ["stdlib", "platstdlib", "purelib", "platlib"]})
+
+
+def _parse_and_reduce(path, parser, reducer) -> dict:
+    '''
+    Runs in a worker process. Parses one seed's file and reduces it to a dictionary of
+        results. A scalar returned by `reducer` is stored under "value".
+    '''
+    result = reducer(parser.parse(path))
+    if not isinstance(result, dict):
+        result = {"value" : result}
+    return result
+
+
+class ResultCollector:
+    '''
+    Collects one output file from every seed of every job of a project, parses and
+        reduces each in a pool of worker processes and joins the results with each job's
+        variables into a DataFrame.
+
+    Reduced results are saved in the "collected" folder of the project, together with
+        the size and modification time of the file they came from. Later collections
+        with the same key only parse seeds whose file is new or has changed.
+    '''
+
+    DIRNAME = "collected"
+
+    def __init__(self, project, filename : str, parser, reducer, cache_key : str = None):
+        '''
+        Project: LocalProject to collect results from.
+        Filename: Name of the file inside every seed folder, e.g. "log.lammps".
+        Parser: Parsing strategy with a parse(path) -> dict method, e.g. FixPrintParser.
+        Reducer: Function taking the parsed dictionary and returning a dictionary of
+            scalars (one column each) or a single scalar (column "value").
+        Cache Key: Name the results are saved under. Defaults to a combination of the
+            file name, parser (and its settings), reducer name and a hash of the reducer's
+            code, constants, closure values and arguments, so two lambdas or partials do not
+            share results. Reducers that cannot be described exactly need an explicit key.
+        '''
+        self.project = project
+        self.filename = filename
+        self.parser = parser
+        self.reducer = reducer
+
+        if cache_key is None:
+            #Parser settings (e.g. ThermoLogParser(all_segments = True)) change the results too
+            settings = "_".join(f"{k}-{v}" for k, v in sorted(vars(parser).items()))
+            reducer_name = getattr(reducer, '__name__', type(reducer).__name__)
+            cache_key = f"{filename}_{type(parser).__name__}{'_' + settings if settings else ''}_{reducer_name}_{self.__code_hash(reducer)}"
+        self.cache_key = re.sub(r"[^A-Za-z0-9_.-]", "_", cache_key)
+        self.cache_path = os.path.join(project.outpath, self.DIRNAME, f"{self.cache_key}.pkl")
+
+
+    @staticmethod
+    def __library_name(value) -> str:
+        '''
+        "module.name version" of a function or class that comes from the standard library
+            or an installed package (e.g. np.mean), None for anything defined elsewhere.
+        '''
+        module = sys.modules.get(getattr(value, "__module__", None) or "")
+        if module is None or module.__name__ == "__main__" or not hasattr(value, "__qualname__"):
+            return None
+        path = getattr(module, "__file__", None)
+        if path is not None and not path.startswith(LIBRARY_PATHS):
+            return None
+        package = sys.modules.get(module.__name__.split(".")[0])
+        return f"{module.__name__}.{value.__qualname__} {getattr(package, '__version__', '')}"
+
+
+    @staticmethod
+    def __code_hash(reducer) -> str:
+        '''
+        Short hash of what `reducer` computes: the byte code, constants, default arguments,
+            closure values and referenced globals of a function (nested functions included),
+            the function and arguments of a functools.partial, or the type and attributes of
+            any other callable. Library functions are described by name and version, arrays
+            by their contents. Raises a RuntimeError for anything that cannot be described
+            exactly, pass a cache_key then.
+        '''
+        stack = set()
+        def names(code) -> set:
+            found = set(code.co_names)
+            for const in code.co_consts:
+                if isinstance(const, types.CodeType):
+                    found |= names(const)
+            return found
+
+        def describe(value) -> str:
+            if isinstance(value, (type(None), bool, int, float, complex, str, bytes)):
+                return repr(value)
+            if isinstance(value, types.ModuleType):
+                return f"module {value.__name__}"
+            if isinstance(value, np.ndarray):
+                return repr((value.dtype.str, value.shape, hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest()))
+            if isinstance(value, np.generic):
+                return repr((value.dtype.str, value.item()))
+            if (callable(value) and not isinstance(value, (types.MethodType, types.BuiltinMethodType))) or \
+                    (isinstance(value, types.BuiltinMethodType) and isinstance(value.__self__, (types.ModuleType, type(None)))):
+                name = ResultCollector.__library_name(value)
+                if name is not None:
+                    return name
+
+            #Recursive functions and objects refer back to themselves
+            if id(value) in stack:
+                return "..."
+            stack.add(id(value))
+            try:
+                if isinstance(value, (tuple, list)):
+                    return repr((type(value).__name__, tuple(describe(v) for v in value)))
+                if isinstance(value, (set, frozenset)):
+                    return repr((type(value).__name__, sorted(describe(v) for v in value)))
+                if isinstance(value, dict):
+                    return repr(sorted((describe(k), describe(v)) for k, v in value.items()))
+                if isinstance(value, types.CodeType):
+                    return repr((value.co_code, tuple(describe(c) for c in value.co_consts), value.co_names))
+                if isinstance(value, types.FunctionType):
+                    closure = tuple(describe(cell.cell_contents) for cell in value.__closure__ or ())
+                    defaults = (describe(value.__defaults__ or ()), describe(value.__kwdefaults__ or {}))
+                    referenced = tuple((name, describe(value.__globals__[name]))
+                                       for name in sorted(names(value.__code__)) if name in value.__globals__)
+                    return repr((describe(value.__code__), closure, defaults, referenced))
+                if isinstance(value, functools.partial):
+                    return repr(("partial", describe(value.func), describe(value.args), describe(value.keywords)))
+                if isinstance(value, types.MethodType):
+                    return repr((describe(value.__func__), describe(value.__self__)))
+                if isinstance(value, types.BuiltinMethodType) and not isinstance(value.__self__, types.ModuleType):
+                    #Bound to an object, e.g. [1, 2].count
+                    return repr((value.__qualname__, describe(value.__self__)))
+                if isinstance(value, type):
+                    methods = sorted((k, describe(v)) for k, v in vars(value).items() if isinstance(v, types.FunctionType))
+                    return repr((value.__module__, value.__qualname__, methods))
+                if hasattr(value, "__dict__"):
+                    return repr((describe(type(value)), sorted((k, describe(v)) for k, v in vars(value).items())))
+                raise RuntimeError(f"Cannot derive a cache key from {type(value).__name__} {value!r:.50}, pass a cache_key")
+            finally:
+                stack.discard(id(value))
+        return hashlib.sha1(describe(reducer).encode()).hexdigest()[:10]
+
+
+    def __load_cache(self) -> dict:
+        if os.path.isfile(self.cache_path):
+            with open(self.cache_path, 'rb') as f:
+                return pickle.load(f)
+        return {}
+
+
+    def __save_cache(self, cache : dict) -> None:
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok = True)
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+
+    def collect(self, n_jobs : int = -1) -> pd.DataFrame:
+        '''
+        Returns a DataFrame indexed by (job, seed) with every job's variables and the
+            reduced results as columns. Seeds whose file does not exist are left out.
+        '''
+        cache = self.__load_cache()
+
+        #(job name, seed) -> (path, stat signature) for every seed with the file present
+        seeds = {}
+        for job in self.project.jobs.values():
+            for seed in range(job.n_seeds):
+                path = resolve_path(os.path.join(job.seed_path(seed), self.filename))
+                if os.path.isfile(path):
+                    stat = os.stat(path)
+                    seeds[(job.name, seed)] = (path, (stat.st_size, stat.st_mtime_ns))
+
+        stale = [key for key, (_, signature) in seeds.items()
+                 if key not in cache or cache[key]["signature"] != signature]
+
+        if len(stale) > 0:
+            print(f"Parsing {self.filename} from {len(stale)} seeds ({len(seeds) - len(stale)} already collected)")
+            if n_jobs == 1 or len(stale) == 1:
+                results = [_parse_and_reduce(seeds[key][0], self.parser, self.reducer) for key in stale]
+            else:
+                results = Parallel(n_jobs = n_jobs)(
+                    delayed(_parse_and_reduce)(seeds[key][0], self.parser, self.reducer) for key in stale)
+            for key, result in zip(stale, results):
+                cache[key] = {"signature" : seeds[key][1], "result" : result}
+            self.__save_cache(cache)
+
+        rows = []
+        index = []
+        for (name, seed) in sorted(seeds):
+            row = dict(self.project.jobs[name].variables or {})
+            row.update(cache[(name, seed)]["result"])
+            rows.append(row)
+            index.append((name, seed))
+
+        return pd.DataFrame(rows, index = pd.MultiIndex.from_tuples(index, names = ["job", "seed"]))
@@ -0,0 +1,80 @@
+import os
+import json
+import numpy as np
+
+
+class RuntimeEstimator:
+    '''
+    Estimates how long a job will take from the timings of previously run jobs with
+        similar variables. Timings are kept as core-seconds (wall time * MPI ranks) so a
+        timing measured at one rank count can be used to estimate another, assuming
+        ideal scaling.
+    '''
+
+    def __init__(self, path : str = None, n_neighbours : int = 3):
+        '''
+        Path: JSON file the timing history is loaded from and saved to. None keeps the
+            history in memory only.
+        N Neighbours: Number of most similar past jobs averaged for an estimate.
+        History: List of {"variables", "n_ranks", "wall_time"} records.
+        '''
+        self.path = path
+        self.n_neighbours = n_neighbours
+        self.history = []
+
+        if path is not None and os.path.isfile(path):
+            with open(path, "r") as f:
+                self.history = json.load(f)
+
+
+    def record(self, variables : dict, n_ranks : int, wall_time : float) -> None:
+        variables = {k : (float(v) if self.__is_number(v) else v) for k, v in (variables or {}).items()}
+        self.history.append({"variables" : variables, "n_ranks" : n_ranks, "wall_time" : wall_time})
+
+
+    def save(self) -> None:
+        if self.path is not None:
+            with open(self.path, "w") as f:
+                json.dump(self.history, f)
+
+
+    def estimate(self, variables : dict, n_ranks : int, n_atoms : int = None) -> float:
+        '''
+        Estimated wall time in seconds of a job with `variables` run on `n_ranks` ranks.
+            Uses an inverse-distance weighted average over the `n_neighbours` past jobs
+            closest in (range normalised) variable space.
+
+        Without any history there is nothing to calibrate against and the relative cost
+            n_atoms / n_ranks is returned instead (1 if n_atoms is unknown). This is only
+            meaningful for ordering jobs against each other.
+        '''
+        if len(self.history) == 0:
+            return n_atoms / n_ranks if n_atoms is not None else 1.0
+
+        variables = variables or {}
+        keys = [k for k in variables if all(self.__is_number(h["variables"].get(k)) for h in self.history)
+                and self.__is_number(variables[k])]
+
+        core_seconds = np.array([h["wall_time"]*h["n_ranks"] for h in self.history])
+        if len(keys) == 0:
+            return float(np.mean(core_seconds)) / n_ranks
+
+        past = np.array([[h["variables"][k] for k in keys] for h in self.history], dtype = float)
+        target = np.array([variables[k] for k in keys], dtype = float)
+
+        scale = np.ptp(past, axis = 0)
+        scale[scale == 0] = 1.0
+        dist = np.sqrt((((past - target)/scale)**2).sum(axis = 1))
+
+        exact = dist == 0
+        if np.any(exact):
+            return float(np.mean(core_seconds[exact])) / n_ranks
+
+        nearest = np.argsort(dist)[:self.n_neighbours]
+        weights = 1.0 / dist[nearest]
+        return float(np.sum(weights*core_seconds[nearest]) / np.sum(weights)) / n_ranks
+
+
+    @staticmethod
+    def __is_number(value) -> bool:
+        return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool)
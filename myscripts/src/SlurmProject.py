@@ -0,0 +1,350 @@
+import os
+import json
+import shlex
+import subprocess
+import time
+from rich import print
+
+from .LAMMPS_Job import Job
+from .LAMMPS_Project import LocalProject
+from .AsyncRunner import RunResult
+from .ProjectManifest import ProjectManifest
+
+
+class SlurmProject(LocalProject):
+    '''
+    - Project whose seeds are run as SLURM job arrays instead of on the local machine.
+    - Jobs, the manifest, resume, collect() and the resource log work as for LocalProject.
+
+    All unfinished seeds are submitted at once, one array per MPI rank count (SLURM gives
+        every task of an array the same allocation). Each array task runs one seed and
+        writes slurm_task.json (exit code, host, start and end time) into its seed folder.
+        poll() reads these files, falls back to sacct for tasks that vanished without
+        writing one (e.g. walltime or out of memory kills), and updates the manifest.
+
+    Submitted arrays are recorded in slurm/arrays.json in the project folder, so a
+        project reopened with resume = True keeps polling them instead of submitting
+        their seeds again. The sbatch, squeue and sacct commands can be replaced, e.g. by
+        stand-ins that run the tasks on the local machine (see benchmarks/stub_slurm.py).
+    '''
+
+    DIRNAME = "slurm"
+    STATE_NAME = "arrays.json"
+    TASK_FILE = "slurm_task.json"
+
+    #sacct states of tasks that will not run (any more)
+    FAILED_STATES = ("FAILED", "CANCELLED", "TIMEOUT", "OUT_OF_MEMORY", "NODE_FAIL", "PREEMPTED", "BOOT_FAIL", "DEADLINE")
+
+    def __init__(self, name : str, infile_path : str, basepath: str, only_make_plots: bool = False,
+                 resume : bool = False, sbatch : str = "sbatch", squeue : str = "squeue", sacct : str = "sacct",
+                 launcher : str = "srun", max_array_size : int = 1000, lost_grace : float = 300.0):
+        '''
+        Sbatch / Squeue / Sacct: Commands used to submit and query jobs.
+        Launcher: Command array tasks start LAMMPS with, called as "<launcher> -n <ranks> <lmp> ...".
+        Max Array Size: Largest array submitted, larger sets of seeds are split (see
+            MaxArraySize in slurm.conf).
+        Lost Grace: Seconds a task that left the queue without a slurm_task.json is waited
+            for (e.g. the file is held up by NFS) before sacct's state, or failure if sacct
+            knows nothing, is taken as final. Tasks sacct reports as failed are final at once.
+        '''
+        super().__init__(name, infile_path, basepath, only_make_plots, resume)
+        self.sbatch = sbatch
+        self.squeue = squeue
+        self.sacct = sacct
+        self.launcher = launcher
+        self.max_array_size = max_array_size
+        self.lost_grace = lost_grace
+
+        '''
+        Slurm Path: Folder holding the batch scripts, task lists and task output.
+        Arrays: Dictionary of array job ID to {"n_ranks", "tasks"}, where "tasks" lists
+            the [job name, seed] of every array index. "finished" and "lost_since" (when a
+            task was first found missing from the queue) are added by poll(). Arrays are
+            removed once all of their tasks have been accounted for.
+        '''
+        self.slurm_path = os.path.join(self.outpath, self.DIRNAME)
+        self.arrays = {}
+        state_path = os.path.join(self.slurm_path, self.STATE_NAME)
+        if os.path.isfile(state_path):
+            with open(state_path, "r") as f:
+                self.arrays = json.load(f)
+
+
+    def __save_state(self) -> None:
+        os.makedirs(self.slurm_path, exist_ok = True)
+        state_path = os.path.join(self.slurm_path, self.STATE_NAME)
+        with open(state_path + ".tmp", "w") as f:
+            json.dump(self.arrays, f, indent = 1)
+        os.replace(state_path + ".tmp", state_path)
+
+
+    def submit(self, n_mpi_domains : int, lammps_env_var = "lmp", max_concurrent : int = None,
+               sbatch_args : list = None) -> list:
+        '''
+        Submits every seed that has not finished and is not already part of a submitted
+            array. Returns the IDs of the new arrays.
+
+        N MPI Domains: MPI ranks for jobs that did not set their own in new_job().
+        Lammps Env Var: LAMMPS binary on the compute nodes.
+        Max Concurrent: At most this many tasks of each array run at once ("%N" throttle).
+        Sbatch Args: Extra sbatch options, e.g. ["--partition=normal", "--time=02:00:00"].
+        '''
+        if self.only_make_plots:
+            raise RuntimeError("Flag only_make_plots is set to True")
+        submitted = {tuple(task) for array in self.arrays.values() for task in array["tasks"]}
+        seeds = [job for job in self.get_all_jobs() if (job.name, job.seed_id) not in submitted]
+        if len(seeds) == 0:
+            print("No seeds to submit.")
+            return []
+
+        #Every task of an array gets the same allocation, so one array per rank count
+        widths = {}
+        for job in seeds:
+            widths.setdefault(job.n_mpi_domains if job.n_mpi_domains is not None else n_mpi_domains, []).append(job)
+
+        array_ids = []
+        for n_ranks, jobs in sorted(widths.items()):
+            for i in range(0, len(jobs), self.max_array_size):
+                array_ids.append(self.__submit_array(jobs[i : i + self.max_array_size], n_ranks, lammps_env_var,
+                                                     max_concurrent, sbatch_args or []))
+        return array_ids
+
+
+    def __submit_array(self, jobs : list, n_ranks : int, lammps_env_var, max_concurrent : int, sbatch_args : list) -> str:
+        os.makedirs(self.slurm_path, exist_ok = True)
+        n_scripts = sum(name.endswith(".sh") for name in os.listdir(self.slurm_path))
+        label = f"array{n_scripts}_np{n_ranks}"
+        tasks_path = os.path.join(self.slurm_path, f"{label}.tasks")
+        script_path = os.path.join(self.slurm_path, f"{label}.sh")
+
+        for job in jobs:
+            job.prepare_seed(job.seed_id)
+            #A stale status file would be mistaken for the result of this submission
+            task_file = os.path.join(job.seed_path(job.seed_id), self.TASK_FILE)
+            if os.path.isfile(task_file):
+                os.remove(task_file)
+        with open(tasks_path, "w") as f:
+            f.write("".join(f"{os.path.abspath(job.seed_path(job.seed_id))}\t{job.in_file_name}\n" for job in jobs))
+
+        array = f"0-{len(jobs) - 1}" + (f"%{max_concurrent}" if max_concurrent is not None else "")
+        with open(script_path, "w") as f:
+            f.write("#!/bin/bash\n"
+                    f"#SBATCH --job-name={self.name}_{label}\n"
+                    f"#SBATCH --array={array}\n"
+                    f"#SBATCH --ntasks={n_ranks}\n"
+                    f"#SBATCH --output={os.path.abspath(self.slurm_path)}/%A_%a.out\n"
+                    + "".join(f"#SBATCH {arg}\n" for arg in sbatch_args) +
+                    "\n"
+                    f"IFS=$'\\t' read -r seed_dir in_file <<< \"$(sed -n \"$((SLURM_ARRAY_TASK_ID + 1))p\" {shlex.quote(os.path.abspath(tasks_path))})\"\n"
+                    "cd \"$seed_dir\" || exit 1\n"
+                    "start_time=$(date +%s.%N)\n"
+                    f"{self.launcher} -n {n_ranks} {lammps_env_var} -in \"$in_file\" -screen none\n"
+                    "exit_code=$?\n"
+                    "end_time=$(date +%s.%N)\n"
+                    "printf '{\"exit_code\" : %d, \"host\" : \"%s\", \"start_time\" : %s, \"end_time\" : %s}\\n' "
+                    f"\"$exit_code\" \"$(hostname)\" \"$start_time\" \"$end_time\" > {self.TASK_FILE}.tmp\n"
+                    f"mv {self.TASK_FILE}.tmp {self.TASK_FILE}\n"
+                    "exit $exit_code\n")
+
+        proc = subprocess.run(shlex.split(self.sbatch) + ["--parsable", script_path], capture_output = True, text = True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"sbatch failed with code {proc.returncode}: {proc.stderr.strip()}")
+        #--parsable prints "jobid" or "jobid;cluster"
+        array_id = proc.stdout.strip().split(";")[0]
+
+        self.arrays[array_id] = {"n_ranks" : n_ranks, "tasks" : [[job.name, job.seed_id] for job in jobs]}
+        self.__save_state()
+        for job in jobs:
+            self.manifest.set_seed_status(job.name, job.seed_id, ProjectManifest.RUNNING)
+        self.manifest.commit()
+        print(f"[blue] Submitted [/blue]: array {array_id} with {len(jobs)} seeds on {n_ranks} ranks each")
+        return array_id
+
+
+    def poll(self) -> dict:
+        '''
+        Updates the manifest and resource log with every array task that finished since
+            the last poll. Returns the number of seeds "queued" (pending or running in
+            SLURM), "done" and "failed" in this poll.
+        '''
+        counts = {"queued" : 0, "done" : 0, "failed" : 0}
+        if len(self.arrays) == 0:
+            return counts
+
+        #Ask squeue first, a task that leaves the queue after this writes its file before we read it
+        queued = self.__queued_tasks()
+        now = time.time()
+        for array_id in list(self.arrays):
+            array = self.arrays[array_id]
+            lost = []
+            for index, (name, seed) in enumerate(array["tasks"]):
+                if array.get("finished", {}).get(str(index)):
+                    continue
+                job = self.__seed_job(name, seed)
+                task_file = os.path.join(job.seed_path(seed), self.TASK_FILE)
+                if os.path.isfile(task_file):
+                    with open(task_file, "r") as f:
+                        task = json.load(f)
+                    self.__finish(array_id, index, job, n_ranks = array["n_ranks"], **task)
+                    counts["done" if task["exit_code"] == 0 else "failed"] += 1
+                elif queued[array_id] is None:
+                    #squeue did not answer (e.g. slurmctld timeout), nothing can be concluded
+                    counts["queued"] += 1
+                elif index in queued[array_id] or None in queued[array_id]:
+                    array.get("lost_since", {}).pop(str(index), None)
+                    counts["queued"] += 1
+                else:
+                    lost.append((index, job))
+
+            if len(lost) > 0:
+                states = self.__sacct_states(array_id)
+                lost_since = array.setdefault("lost_since", {})
+                for index, job in lost:
+                    state, exit_code = states.get(index, ("UNKNOWN", None))
+                    waited = now - lost_since.setdefault(str(index), now)
+                    if not state.startswith(self.FAILED_STATES) and waited < self.lost_grace:
+                        #Finished but the file has not shown up yet (e.g. NFS lag), check again next poll
+                        counts["queued"] += 1
+                        continue
+                    if state == "COMPLETED" and exit_code == 0:
+                        #No timings to record without the file, only the outcome
+                        print(f"{job.name} seed {job.seed_id} completed but its {self.TASK_FILE} never appeared, no timings recorded.")
+                        self.manifest.set_seed_status(job.name, job.seed_id, ProjectManifest.DONE, 0)
+                        array.setdefault("finished", {})[str(index)] = True
+                        counts["done"] += 1
+                        continue
+                    print(f"{job.name} seed {job.seed_id} left the queue as {state} without reporting an exit code.")
+                    self.__finish(array_id, index, job, exit_code if exit_code not in (None, 0) else -1,
+                                  None, now, now, array["n_ranks"])
+                    counts["failed"] += 1
+
+            if len(array.get("finished", {})) == len(array["tasks"]):
+                del self.arrays[array_id]
+
+        self.__save_state()
+        self.manifest.commit()
+        return counts
+
+
+    def wait(self, poll_interval : float = 30.0) -> None:
+        '''
+        Polls until every submitted seed has finished.
+        '''
+        while True:
+            counts = self.poll()
+            if counts["queued"] == 0:
+                break
+            time.sleep(poll_interval)
+        self.manifest.save()
+        summary = self.manifest.summary()
+        print(f"[bold green]JOBS COMPLETE[/bold green] {summary[ProjectManifest.DONE]} seeds done, "
+              f"{summary[ProjectManifest.FAILED]} failed.")
+
+
+    def run_all_jobs_slurm(self, n_mpi_domains : int, lammps_env_var = "lmp", max_concurrent : int = None,
+                           sbatch_args : list = None, poll_interval : float = 30.0) -> None:
+        '''
+        Submits every unfinished seed (see submit()) and waits for all of them.
+        '''
+        self.submit(n_mpi_domains, lammps_env_var, max_concurrent, sbatch_args)
+        self.wait(poll_interval)
+
+
+    def __seed_job(self, name : str, seed : int):
+        job = self.jobs[name]
+        return Job(self, job.name, 1, job.seed_variables, job.variables, False, seed, job.n_mpi_domains)
+
+
+    def __finish(self, array_id : str, index : int, job, exit_code : int, host : str, start_time : float,
+                 end_time : float, n_ranks : int) -> None:
+        output_path = os.path.join(self.slurm_path, f"{array_id}_{index}.out")
+        output = ""
+        if os.path.isfile(output_path):
+            with open(output_path, "r", errors = "replace") as f:
+                output = f.read()[-4096:]
+
+        result = RunResult([self.launcher], job.seed_path(job.seed_id), exit_code, output, start_time, end_time, host = host)
+        self.resources.record(job, result, n_ranks)
+        if exit_code == 0:
+            print(f"{job.name} seed {job.seed_id} [green] completed [/green] successfully in {result.wall_time:.1f} seconds.")
+            self.manifest.set_seed_status(job.name, job.seed_id, ProjectManifest.DONE, exit_code)
+        else:
+            print(f"{job.name} failed. Exited with code {exit_code} on seed {job.seed_id}.")
+            if output:
+                print(result.stderr_tail())
+            self.manifest.set_seed_status(job.name, job.seed_id, ProjectManifest.FAILED, exit_code)
+        self.arrays[array_id].setdefault("finished", {})[str(index)] = True
+
+
+    def __queued_tasks(self) -> dict:
+        '''
+        Array ID to the indices of its tasks squeue lists as pending or running. A pending
+            array whose tasks have not been split yet contains None. An array squeue could
+            not be asked about (e.g. a slurmctld timeout) maps to None instead of a set.
+        '''
+        queued = self.__squeue(list(self.arrays))
+        if queued is None:
+            #squeue refuses every ID once one has left the queue, ask for each array on its own
+            queued = {}
+            for array_id in self.arrays:
+                queued.update(self.__squeue([array_id]) or {array_id : None})
+            if all(tasks is None for tasks in queued.values()):
+                print("[yellow]WARNING[/yellow] squeue failed, keeping every task queued until the next poll")
+        return queued
+
+
+    def __squeue(self, array_ids : list) -> dict:
+        '''
+        squeue's answer for `array_ids` as array ID to the set of queued indices, None if
+            squeue failed. An ID squeue no longer knows (it left the queue) has no tasks queued.
+        '''
+        proc = subprocess.run(shlex.split(self.squeue) + ["-h", "-r", "-j", ",".join(array_ids), "-o", "%i %T"],
+                              capture_output = True, text = True)
+        if proc.returncode != 0:
+            if len(array_ids) == 1 and "Invalid job id" in proc.stderr:
+                return {array_ids[0] : set()}
+            return None
+        queued = {array_id : set() for array_id in array_ids}
+        for array_id, index in self.__parse_squeue(proc.stdout):
+            queued.setdefault(array_id, set()).add(index)
+        return queued
+
+
+    @staticmethod
+    def __parse_squeue(output : str) -> set:
+        queued = set()
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            task_id = line.split()[0]
+            array_id, _, index = task_id.partition("_")
+            if index.isdigit():
+                queued.add((array_id, int(index)))
+            else:
+                #e.g. "1234_[5-9%2]", tasks that have not started yet
+                queued.add((array_id, None))
+        return queued
+
+
+    def __sacct_states(self, array_id : str) -> dict:
+        '''
+        Array index to (state, exit code) from sacct. Empty if sacct is not available.
+        '''
+        cmd = shlex.split(self.sacct) + ["-n", "-P", "-X", "-j", array_id, "-o", "JobID,State,ExitCode"]
+        try:
+            proc = subprocess.run(cmd, capture_output = True, text = True)
+        except FileNotFoundError:
+            return {}
+        if proc.returncode != 0:
+            return {}
+
+        states = {}
+        for line in proc.stdout.splitlines():
+            fields = line.split("|")
+            if len(fields) < 3:
+                continue
+            _, _, index = fields[0].partition("_")
+            if index.isdigit():
+                #ExitCode is "code:signal"
+                states[int(index)] = (fields[1].split()[0], int(fields[2].split(":")[0]))
+        return states
@@ -1,3 +1,14 @@
 from .FileIO import *
-from .LAMMPS_Project import LAMMPS_Project
-from .LAMMPS_Job import LAMMPS_Job
\ No newline at end of file
+from .LAMMPS_Project import LocalProject
+from .LAMMPS_Job import Job
+from .AsyncRunner import AsyncRunner
+from .JobScheduler import JobScheduler
+from .RuntimeEstimator import RuntimeEstimator
+from .ProjectManifest import ProjectManifest
+from .ProgressDashboard import ProgressDashboard
+from .ResultCollector import ResultCollector
+from .PartitionBundle import PartitionBundle
+from .ResourceLog import ResourceLog
+from .AdaptiveSeeds import AdaptiveSeeds
+from .SlurmProject import SlurmProject
+from .HostPool import HostPool
\ No newline at end of file
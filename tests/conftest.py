@@ -0,0 +1,17 @@
+import os
+import sys
+import pytest
+
+#The stubs and synthetic data writers live in benchmarks/, which is not a package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+
+@pytest.fixture
+def stubs():
+    '''
+    Commands running the stand-ins for lmp, mpirun and sbatch / squeue / sacct.
+    '''
+    bench = os.path.join(ROOT, "benchmarks")
+    return {name : f"{sys.executable} {os.path.join(bench, f'stub_{name}.py')}" for name in ["lmp", "mpirun", "slurm"]}
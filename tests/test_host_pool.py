@@ -0,0 +1,42 @@
+import synthetic
+from myscripts.src import LocalProject
+from myscripts.src.HostPool import HostPool
+from myscripts.src.ProjectManifest import ProjectManifest
+
+
+def test_pinning_uses_core_ids():
+    pool = HostPool({"a" : 4, "b" : 4}, cores = {"a" : [8, 9, 12, 13]})
+    first, second = pool.allocate(2), pool.allocate(2)
+    assert pool.launcher_args(first, True) == "--host a:2 --cpu-set 8,9 --bind-to core"
+    assert pool.launcher_args(second, True) == "--host a:2 --cpu-set 12,13 --bind-to core"
+    #No core IDs known for b, ranks are not pinned to made up ones
+    assert pool.launcher_args(pool.allocate(3), True) == "--host b:3 --bind-to core"
+
+
+def test_from_slurm_local_cores(monkeypatch):
+    monkeypatch.setenv("SLURMD_NODENAME", "node02")
+    monkeypatch.setattr("os.sched_getaffinity", lambda pid: {5, 6, 7, 40}, raising = False)
+    pool = HostPool.from_slurm("node[01-02]", "4(x2)")
+    assert pool.cores == {"node02" : [5, 6, 7, 40]}
+    assert pool.launcher_args(pool.allocate(4), True) == "--host node01:4 --bind-to core"
+    assert pool.launcher_args(pool.allocate(4), True) == "--host node02:4 --cpu-set 5,6,7,40 --bind-to core"
+
+
+def test_dispatch_over_hosts(tmp_path, stubs, monkeypatch):
+    log = tmp_path / "mpirun.log"
+    monkeypatch.setenv("STUB_MPIRUN_LOG", str(log))
+    synthetic.write_in_file(str(tmp_path / "in.test"), sleep_time = 0.2)
+    project = LocalProject("p", str(tmp_path / "in.test"), str(tmp_path))
+    project.new_jobs([{"name" : f"j{i}", "n_seeds" : 1, "seed_variables" : ["velocity_seed"], "changed_vars" : {"T" : i},
+                       "n_mpi_domains" : n} for i, n in enumerate([4, 3, 2, 2, 1])], lazy = True)
+    project.run_all_jobs_mpi(None, 1, stubs["lmp"], mpi_launcher = stubs["mpirun"], hosts = HostPool({"n1" : 4, "n2" : 4}))
+
+    calls = [line.split() for line in log.read_text().splitlines()]
+    assert len(calls) == 5
+    for args in calls:
+        #Every launch got as many slots as it has ranks, and all of them on one host
+        hosts = args[args.index("--host") + 1].split(",")
+        assert len(hosts) == 1
+        host, n = hosts[0].split(":")
+        assert host in ["n1", "n2"] and int(n) == int(args[args.index("-np") + 1])
+    assert ProjectManifest(project.outpath).summary()[ProjectManifest.DONE] == 5
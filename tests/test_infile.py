@@ -0,0 +1,19 @@
+from myscripts.src.FileIO.InFile import InFile
+
+
+def test_render_keeps_comments(tmp_path):
+    path = tmp_path / "in.test"
+    path.write_text("variable T equal 300   # temperature in K\n"
+                    "variable dt equal 0.002\n"
+                    "variable seeds index 1 2 3 #seeds\n"
+                    "run 10 # steps\n")
+    in_file = InFile(str(path))
+    assert in_file.render({"T" : 400, "dt" : 0.001, "seeds" : [4, 5]}) == \
+        ("variable T equal 400   # temperature in K\n"
+         "variable dt equal 0.001\n"
+         "variable seeds index 4 5 #seeds\n"
+         "run 10 # steps\n")
+
+    in_file.edit_variables({"T" : 500})
+    assert path.read_text().startswith("variable T equal 500   # temperature in K\n")
+    assert in_file.free_variables["T"] == 500.0
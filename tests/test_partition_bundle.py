@@ -0,0 +1,23 @@
+import os
+
+import synthetic
+from myscripts.src import LocalProject
+from myscripts.src.ProjectManifest import ProjectManifest
+
+
+def test_bundled_seeds_finish(tmp_path, stubs):
+    synthetic.write_in_file(str(tmp_path / "in.test"), sleep_time = 0.1)
+    project = LocalProject("p", str(tmp_path / "in.test"), str(tmp_path))
+    project.new_jobs([{"name" : f"T{T}", "n_seeds" : 3, "seed_variables" : ["velocity_seed"], "changed_vars" : {"T" : T}}
+                      for T in [100, 200]], lazy = True)
+    project.run_all_jobs_mpi(4, 1, stubs["lmp"], mpi_launcher = stubs["mpirun"], seeds_per_launch = 3)
+
+    #Both jobs' seeds ran as partitions of shared launches and were each recorded
+    assert len(os.listdir(os.path.join(project.outpath, "partitions"))) == 2
+    manifest = ProjectManifest(project.outpath)
+    for name in ["T100", "T200"]:
+        for seed in range(3):
+            assert manifest.seed_status(name, seed) == ProjectManifest.DONE
+            assert os.path.isfile(os.path.join(project.jobs[name].seed_path(seed), "log.lammps"))
+    assert len(project.resources.records) == 6
+    assert len(project.resources.records) == len({(r["job"], r["seed"]) for r in project.resources.records})
@@ -0,0 +1,43 @@
+import functools
+import types
+import numpy as np
+import pytest
+
+from myscripts.src.ResultCollector import ResultCollector
+from myscripts.src.FileIO.ParsingStrategies import ThermoLogParser
+
+
+class Slotted:
+    __slots__ = ()
+    def __call__(self, data):
+        return 0
+
+
+def key(reducer, tmp_path) -> str:
+    project = types.SimpleNamespace(outpath = str(tmp_path))
+    return ResultCollector(project, "log.lammps", ThermoLogParser(), reducer).cache_key
+
+
+def test_partial_arguments(tmp_path):
+    assert key(functools.partial(np.mean, axis = 0), tmp_path) != key(functools.partial(np.mean, axis = 1), tmp_path)
+    assert key(functools.partial(np.mean, axis = 0), tmp_path) == key(functools.partial(np.mean, axis = 0), tmp_path)
+
+
+def test_array_constants(tmp_path):
+    a = np.zeros(10_000)
+    b = a.copy()
+    b[5000] = 1
+    assert key(lambda d: d["x"] @ a, tmp_path) != key(lambda d: d["x"] @ b, tmp_path)
+
+
+def test_lambdas(tmp_path):
+    assert key(lambda d: 1.0, tmp_path) != key(lambda d: 2.0, tmp_path)
+    assert key(lambda d: np.mean(d["x"]), tmp_path) == key(lambda d: np.mean(d["x"]), tmp_path)
+    assert key(lambda d: np.mean(d["x"]), tmp_path) != key(lambda d: np.max(d["x"]), tmp_path)
+
+
+def test_undescribable_reducer(tmp_path):
+    with pytest.raises(RuntimeError):
+        key(Slotted(), tmp_path)
+    project = types.SimpleNamespace(outpath = str(tmp_path))
+    assert ResultCollector(project, "log.lammps", ThermoLogParser(), Slotted(), cache_key = "slotted").cache_key == "slotted"
@@ -0,0 +1,82 @@
+import json
+import os
+import sys
+
+import synthetic
+from myscripts.src import SlurmProject
+from myscripts.src.ProjectManifest import ProjectManifest
+
+
+def make_project(tmp_path, stubs, monkeypatch, **kwargs) -> SlurmProject:
+    monkeypatch.setenv("STUB_SLURM_DIR", str(tmp_path / "slurm_state"))
+    synthetic.write_in_file(str(tmp_path / "in.test"), sleep_time = 0.2)
+    slurm = stubs["slurm"]
+    options = dict(sbatch = f"{slurm} sbatch", squeue = f"{slurm} squeue", sacct = f"{slurm} sacct", launcher = stubs["mpirun"])
+    options.update(kwargs)
+    project = SlurmProject("p", str(tmp_path / "in.test"), str(tmp_path), **options)
+    project.new_jobs([{"name" : f"T{T}", "n_seeds" : 2, "seed_variables" : ["velocity_seed"], "changed_vars" : {"T" : T}}
+                      for T in [100, 200]], lazy = True)
+    return project
+
+
+def fake_array(tmp_path, project, array_id, state) -> None:
+    #An array whose only task left the queue without writing its slurm_task.json
+    with open(tmp_path / "slurm_state" / f"{array_id}.json", "w") as f:
+        json.dump({"0" : {"state" : state, "exit_code" : 0}}, f)
+    project.new_job(f"lost{array_id}", 1, ["velocity_seed"], {"T" : array_id})
+    project.arrays[str(array_id)] = {"n_ranks" : 1, "tasks" : [[f"lost{array_id}", 0]]}
+
+
+def test_array_completes(tmp_path, stubs, monkeypatch):
+    project = make_project(tmp_path, stubs, monkeypatch)
+    project.submit(1, stubs["lmp"], max_concurrent = 2)
+    project.wait(0.2)
+
+    assert project.arrays == {}
+    manifest = ProjectManifest(project.outpath)
+    assert manifest.summary()[ProjectManifest.DONE] == 4
+    assert len(project.resources.records) == 4
+
+
+def test_failed_squeue_keeps_tasks_queued(tmp_path, stubs, monkeypatch):
+    #squeue times out on its first two calls
+    counter = tmp_path / "squeue_calls"
+    wrapper = tmp_path / "squeue.py"
+    wrapper.write_text("import os, sys\n"
+                       f"path = {str(counter)!r}\n"
+                       "n = int(open(path).read()) if os.path.isfile(path) else 0\n"
+                       "open(path, 'w').write(str(n + 1))\n"
+                       "if n < 2:\n"
+                       "    sys.exit('slurm_load_jobs error: Socket timed out')\n"
+                       f"os.execv(sys.executable, [sys.executable] + {stubs['slurm'].split()[1:]!r} + ['squeue'] + sys.argv[1:])\n")
+    project = make_project(tmp_path, stubs, monkeypatch, squeue = f"{sys.executable} {wrapper}", sacct = "false")
+    project.submit(1, stubs["lmp"])
+
+    assert project.poll() == {"queued" : 4, "done" : 0, "failed" : 0}
+    project.wait(0.2)
+    assert project.manifest.summary()[ProjectManifest.DONE] == 4
+
+
+def test_lost_task_grace(tmp_path, stubs, monkeypatch):
+    project = make_project(tmp_path, stubs, monkeypatch, lost_grace = 0.5)
+    os.makedirs(tmp_path / "slurm_state")
+    fake_array(tmp_path, project, 9001, "COMPLETED")
+    fake_array(tmp_path, project, 9002, "FAILED")
+
+    #A failed task is final straight away, a completed one gets time for its file to appear
+    assert project.poll() == {"queued" : 1, "done" : 0, "failed" : 1}
+    assert project.manifest.seed_status("lost9002", 0) == ProjectManifest.FAILED
+    project.wait(0.2)
+    assert project.manifest.seed_status("lost9001", 0) == ProjectManifest.DONE
+    assert project.arrays == {}
+
+
+def test_lost_task_without_accounting(tmp_path, stubs, monkeypatch):
+    project = make_project(tmp_path, stubs, monkeypatch, sacct = "false", lost_grace = 0.5)
+    os.makedirs(tmp_path / "slurm_state")
+    fake_array(tmp_path, project, 9001, "COMPLETED")
+
+    assert project.poll()["queued"] == 1
+    project.wait(0.2)
+    assert project.manifest.seed_status("lost9001", 0) == ProjectManifest.FAILED
+    assert project.manifest.jobs["lost9001"]["seeds"][0]["exit_code"] == -1
@@ -0,0 +1,11 @@
+import numpy as np
+
+from myscripts.src.FileIO.TDEPCache import TDEPCache
+
+
+def test_equal_numbers_share_a_key(tmp_path):
+    cache = TDEPCache(str(tmp_path / "cache"))
+    folder = str(tmp_path)
+    key = cache.key(folder, {"r_cut2" : 5, "r_cut3" : 4.0, "r_cut4" : -1, "stride" : 2})
+    assert key == cache.key(folder, {"r_cut2" : 5.0, "r_cut3" : np.float32(4), "r_cut4" : -1.0, "stride" : 2.0})
+    assert key != cache.key(folder, {"r_cut2" : 5, "r_cut3" : 4.0, "r_cut4" : -1, "stride" : 3})
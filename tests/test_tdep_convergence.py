@@ -0,0 +1,23 @@
+import os
+
+import synthetic
+from myscripts.scripts.tdep_convergence import finished_key, run_sample_size
+
+
+def test_parse_errors_are_recorded(tmp_path):
+    folder = str(tmp_path)
+    synthetic.write_simulation_folder(folder, 4, 8)
+    with open(os.path.join(folder, "dump.forces"), "r") as f:
+        text = f.read()
+    with open(os.path.join(folder, "dump.forces"), "w") as f:
+        f.write(text.replace("ITEM: ATOMS id fx fy fz\n1 ", "ITEM: ATOMS id fx fy fz\n1 nan? ", 1))
+
+    n, error = run_sample_size(folder, 4, 300, 1.0, 2, 1, 5.0, 4.0, -1, 1)
+    assert n == 4
+    assert error.startswith("ValueError")
+
+
+def test_finished_key_settings():
+    settings = {"temperature" : 300, "timestep_fs" : 1, "num_unit_cell" : 2, "r_cut2" : 5, "r_cut3" : 4, "r_cut4" : -1, "stride" : 1}
+    assert finished_key(10, settings) == finished_key(10, {**settings, "r_cut4" : -1.0})
+    assert finished_key(10, settings) != finished_key(10, {**settings, "temperature" : 400})
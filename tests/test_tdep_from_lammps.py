@@ -0,0 +1,27 @@
+import os
+import numpy as np
+
+import synthetic
+from myscripts.scripts.tdep_from_lammps import parse_MD_data
+
+
+def test_reuse_without_recalc(tmp_path):
+    #Rerunning with a new stride without recalculating reads the cached arrays
+    folder = str(tmp_path)
+    synthetic.write_simulation_folder(folder, 6, 8)
+    first = parse_MD_data(folder, 2, 300, 1.0, True, 1, 6)
+    second = parse_MD_data(folder, 2, 300, 1.0, False, 2, 6)
+
+    for file in ["infile.positions", "infile.forces", "infile.eq_positions", "infile.ssposcar", "infile.stat"]:
+        with open(os.path.join(first, file)) as f1, open(os.path.join(second, file)) as f2:
+            assert f1.read() == f2.read()
+    assert np.loadtxt(os.path.join(second, "infile.positions")).shape == (48, 3)
+    assert not os.path.isfile(os.path.join(folder, "infile.positions"))
+
+
+def test_no_recalc_without_cache(tmp_path):
+    #Nothing to reuse yet, the dumps are parsed anyway
+    folder = str(tmp_path)
+    synthetic.write_simulation_folder(folder, 4, 8)
+    TDEP_folder = parse_MD_data(folder, 2, 300, 1.0, False, 1, 4)
+    assert np.loadtxt(os.path.join(TDEP_folder, "infile.forces")).shape == (32, 3)